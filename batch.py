@@ -0,0 +1,242 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from config import Study, INSTRUMENTS
+
+# Like run_all, only config is imported up front: each universe runs in a
+# fresh interpreter that activates its study before importing the rest.
+OUTPUT_DIR = "batch_output"
+SUMMARY    = "batch_summary.html"
+LOG        = "run.log"
+STAGES     = ("tables", "figures", "robustness")
+META       = {"type": 2, "brand": 3, "karat": 4, "region": 5}   # positions in an INSTRUMENTS spec
+
+
+# A manifest is a JSON object:
+#   {"output_dir": "batch_output",
+#    "universes": [
+#      {"name": "paper"},
+#      {"name": "sjc", "instruments": {"brand": "SJC"}},
+#      {"name": "hanoi", "instruments": ["PNJ Hanoi", "SJC Hanoi"], "windows": [1, 5, 10]},
+#      {"name": "other", "data_file": "other.csv", "benchmark": "XAU_USD",
+#       "benchmark_label": "XAU/USD", "trading_days": 250,
+#       "instruments": {"A 24K": ["A_Buy", "A_Sell", "Bullion", "A", "24K", "City"]}}]}
+# Fields left out keep config.py's settings. `instruments` is a full map, a
+# list of configured names, or a filter on the configured instruments by
+# type / brand / karat / region (a value or a list of values).
+
+def slug(name: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]+", "_", name).strip("_").lower()
+
+
+def select_instruments(spec) -> dict:
+    if spec is None:
+        return None
+    if isinstance(spec, list):
+        unknown = [name for name in spec if name not in INSTRUMENTS]
+        if unknown:
+            raise ValueError(f"unknown instruments: {', '.join(unknown)}")
+        return {name: INSTRUMENTS[name] for name in spec}
+    if all(k in META for k in spec):
+        wanted = {k: [v] if isinstance(v, str) else list(v) for k, v in spec.items()}
+        out = {name: s for name, s in INSTRUMENTS.items()
+               if all(s[META[k]] in vals for k, vals in wanted.items())}
+        if not out:
+            raise ValueError(f"no configured instrument matches {spec}")
+        return out
+    return {name: tuple(s) for name, s in spec.items()}
+
+
+def read_manifest(path: str) -> tuple:
+    # (batch output directory, studies), each study writing to its own
+    # subdirectory of the batch's.
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    outdir = manifest.get("output_dir", OUTPUT_DIR)
+    studies, seen = [], set()
+    for entry in manifest["universes"]:
+        entry = dict(entry)
+        name = entry.pop("name")
+        if slug(name) in seen:
+            raise ValueError(f"duplicate universe name: {name!r}")
+        seen.add(slug(name))
+        entry["instruments"] = select_instruments(entry.get("instruments"))
+        entry["output_dir"] = os.path.join(outdir, slug(name))
+        studies.append(Study(name, **entry))
+    return outdir, studies
+
+
+# ══════════════════════════════════════════════════════════════════
+# WORKER TASKS — one fresh interpreter each
+# ══════════════════════════════════════════════════════════════════
+
+def load_dataset(study: Study) -> int:
+    # Parses the dataset into the shared load cache and screens its quotes,
+    # once, before the universes reading it start.
+    study.activate()
+    from core import load_data
+    return len(load_data())
+
+
+def run_universe(study: Study, stages: tuple) -> dict:
+    # The study's tables, figures and robustness report, built serially (the
+    # batch pool is the only parallelism) with the output logged beside them.
+    study.activate()
+    os.makedirs(study.output_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    with open(os.path.join(study.output_dir, LOG), "w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log):
+        try:
+            pipe = tuple(s for s in ("tables", "figures") if s in stages)
+            if pipe:
+                import pipeline
+                pipeline.run(workers=1, stages=pipe)
+            if "robustness" in stages:
+                import robustness
+                robustness.run(workers=1)
+            row = summary_row()
+        except Exception:
+            traceback.print_exc(file=log)
+            raise
+    row["seconds"] = time.perf_counter() - t0
+    return row
+
+
+def summary_row() -> dict:
+    # Headline numbers of one universe, from the results store the tables
+    # were built from.
+    from config import INSTRUMENTS as instruments, WINDOWS as windows, BENCHMARK_LABEL
+    from core import MODES, load_data
+    from panel import EW_LABEL
+    from results import ResultsStore, BUY_HOLD, dataset_key, produce
+    df = load_data()
+    store, dataset = ResultsStore(), dataset_key()
+    produce(df, dataset, store)
+    bh = store.query(dataset, modes=BUY_HOLD, instruments=[EW_LABEL, BENCHMARK_LABEL])
+    bh = bh.droplevel(["mode", "window"])["RR"]
+    grid = store.query(dataset, modes=MODES, windows=windows,
+                       instruments=list(instruments) + [EW_LABEL])["RR"]
+    row = {"instruments": len(instruments), "sessions": len(df),
+           "start": str(df["Date"].iloc[0].date()), "end": str(df["Date"].iloc[-1].date()),
+           "benchmark": BENCHMARK_LABEL, "bh_ew": bh[EW_LABEL], "bh_benchmark": bh[BENCHMARK_LABEL]}
+    for mode in MODES:
+        ew = grid.xs((mode, EW_LABEL), level=["mode", "instrument"])
+        n = int(ew.idxmax())
+        row[mode] = (ew[n], n, int((grid.xs((mode, n), level=["mode", "window"])
+                                    .drop(EW_LABEL) > 0).sum()))
+    return row
+
+
+# ══════════════════════════════════════════════════════════════════
+# DRIVER
+# ══════════════════════════════════════════════════════════════════
+
+def run(studies: list, workers: int = None, stages: tuple = STAGES) -> dict:
+    # Every dataset is loaded once; a universe starts as soon as its dataset
+    # is in the load cache. Returns study name → summary row (or exception).
+    workers = min(workers or os.cpu_count() or 1, len(studies))
+    by_file = {}
+    for s in studies:
+        by_file.setdefault(os.path.abspath(s.data_file), []).append(s)
+    out = {}
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, max_tasks_per_child=1) as pool:
+        running = {pool.submit(load_dataset, group[0]): ("load", path)
+                   for path, group in by_file.items()}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                kind, what = running.pop(fut)
+                exc = fut.exception()
+                if kind == "load":
+                    for s in by_file[what]:
+                        if exc is None:
+                            running[pool.submit(run_universe, s, stages)] = ("universe", s)
+                        else:
+                            out[s.name] = exc
+                    print(f"[{'OK' if exc is None else 'FAILED'}] loaded {what}"
+                          + ("" if exc is None else f": {exc}"))
+                else:
+                    out[what.name] = exc if exc is not None else fut.result()
+                    print(f"[{'OK' if exc is None else 'FAILED'}] {what.name} → {what.output_dir}"
+                          + (f" ({out[what.name]['seconds']:.1f} s)" if exc is None else f": {exc}"))
+    return {s.name: out[s.name] for s in studies}
+
+
+def summary_frame(studies: list, rows: dict):
+    import pandas as pd
+    from core import MODES
+    labels = {"long_only": "Long-only", "long_short": "Long-short"}
+    records = []
+    for s in studies:
+        r = rows[s.name]
+        rec = {"Universe": s.name}
+        if isinstance(r, Exception):
+            rec["Sessions"] = f"failed: {type(r).__name__}"
+            records.append(rec)
+            continue
+        rec.update({"Instruments": str(r["instruments"]), "Sessions": f"{r['sessions']:,}",
+                    "Period": f"{r['start']} – {r['end']}", "Benchmark": r["benchmark"],
+                    "Buy-hold RR: EW": r["bh_ew"], "Buy-hold RR: benchmark": r["bh_benchmark"]})
+        for mode in MODES:
+            rr, n, k = r[mode]
+            rec.update({f"{labels[mode]} EW: best RR": rr, f"{labels[mode]} EW: best n": f"n={n}",
+                        f"{labels[mode]}: instruments RR > 0": f"{k}/{r['instruments']}"})
+        records.append(rec)
+    return pd.DataFrame(records)
+
+
+def write_summary(studies: list, rows: dict, outdir: str) -> str:
+    from core import write_page, render_table
+    tbl = summary_frame(studies, rows)
+    # Universe names link to their own tables; the instrument count goes
+    # with the name so that it is not formatted as a metric.
+    tbl["Universe"] = [s.name if isinstance(rows[s.name], Exception) else
+                       f'<a href="{slug(s.name)}/output_tables.html">{s.name}</a> '
+                       f'({rows[s.name]["instruments"]})' for s in studies]
+    cols = [c for c in tbl.columns if c not in ("Universe", "Instruments")]
+    path = os.path.join(outdir, SUMMARY)
+    with open(path, "w", encoding="utf-8") as f:
+        write_page(f, [
+            "<section><h1>Cross-universe Summary</h1>"
+            "<p class='sub'>Buy-and-hold and momentum performance of the equally-weighted "
+            "portfolio in every universe of the batch.</p>"
+            f"<table>{render_table(tbl, 'Universe', cols, '.2f', threshold=1.0)}</table>"
+            "<p class='note'><em>Note:</em> Universe (k): k instruments. Best RR: the highest full-sample RR of the EW "
+            "portfolio over the universe's lookback windows, at window n; instruments RR &gt; 0: "
+            "those with a positive RR at that window. Dynamic transaction cost (half-spread). "
+            "<strong>Bold</strong>: RR&#8805;1.00.</p></section>",
+        ])
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(
+        description="Run the full study over every universe of a manifest, concurrently.")
+    ap.add_argument("manifest", help="JSON manifest of universes (see the top of batch.py)")
+    ap.add_argument("--workers", type=int, help="universes run at once (default: all cores)")
+    ap.add_argument("--stages", default=",".join(STAGES),
+                    help=f"comma-separated subset of {', '.join(STAGES)}")
+    args = ap.parse_args()
+    stages = tuple(s for s in args.stages.split(",") if s)
+    bad = [s for s in stages if s not in STAGES]
+    if bad:
+        ap.error(f"unknown stages: {', '.join(bad)}")
+
+    outdir, studies = read_manifest(args.manifest)
+    os.makedirs(outdir, exist_ok=True)
+    print(f"── {len(studies)} universes, {len({s.data_file for s in studies})} datasets ──")
+    t0 = time.perf_counter()
+    rows = run(studies, args.workers, stages)
+    summary = summary_frame(studies, rows)
+    print()
+    print(summary.round(2).to_string(index=False))
+    print(f"\n[OK] {write_summary(studies, rows, outdir)}  ({time.perf_counter() - t0:.1f} s)")
+    sys.exit(1 if any(isinstance(r, Exception) for r in rows.values()) else 0)
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from config import DATA_FILE, INSTRUMENTS, BENCHMARK, WINDOWS
+from core import (
+    MODES, read_source, load_data, series_matrix, strategy_metrics, backtest_grid, render_table,
+)
+from panel import InstrumentPanel
+from quality import quote_pairs, screen_frame
+from leadlag import cross_correlations
+from portfolios import portfolio_matrix
+from execution import fill_costs, execution_grid
+
+RESULTS_FILE  = "bench_results.json"
+SCALES        = ["i10", "s10", "i100", "s100"]     # i1000 / s1000 on request
+REGRESSION    = 1.25                               # slowdown flagged by --compare
+NOISE_FLOOR   = 0.01                               # seconds; smaller gaps are timer noise
+LOOP_MAX_CALLS = 2_000                             # per-call strategy_metrics cap
+SPA_BOOT      = 1_000
+
+
+# ══════════════════════════════════════════════════════════════════
+# SYNTHETIC DATA
+# ══════════════════════════════════════════════════════════════════
+
+# Average half-spread (fraction of mid) and price level relative to XAU/VND
+# of each template instrument, taken from the shipped dataset.
+TEMPLATE = {
+    "Ring PNJ 24K":     (0.0075, 0.96),
+    "Jewellery 10K":    (0.0387, 0.39),
+    "Jewellery 14K":    (0.0273, 0.55),
+    "Jewellery 18K":    (0.0212, 0.71),
+    "Jewellery 24K":    (0.0090, 0.95),
+    "PNJ Da Nang":      (0.0083, 1.03),
+    "PNJ Hanoi":        (0.0083, 1.03),
+    "PNJ Mekong Delta": (0.0083, 1.03),
+    "PNJ Ho Chi Minh":  (0.0083, 1.03),
+    "SJC Da Nang":      (0.0056, 1.10),
+    "SJC Hanoi":        (0.0053, 1.10),
+    "SJC Mekong Delta": (0.0055, 1.10),
+    "SJC Ho Chi Minh":  (0.0056, 1.10),
+}
+
+
+def parse_scale(spec: str) -> tuple:
+    # "i100" → 100× instruments, "s10" → 10× sessions, "i10s10" → both.
+    if not re.fullmatch(r"(?:[is]\d+)+", spec):
+        raise ValueError(f"bad scale spec {spec!r}")
+    axes = dict(re.findall(r"([is])(\d+)", spec))
+    return int(axes.get("i", 1)), int(axes.get("s", 1))
+
+
+def synthetic_dataset(inst_scale: int = 1, sess_scale: int = 1, seed: int = 0,
+                      n_sessions: int = 2838) -> tuple:
+    # Sticky retail quotes around a GBM XAU/VND benchmark: each instrument
+    # tracks the benchmark with its own premium, reprices on ~75% of sessions
+    # and rounds to 0.01 M VND, with a noisy spread around its template level.
+    rng = np.random.default_rng(seed)
+    T = n_sessions * sess_scale
+    dt = 1.0 / (252 * sess_scale)
+    bm = 30.6 * np.exp(np.cumsum(rng.normal(0.10 * dt, 0.15 * np.sqrt(dt), T)))
+    dates = pd.date_range("2015-01-02", "2025-12-31", periods=T).floor("s")
+
+    cols = {"Date": dates, BENCHMARK: bm}
+    instruments = {}
+    for copy in range(inst_scale):
+        for name, (hs, level) in TEMPLATE.items():
+            label = name if inst_scale == 1 else f"{name} #{copy}"
+            key = label.replace(" ", "_").replace("#", "")
+            premium = level * np.exp(np.cumsum(rng.normal(0.0, 0.002 * np.sqrt(dt * 252), T)))
+            fair = bm * premium
+            move = rng.random(T) < 0.75
+            move[0] = True
+            mid = fair[np.maximum.accumulate(np.where(move, np.arange(T), 0))]
+            half = hs * np.clip(rng.normal(1.0, 0.25, T), 0.3, None)
+            cols[f"{key}_Buy"]  = np.round(mid * (1.0 - half), 2)
+            cols[f"{key}_Sell"] = np.round(mid * (1.0 + half), 2)
+            instruments[label] = (f"{key}_Buy", f"{key}_Sell", *INSTRUMENTS.get(name, ("",) * 6)[2:])
+    return pd.DataFrame(cols), instruments
+
+
+# ══════════════════════════════════════════════════════════════════
+# STAGES
+# ══════════════════════════════════════════════════════════════════
+
+def timed(fn, repeat: int) -> tuple:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def run_stages(path: str, instruments: dict, repeat: int, stages: set, outdir: str,
+               cache_dir: str) -> dict:
+    import robustness
+    import figures
+    import tables
+
+    def want(name):
+        return not stages or any(name.startswith(s) for s in stages)
+
+    out = {}
+    if want("load"):
+        out["load_source"], _ = timed(lambda: read_source(path), repeat)
+        load_data(path, cache_dir=cache_dir)
+        out["load_cached"], _ = timed(lambda: load_data(path, cache_dir=cache_dir), repeat)
+    df = load_data(path, cache_dir=cache_dir)
+    if want("screen"):
+        pairs = quote_pairs(df.columns)
+        out["screen"], _ = timed(lambda: screen_frame(df, pairs), repeat)
+
+    # The panel is cached per frame; time building it, not the cache hit.
+    t, series = timed(lambda: InstrumentPanel.from_frame(df, instruments).series(), repeat)
+    if want("build_instrument_series"):
+        out["build_instrument_series"] = t
+    names, R, C = series_matrix(series)
+
+    if want("cross_correlations"):
+        # Instruments and benchmark, without the EW column.
+        out["cross_correlations"], _ = timed(lambda: cross_correlations(np.delete(R, -2, axis=1)),
+                                             repeat)
+
+    if want("portfolios"):
+        panel = InstrumentPanel.from_frame(df, instruments)
+        out["portfolios"], _ = timed(lambda: portfolio_matrix(panel), repeat)
+
+    n_calls = len(series) * len(WINDOWS) * len(MODES)
+    if want("strategy_metrics_loop"):
+        out["strategy_metrics_loop"] = None if n_calls > LOOP_MAX_CALLS else timed(
+            lambda: [strategy_metrics(r, c, n, mode)
+                     for mode in MODES for n in WINDOWS for r, c in series.values()],
+            repeat)[0]
+    t, grid = timed(lambda: backtest_grid(R, C, WINDOWS, MODES, names), repeat)
+    if want("backtest_grid"):
+        out["backtest_grid"] = t
+    if want("execution_grid"):
+        # Instruments only: fills need a bid and an ask.
+        panel = InstrumentPanel.from_frame(df, instruments)
+        A, B = fill_costs(panel)
+        out["execution_grid"], _ = timed(
+            lambda: execution_grid(panel.R, A, B, WINDOWS, MODES, panel.names), repeat)
+
+    for label, section, _ in robustness.SECTIONS:
+        key = f"robustness.{section.__name__}"
+        if want(key):
+            kwargs = {"n_boot": SPA_BOOT} if section is robustness.section_spa else {}
+            out[key], _ = timed(lambda: section(df, instruments, **kwargs), repeat)
+
+    if want("render_table"):
+        tbl = tables.window_table(grid, "RR", "long_only", 2)
+        vc = list(tbl.columns[1:])
+        out["render_table"], _ = timed(
+            lambda: render_table(tbl, "Instrument", vc, ".2f", threshold=1.0), repeat)
+
+    if want("figure"):
+        outfile = os.path.join(outdir, "fig_bench.png")
+        out["figure"], _ = timed(
+            lambda: figures.plot_equity_figure("long_only", outfile, "benchmark", df, instruments), 1)
+    return out
+
+
+# ══════════════════════════════════════════════════════════════════
+# DRIVER
+# ══════════════════════════════════════════════════════════════════
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scales: list = SCALES, repeat: int = 3, stages: set = None,
+        outfile: str = RESULTS_FILE, seed: int = 0) -> dict:
+    results = {
+        "commit":    git_commit(),
+        "timestamp": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "python":    platform.python_version(),
+        "numpy":     np.__version__,
+        "pandas":    pd.__version__,
+        "runs":      [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        datasets = [("real", DATA_FILE, INSTRUMENTS, 1, 1)]
+        for spec in scales:
+            inst, sess = parse_scale(spec)
+            df, instruments = synthetic_dataset(inst, sess, seed)
+            path = os.path.join(tmp, f"synthetic_{spec}.csv")
+            df.to_csv(path, index=False)
+            datasets.append((spec, path, instruments, inst, sess))
+
+        for name, path, instruments, inst, sess in datasets:
+            print(f"── {name} ──")
+            cache_dir = os.path.join(tmp, "cache")
+            n_rows = len(load_data(path, cache_dir=cache_dir))
+            timings = run_stages(path, instruments, 1 if inst * sess >= 100 else repeat,
+                                 stages or set(), tmp, cache_dir)
+            for stage, secs in timings.items():
+                print(f"  {stage:<42} {'skipped' if secs is None else f'{secs:9.4f} s'}")
+            results["runs"].append({
+                "dataset": name, "instrument_scale": inst, "session_scale": sess,
+                "instruments": len(instruments), "sessions": n_rows, "stages": timings,
+            })
+
+    with open(outfile, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[OK] {outfile}")
+    return results
+
+
+def compare(new: dict, old: dict, threshold: float = REGRESSION) -> list:
+    base = {(r["dataset"], s): t for r in old["runs"] for s, t in r["stages"].items()}
+    slow = []
+    for r in new["runs"]:
+        for stage, t in r["stages"].items():
+            t0 = base.get((r["dataset"], stage))
+            if t is None or not t0:
+                continue
+            ratio = t / t0
+            flag = "  << REGRESSION" if ratio > threshold and t - t0 > NOISE_FLOOR else ""
+            print(f"  {r['dataset']:<6} {stage:<42} {t0:9.4f} → {t:9.4f} s  ×{ratio:5.2f}{flag}")
+            if flag:
+                slow.append((r["dataset"], stage, ratio))
+    return slow
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Time each pipeline stage on real and synthetic data.")
+    ap.add_argument("--scales", default=",".join(SCALES),
+                    help="comma-separated specs: i<N> instruments×N, s<N> sessions×N, e.g. i10,s100,i10s10")
+    ap.add_argument("--stages", default="", help="comma-separated stage name prefixes to run")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", default=RESULTS_FILE)
+    ap.add_argument("--compare", metavar="OLD_JSON", help="flag stages slower than OLD_JSON")
+    ap.add_argument("--threshold", type=float, default=REGRESSION)
+    args = ap.parse_args()
+
+    scales = [s for s in args.scales.split(",") if s]
+    stages = {s for s in args.stages.split(",") if s}
+    res = run(scales, args.repeat, stages, args.out)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            if compare(res, json.load(f), args.threshold):
+                sys.exit(1)
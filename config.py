@@ -1,4 +1,7 @@
+import sys
+
 DATA_FILE = "Master_Gold_Dataset_Cleaned_Quant.xlsx"
+OUTPUT_DIR = ""          # tables, figures and the robustness report; "" is the working directory
 TRADING_DAYS = 252
 WINDOWS = [1, 2, 3, 4, 5]
 
@@ -20,3 +23,55 @@ INSTRUMENTS = {
 
 BENCHMARK = "XAU_VND_QuyDoi"
 BENCHMARK_LABEL = "XAU/VND (International)"
+
+
+# ══════════════════════════════════════════════════════════════════
+# STUDIES — the settings above as one object
+# ══════════════════════════════════════════════════════════════════
+
+# Study field → the module-level setting it replaces.
+SETTINGS = {
+    "data_file":       "DATA_FILE",
+    "instruments":     "INSTRUMENTS",
+    "benchmark":       "BENCHMARK",
+    "benchmark_label": "BENCHMARK_LABEL",
+    "trading_days":    "TRADING_DAYS",
+    "windows":         "WINDOWS",
+    "output_dir":      "OUTPUT_DIR",
+}
+
+# Every module that reads the settings imports one of these.
+STUDY_MODULES = ("signals", "quality", "panel", "core")
+
+
+class Study:
+    # One universe of the study: a dataset, its instruments and benchmark,
+    # the lookback windows and where the outputs go. Fields left out keep
+    # the settings above, so Study("paper") is the paper's configuration.
+    __slots__ = ("name",) + tuple(SETTINGS)
+
+    def __init__(self, name: str, **settings):
+        unknown = sorted(set(settings) - set(SETTINGS))
+        if unknown:
+            raise ValueError(f"unknown study settings: {', '.join(unknown)}")
+        self.name = name
+        for field, setting in SETTINGS.items():
+            value = settings.get(field)
+            setattr(self, field, globals()[setting] if value is None else value)
+
+    def settings(self) -> dict:
+        return {setting: getattr(self, field) for field, setting in SETTINGS.items()}
+
+    def activate(self) -> None:
+        # Modules read the settings into defaults, cache keys and the results
+        # engine hash when they are imported, so a study is applied to a fresh
+        # interpreter before any of them is.
+        loaded = [m for m in STUDY_MODULES if m in sys.modules]
+        if loaded:
+            raise RuntimeError(f"study {self.name!r} activated after {', '.join(loaded)} "
+                               "was imported")
+        globals().update(self.settings())
+
+    def __repr__(self) -> str:
+        return (f"Study({self.name!r}, {self.data_file}, {len(self.instruments)} instruments, "
+                f"benchmark {self.benchmark}, windows {self.windows})")
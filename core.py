@@ -1,15 +1,84 @@
+import hashlib
+import json
+import os
 import pandas as pd
 import numpy as np
-from scipy.stats import skew
-from config import DATA_FILE, TRADING_DAYS, WINDOWS, INSTRUMENTS, BENCHMARK, BENCHMARK_LABEL
+from config import DATA_FILE, TRADING_DAYS, WINDOWS, INSTRUMENTS
+from panel import instrument_panel
+from quality import load_flags
+from signals import SIGNAL_EPS, rolling_signal_means, position_matrix, signal_scores, positions
 
+CACHE_DIR = ".cache"
+MODES = ["long_only", "long_short"]
+MIN_OBS = 30
 
-def load_data() -> pd.DataFrame:
-    df = pd.read_excel(DATA_FILE)
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_source(path: str) -> pd.DataFrame:
+    if path.lower().endswith(".csv"):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_excel(path)
     df["Date"] = pd.to_datetime(df["Date"])
     return df.sort_values("Date").reset_index(drop=True)
 
 
+def cache_path(path: str, digest: str, cache_dir: str = CACHE_DIR) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{digest[:16]}")
+
+
+def write_cache(df: pd.DataFrame, target: str, digest: str) -> None:
+    # Columnar layout: one (columns × sessions) float64 matrix, so every
+    # column is a contiguous row of the memory-mapped file.
+    cols = [c for c in df.columns if c != "Date"]
+    tmp = f"{target}.tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    np.save(os.path.join(tmp, "values.npy"),
+            np.ascontiguousarray(df[cols].to_numpy(dtype=np.float64).T))
+    np.save(os.path.join(tmp, "dates.npy"), df["Date"].to_numpy())
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"digest": digest, "columns": cols}, f)
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        # Another process published the same cache first.
+        for name in os.listdir(tmp):
+            os.remove(os.path.join(tmp, name))
+        os.rmdir(tmp)
+
+
+def read_cache(target: str) -> pd.DataFrame:
+    with open(os.path.join(target, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    values = np.load(os.path.join(target, "values.npy"), mmap_mode="c")
+    dates  = np.load(os.path.join(target, "dates.npy"))
+    df = pd.DataFrame(values.T, columns=meta["columns"], copy=False)
+    df.insert(0, "Date", pd.to_datetime(dates))
+    return df
+
+
+def load_data(path: str = DATA_FILE, use_cache: bool = True,
+              cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    if not use_cache:
+        return read_source(path)
+    digest = file_digest(path)
+    target = cache_path(path, digest, cache_dir)
+    if not os.path.isfile(os.path.join(target, "meta.json")):
+        write_cache(read_source(path), target, digest)
+    df = read_cache(target)
+    # Quote screening runs once per dataset; its flags live in the same cache.
+    load_flags(df, target)
+    return df
+
+
 def mid_price(df: pd.DataFrame, bid: str, ask: str) -> pd.Series:
     return (df[bid] + df[ask]) / 2.0
 
@@ -32,6 +101,7 @@ def annualize(r: pd.Series) -> tuple:
 
 def momentum_signal(r: pd.Series, n: int, mode: str) -> pd.Series:
     a = r.shift(1).rolling(n).mean()
+    a = a.mask(a.abs() <= SIGNAL_EPS, 0.0)
     if mode == "long_only":
         return pd.Series(np.where(a > 0, 1.0, 0.0), index=r.index)
     return pd.Series(
@@ -47,7 +117,7 @@ def net_return(r: pd.Series, c: pd.Series, n: int, mode: str) -> pd.Series:
 
 def strategy_metrics(r: pd.Series, c: pd.Series, n: int, mode: str) -> tuple:
     R = net_return(r, c, n, mode)
-    if len(R) < 30:
+    if len(R) < MIN_OBS:
         return float("nan"), float("nan")
     Ra, sa, RR = annualize(R)
     return round(Ra, 3), round(RR, 2)
@@ -61,23 +131,172 @@ def equity_curve(r: pd.Series, c: pd.Series, n: int, mode: str, dates: pd.Series
     return eq.dropna()
 
 
-def build_instrument_series(df: pd.DataFrame) -> dict:
-    series = {}
-    for name, (bid, ask, *_) in INSTRUMENTS.items():
-        m = mid_price(df, bid, ask)
-        series[name] = (log_return(m), half_spread(df, bid, ask))
+def build_instrument_series(df: pd.DataFrame, instruments: dict = INSTRUMENTS,
+                            clean: bool = False) -> dict:
+    # Views over the dataset's InstrumentPanel, derived once per frame.
+    # clean: quotes flagged by the data-quality screen count as missing.
+    return instrument_panel(df, instruments, clean=clean).series()
+
+
+def series_matrix(series: dict) -> tuple:
+    names = list(series)
+    R = np.column_stack([series[k][0].to_numpy(dtype=np.float64) for k in names])
+    C = np.column_stack([series[k][1].to_numpy(dtype=np.float64) for k in names])
+    return names, R, C
+
+
+def net_return_matrix(R: np.ndarray, C: np.ndarray, I: np.ndarray) -> np.ndarray:
+    X = np.full(R.shape, np.nan)
+    X[1:] = I[:-1] * R[1:] - np.abs(I[1:] - I[:-1]) * C[1:]
+    return X
+
+
+def column_metrics(X: np.ndarray) -> tuple:
+    valid = ~np.isnan(X)
+    N = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        m  = np.where(valid, X, 0.0).sum(axis=0) / N
+        d  = np.where(valid, X - m, 0.0)
+        sd = np.sqrt((d * d).sum(axis=0) / (N - 1))
+        Ra = (1.0 + m) ** TRADING_DAYS - 1.0
+        sa = sd * np.sqrt(TRADING_DAYS)
+        RR = np.where(sa > 0, Ra / sa, np.nan)
+    return Ra, sa, RR, N
+
+
+def column_skew(X: np.ndarray) -> np.ndarray:
+    # Biased sample skewness (scipy.stats.skew default) over non-NaN rows.
+    valid = ~np.isnan(X)
+    N = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        d  = np.where(valid, X - np.where(valid, X, 0.0).sum(axis=0) / N, 0.0)
+        m2 = (d * d).sum(axis=0) / N
+        m3 = (d * d * d).sum(axis=0) / N
+        return np.where(m2 > 0, m3 / m2 ** 1.5, np.nan)
+
+
+def metric_block(X: np.ndarray, I: np.ndarray) -> np.ndarray:
+    # (instruments × [Ra, sa, RR, skew, turnover, N]) of net returns X earned
+    # by positions I; turnover counts the position changes of sessions in X.
+    Ra, sa, RR, N = column_metrics(X)
+    sk = column_skew(X)
+    dI = np.where(np.isnan(X[1:]), 0.0, np.abs(I[1:] - I[:-1]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        turnover = dI.sum(axis=0) / N
+    short = N < MIN_OBS
+    return np.column_stack([
+        np.where(short, np.nan, Ra), np.where(short, np.nan, sa),
+        np.where(short, np.nan, RR), np.where(short, np.nan, sk), turnover, N,
+    ])
+
+
+def grid_frame(blocks: list, modes: list, windows: list, names: list) -> pd.DataFrame:
+    index = pd.MultiIndex.from_product(
+        [modes, windows, names], names=["mode", "window", "instrument"]
+    )
+    grid = pd.DataFrame(np.vstack(blocks), index=index,
+                        columns=["Ra", "sa", "RR", "skew", "turnover", "N"])
+    grid["N"] = grid["N"].astype(np.int64)
+    return grid
+
+
+def backtest_grid(R: np.ndarray, C: np.ndarray, windows: list = WINDOWS,
+                  modes: list = MODES, names: list = None, signal: str = "sma") -> pd.DataFrame:
+    names = list(range(R.shape[1])) if names is None else list(names)
+    scores = signal_scores(R, windows, signal)
+
+    blocks = []
+    for mode in modes:
+        for n in windows:
+            I = positions(scores[n], mode, signal)
+            blocks.append(metric_block(net_return_matrix(R, C, I), I))
+    return grid_frame(blocks, modes, windows, names)
+
+
+def grid_table(grid: pd.DataFrame, field: str, mode: str) -> pd.DataFrame:
+    tbl = grid.loc[mode, field].unstack("window")
+    names = grid.index.get_level_values("instrument").unique()
+    return tbl.reindex(names)
+
+
+def strategy_grid(df: pd.DataFrame, windows: list = WINDOWS, modes: list = MODES,
+                  instruments: dict = INSTRUMENTS, signal: str = "sma",
+                  clean: bool = False) -> pd.DataFrame:
+    names, R, C = instrument_panel(df, instruments, clean=clean).matrix()
+    return backtest_grid(R, C, windows, modes, names, signal)
 
-    r_list = [v[0] for v in series.values()]
-    c_list = [v[1] for v in series.values()]
-    r_ew = pd.concat(r_list, axis=1).mean(axis=1)
-    c_ew = pd.concat(c_list, axis=1).mean(axis=1)
-    series["EW Portfolio"] = (r_ew, c_ew)
 
-    r_bm = log_return(df[BENCHMARK])
-    c_bm = pd.Series(0.0, index=df.index)
-    series[BENCHMARK_LABEL] = (r_bm, c_bm)
+# Net return under a cost c'_t = k + λ·c_t is g_t − k·d_t − λ·h_t with
+# g = I_{t-1}·r_t, d = |ΔI_t| and h = d·c_t, so its mean and variance at any
+# (k, λ) follow from the means and centred cross-moments of (g, d, h).
+MOMENT_COLS = ["N", "mg", "md", "mh", "Cgg", "Cdd", "Chh", "Cgd", "Cgh", "Cdh"]
 
-    return series
+
+def cost_moments(R: np.ndarray, C: np.ndarray, windows: list = WINDOWS,
+                 modes: list = MODES, names: list = None, signal: str = "sma") -> pd.DataFrame:
+    names = list(range(R.shape[1])) if names is None else list(names)
+    scores = signal_scores(R, windows, signal)
+
+    blocks = []
+    for mode in modes:
+        for n in windows:
+            I = positions(scores[n], mode, signal)
+            g = I[:-1] * R[1:]
+            d = np.abs(I[1:] - I[:-1])
+            h = d * C[1:]
+            valid = ~(np.isnan(g) | np.isnan(h))
+            N = valid.sum(axis=0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                m = [np.where(valid, x, 0.0).sum(axis=0) / N for x in (g, d, h)]
+            z = [np.where(valid, x - mx, 0.0) for x, mx in zip((g, d, h), m)]
+            blocks.append(np.column_stack([
+                N, *m,
+                (z[0] * z[0]).sum(axis=0), (z[1] * z[1]).sum(axis=0),
+                (z[2] * z[2]).sum(axis=0), (z[0] * z[1]).sum(axis=0),
+                (z[0] * z[2]).sum(axis=0), (z[1] * z[2]).sum(axis=0),
+            ]))
+
+    index = pd.MultiIndex.from_product(
+        [modes, windows, names], names=["mode", "window", "instrument"]
+    )
+    return pd.DataFrame(np.vstack(blocks), index=index, columns=MOMENT_COLS)
+
+
+def cost_surface(moments: pd.DataFrame, fixed, multiple=0.0,
+                 field: str = "RR") -> pd.DataFrame:
+    k, lam = np.broadcast_arrays(np.atleast_1d(np.asarray(fixed, dtype=np.float64)),
+                                 np.atleast_1d(np.asarray(multiple, dtype=np.float64)))
+    M = {c: moments[c].to_numpy()[:, None] for c in MOMENT_COLS}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = M["mg"] - k * M["md"] - lam * M["mh"]
+        ss = (M["Cgg"] + k * k * M["Cdd"] + lam * lam * M["Chh"]
+              - 2.0 * k * M["Cgd"] - 2.0 * lam * M["Cgh"] + 2.0 * k * lam * M["Cdh"])
+        sd = np.sqrt(np.maximum(ss, 0.0) / (M["N"] - 1.0))
+        Ra = (1.0 + mean) ** TRADING_DAYS - 1.0
+        sa = sd * np.sqrt(TRADING_DAYS)
+        out = {"Ra": Ra, "sa": sa, "RR": np.where(sa > 0, Ra / sa, np.nan)}[field]
+    out = np.where(M["N"] < MIN_OBS, np.nan, out)
+    columns = k if not lam.any() else pd.MultiIndex.from_arrays(
+        [k, lam], names=["fixed", "multiple"])
+    return pd.DataFrame(out, index=moments.index, columns=columns)
+
+
+def break_even_costs(moments: pd.DataFrame) -> pd.DataFrame:
+    # RR = 0 exactly where the mean net return is zero: mg = k·md (fixed
+    # cost) or mg = λ·mh (multiple of the realized half-spread).
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = pd.DataFrame({
+            "fixed":    moments["mg"] / moments["md"].where(moments["md"] > 0),
+            "multiple": moments["mg"] / moments["mh"].where(moments["mh"] > 0),
+        })
+    return out.where(moments["N"] >= MIN_OBS)
+
+
+def strategy_moments(df: pd.DataFrame, windows: list = WINDOWS, modes: list = MODES,
+                     instruments: dict = INSTRUMENTS, signal: str = "sma",
+                     clean: bool = False) -> pd.DataFrame:
+    names, R, C = instrument_panel(df, instruments, clean=clean).matrix()
+    return cost_moments(R, C, windows, modes, names, signal)
 
 
 CSS = """
@@ -109,43 +328,103 @@ tr.ben td { border-top: 1px dashed #bbb; background: #f5f5f5 !important; }
 """
 
 
-def html_page(sections: list) -> str:
-    return (
-        f'<!DOCTYPE html><html lang="en">\n'
-        f'<head><meta charset="UTF-8">'
-        f'<title>Vietnamese Gold – Trading Strategy Results</title>'
-        f'<style>{CSS}</style></head>\n'
-        f'<body>\n{"".join(sections)}\n</body></html>'
-    )
+PAGE_HEAD = (
+    '<!DOCTYPE html><html lang="en">\n'
+    '<head><meta charset="UTF-8">'
+    '<title>Vietnamese Gold – Trading Strategy Results</title>'
+    f'<style>{CSS}</style></head>\n'
+    '<body>\n'
+)
+PAGE_TAIL = "\n</body></html>"
+ROW_CHUNK = 1_000     # rows per string handed to the writer
 
 
-def render_table(df_tbl: pd.DataFrame, name_col: str,
-                 val_cols: list, fmt: str, threshold: float = None) -> str:
+def page_parts(sections):
+    # A section is a string or an iterable of string chunks.
+    yield PAGE_HEAD
+    for s in sections:
+        if isinstance(s, str):
+            yield s
+        else:
+            yield from s
+    yield PAGE_TAIL
+
+
+def html_page(sections) -> str:
+    return "".join(page_parts(sections))
+
+
+def write_page(f, sections) -> None:
+    # Streams each section to the open file as soon as it is produced.
+    for part in page_parts(sections):
+        f.write(part)
+
+
+def format_column(values, fmt: str) -> tuple:
+    # One pass over a column: cell text, a float view (NaN where missing or
+    # not numeric) and the numeric / missing masks. Matches per-cell
+    # float(v) and f"{v:{fmt}}", falling back to str(v).
+    col = values if isinstance(values, pd.Series) else pd.Series(list(values))
+    if col.dtype.kind in "biuf":
+        x = col.to_numpy(dtype=np.float64)
+        missing = np.isnan(x)
+        text = ["—" if m else f"{v:{fmt}}" for v, m in zip(x.tolist(), missing.tolist())]
+        return text, x, ~missing, missing
+
+    vals = col.tolist()
+    missing = np.fromiter((pd.isna(v) is True for v in vals), dtype=bool, count=len(vals))
+    x = np.full(len(vals), np.nan)
+    numeric = np.zeros(len(vals), dtype=bool)
+    text = []
+    for i, v in enumerate(vals):
+        if missing[i]:
+            text.append("—")
+            continue
+        try:
+            x[i] = float(v)
+            numeric[i] = True
+            text.append(f"{x[i]:{fmt}}")
+        except (ValueError, TypeError):
+            text.append(str(v))
+    return text, x, numeric, missing
+
+
+def cell_classes(x: np.ndarray, numeric: np.ndarray, neg: bool = True,
+                 threshold: float = None) -> np.ndarray:
+    with np.errstate(invalid="ignore"):
+        is_neg = numeric & (x < 0) if neg else np.zeros(len(x), dtype=bool)
+        is_hi  = numeric & (x >= threshold) if threshold else np.zeros(len(x), dtype=bool)
+    return np.where(is_neg, "neg", np.where(is_hi, "hi", ""))
+
+
+def iter_table(df_tbl: pd.DataFrame, name_col: str,
+               val_cols: list, fmt: str, threshold: float = None):
     header = (
         f'<th style="text-align:left"></th>'
         + "".join(f"<th>{c}</th>" for c in val_cols)
     )
-    rows_html = ""
-    for _, row in df_tbl.iterrows():
-        nm = str(row[name_col])
-        tr_cls = (
-            ' class="avg"' if "EW PORTFOLIO" in nm.upper()
-            else (' class="ben"' if "XAU" in nm.upper() else "")
+    yield f"<thead><tr>{header}</tr></thead><tbody>"
+
+    names = [str(v) for v in df_tbl[name_col].tolist()]
+    upper = pd.Series(names, dtype=object).str.upper()
+    tr_cls = np.where(upper.str.contains("EW PORTFOLIO", regex=False), ' class="avg"',
+                      np.where(upper.str.contains("XAU", regex=False), ' class="ben"', ""))
+
+    cells = []
+    for col in val_cols:
+        text, x, numeric, _ = format_column(df_tbl[col], fmt)
+        cls = cell_classes(x, numeric, True, threshold)
+        cells.append([f'<td class="R {c}">{t}</td>' for t, c in zip(text, cls.tolist())])
+
+    rows = ["".join(parts) for parts in zip(*cells)] if cells else [""] * len(names)
+    for i0 in range(0, len(names), ROW_CHUNK):
+        yield "".join(
+            f'<tr{tr_cls[i]}><td class="L">{names[i]}</td>{rows[i]}</tr>\n'
+            for i in range(i0, min(i0 + ROW_CHUNK, len(names)))
         )
-        cells = f'<td class="L">{nm}</td>'
-        for col in val_cols:
-            v = row[col]
-            if pd.isna(v):
-                s, cc = "—", ""
-            else:
-                try:
-                    fv = float(v)
-                    s  = f"{fv:{fmt}}"
-                    cc = "neg" if fv < 0 else ("hi" if threshold and fv >= threshold else "")
-                except (ValueError, TypeError):
-                    s  = str(v)
-                    cc = ""
-            cells += f'<td class="R {cc}">{s}</td>'
-        rows_html += f"<tr{tr_cls}>{cells}</tr>\n"
-    return f"<thead><tr>{header}</tr></thead><tbody>{rows_html}</tbody>"
+    yield "</tbody>"
 
+
+def render_table(df_tbl: pd.DataFrame, name_col: str,
+                 val_cols: list, fmt: str, threshold: float = None) -> str:
+    return "".join(iter_table(df_tbl, name_col, val_cols, fmt, threshold))
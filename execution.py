@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from config import INSTRUMENTS, WINDOWS
+from core import MODES, metric_block, grid_frame, load_data
+from panel import instrument_panel
+from signals import signal_scores, positions, forward_fill
+
+DELAY = 0      # sessions between a signal and its fill; 0 fills at the signal session's close
+SIZE  = 1.0    # fraction of capital behind a full position
+
+
+# The half-spread model charges |ΔI|·c_t against mid-price log returns. A
+# fill at the quote instead costs ln(ask/mid) per unit bought and
+# ln(mid/bid) per unit sold; c = (ask − bid)/(2·mid) is the first-order
+# approximation of both. Over a long round trip the fills give exactly
+# ln(bid_exit / ask_entry).
+
+def fill_costs(p) -> tuple:
+    # (A, B): log cost of buying at the ask and of selling at the bid, per
+    # unit, for every instrument of a panel; NaN without a quote.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.log(p.ask / p.mid), np.log(p.mid / p.bid)
+
+
+def executed_positions(I: np.ndarray, quoted: np.ndarray, delay: int = DELAY,
+                       size=SIZE) -> np.ndarray:
+    # Positions actually held: the target set `delay` sessions earlier,
+    # scaled by `size` (a scalar or a sessions × instruments matrix), and
+    # carried through sessions without a quote, where nothing can be filled.
+    T = len(I)
+    if delay == 0 and quoted.all():
+        return I * size
+    J = np.full(I.shape, np.nan)
+    J[delay:] = I[:T - delay] * (size if np.ndim(size) == 0 else size[delay:])
+    J[~quoted] = np.nan
+    return np.nan_to_num(forward_fill(J), nan=0.0)
+
+
+def execution_return_matrix(R: np.ndarray, A: np.ndarray, B: np.ndarray,
+                            J: np.ndarray) -> np.ndarray:
+    # X_t = J_{t-1}·r_t − buys_t·A_t − sells_t·B_t; with A = B = C this is
+    # core.net_return_matrix. Costs are NaN only where the mid price, and so
+    # r_t, is missing too.
+    dJ = J[1:] - J[:-1]
+    X = np.full(R.shape, np.nan)
+    X[1:] = J[:-1] * R[1:] - np.maximum(dJ, 0.0) * A[1:] - np.maximum(-dJ, 0.0) * B[1:]
+    return X
+
+
+def execution_grid(R: np.ndarray, A: np.ndarray, B: np.ndarray, windows: list = WINDOWS,
+                   modes: list = MODES, names: list = None, signal: str = "sma",
+                   delay: int = DELAY, size=SIZE) -> pd.DataFrame:
+    # core.backtest_grid with per-side fill costs, a fill delay and sizing:
+    # same signals, same (mode, window, instrument) metrics frame.
+    names = list(range(R.shape[1])) if names is None else list(names)
+    scores = signal_scores(R, windows, signal)
+    quoted = ~(np.isnan(A) | np.isnan(B))
+
+    blocks = []
+    for mode in modes:
+        for n in windows:
+            J = executed_positions(positions(scores[n], mode, signal), quoted, delay, size)
+            blocks.append(metric_block(execution_return_matrix(R, A, B, J), J))
+    return grid_frame(blocks, modes, windows, names)
+
+
+def divergence(df: pd.DataFrame, instruments: dict = INSTRUMENTS, windows: list = WINDOWS,
+               modes: list = MODES, signal: str = "sma", delay: int = DELAY,
+               size=SIZE, clean: bool = False) -> pd.DataFrame:
+    # Metrics of every instrument with fills at bid/ask and with the
+    # half-spread charge, on the same executed positions, and their gap.
+    p = instrument_panel(df, instruments, clean=clean)
+    A, B = fill_costs(p)
+    kw = dict(windows=windows, modes=modes, names=p.names, signal=signal, delay=delay, size=size)
+    quotes = execution_grid(p.R, A, B, **kw)
+    half   = execution_grid(p.R, p.C, p.C, **kw)
+    fields = ["Ra", "sa", "RR", "turnover"]
+    return pd.concat({"bid_ask": quotes[fields], "half_spread": half[fields],
+                      "gap": quotes[fields] - half[fields]}, axis=1)
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Bid/ask fills against the half-spread cost model.")
+    ap.add_argument("--delay", type=int, default=DELAY, help="sessions between signal and fill")
+    ap.add_argument("--size", type=float, default=SIZE, help="fraction of capital per position")
+    ap.add_argument("--signal", default="sma")
+    args = ap.parse_args()
+    out = divergence(load_data(), signal=args.signal, delay=args.delay, size=args.size)
+    gap = out["gap"]
+    print(gap.groupby(level="mode")[["Ra", "RR"]].agg(["mean", lambda x: x.abs().max()])
+          .rename(columns={"<lambda_0>": "max |gap|"}).to_string())
+    print()
+    print(out.xs(1, level="window").round(4).to_string())
@@ -0,0 +1,165 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from config import INSTRUMENTS
+from core import cost_moments, cost_surface
+from panel import instrument_panel
+from periods import PerformanceIndex
+from profiling import span
+
+# A scenario is a picklable (kind, params) pair evaluated against the shared
+# quote panel; the same kernels serve the serial and the pooled path, so
+# results are identical whichever runs them.
+
+WORKER_DATA = None
+
+
+def panel_arrays(df: pd.DataFrame, instruments: dict = INSTRUMENTS) -> dict:
+    cols  = [c for c in df.columns if c != "Date"]
+    panel = instrument_panel(df, instruments)
+    return {
+        "values": np.ascontiguousarray(df[cols].to_numpy(dtype=np.float64).T),
+        "dates":  df["Date"].to_numpy(dtype="datetime64[ns]").view(np.int64),
+        "R":      np.ascontiguousarray(panel.R),
+        "C":      np.ascontiguousarray(panel.C),
+    }
+
+
+def panel_frame(data: dict) -> pd.DataFrame:
+    df = pd.DataFrame(data["values"].T, columns=data["columns"], copy=False)
+    df.insert(0, "Date", pd.to_datetime(data["dates"].view("datetime64[ns]")))
+    return df
+
+
+class SharedPanel:
+    # Owns the shared-memory copies of the quote panel and of the instrument
+    # return / half-spread matrices; workers attach by name.
+
+    def __init__(self, df: pd.DataFrame, instruments: dict = INSTRUMENTS):
+        self.blocks = {}
+        self.handles = {"columns": [c for c in df.columns if c != "Date"],
+                        "instruments": dict(instruments), "arrays": {}}
+        for key, arr in panel_arrays(df, instruments).items():
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            self.blocks[key] = shm
+            self.handles["arrays"][key] = (shm.name, arr.shape, arr.dtype.str)
+
+    def close(self) -> None:
+        for shm in self.blocks.values():
+            shm.close()
+            shm.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(handles: dict) -> dict:
+    data = {"columns": handles["columns"], "instruments": handles["instruments"], "shm": []}
+    for key, (name, shape, dtype) in handles["arrays"].items():
+        shm = shared_memory.SharedMemory(name=name)
+        data["shm"].append(shm)
+        data[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    data["df"] = panel_frame(data)
+    return data
+
+
+def local_data(df: pd.DataFrame, instruments: dict = INSTRUMENTS) -> dict:
+    data = panel_arrays(df, instruments)
+    data.update(columns=[c for c in df.columns if c != "Date"],
+                instruments=dict(instruments), df=df)
+    return data
+
+
+# ══════════════════════════════════════════════════════════════════
+# SCENARIO KERNELS
+# ══════════════════════════════════════════════════════════════════
+
+def ew_columns(data: dict, excl) -> tuple:
+    keep = [i for i, k in enumerate(data["instruments"]) if not excl or k not in excl]
+    R, C = data["R"][:, keep], data["C"][:, keep]
+    ok = ~np.isnan(R)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = np.where(ok, R, 0.0).sum(axis=1) / ok.sum(axis=1)
+        okc = ~np.isnan(C)
+        c = np.where(okc, C, 0.0).sum(axis=1) / okc.sum(axis=1)
+    return r[:, None], c[:, None]
+
+
+def scenario_ew_grid(data: dict, p: dict) -> dict:
+    r, c = ew_columns(data, p.get("excl"))
+    moments = cost_moments(r, c, p["windows"], [p["mode"]])
+    out = {field: cost_surface(moments, p.get("fixed", 0.0), p.get("multiple", 1.0), field)
+           .iloc[:, 0].tolist() for field in ["Ra", "sa", "RR"]}
+    out["N"] = moments["N"].astype(int).tolist()
+    return out
+
+
+def scenario_period(data: dict, p: dict) -> dict:
+    r, c = ew_columns(data, p.get("excl"))
+    dates = data["dates"].view("datetime64[ns]")
+    index = PerformanceIndex(dates, r, c, p["windows"], [p["mode"]])
+    i0, i1 = index.bounds(p["t0"], p["t1"])
+    if i1 - i0 < p.get("min_rows", 0):
+        return None
+    out = index.query(p["t0"], p["t1"])
+    return {field: out[field].tolist() for field in ["Ra", "sa", "RR", "N"]}
+
+
+def scenario_section(data: dict, p: dict) -> str:
+    import robustness
+    return getattr(robustness, p["name"])(data["df"], data["instruments"])
+
+
+KERNELS = {
+    "ew_grid": scenario_ew_grid,
+    "period":  scenario_period,
+    "section": scenario_section,
+}
+
+
+def run_scenario(spec: tuple, data: dict):
+    # Spans only reach the trace on the serial path; pool workers have no tracer.
+    kind, params = spec
+    with span(f"robustness.{params['name']}" if kind == "section" else f"robustness.{kind}"):
+        return KERNELS[kind](data, params)
+
+
+def init_worker(handles: dict) -> None:
+    global WORKER_DATA
+    WORKER_DATA = attach(handles)
+
+
+def worker_run(spec: tuple):
+    return run_scenario(spec, WORKER_DATA)
+
+
+# ══════════════════════════════════════════════════════════════════
+# EXECUTOR
+# ══════════════════════════════════════════════════════════════════
+
+def run_serial(df: pd.DataFrame, instruments: dict, specs: list) -> list:
+    data = local_data(df, instruments)
+    return [run_scenario(s, data) for s in specs]
+
+
+def run_scenarios(df: pd.DataFrame, specs: list, instruments: dict = INSTRUMENTS,
+                  workers: int = None) -> list:
+    # Results come back in spec order, so output is deterministic and equal
+    # to run_serial() regardless of how work is spread over the pool.
+    workers = min(workers or os.cpu_count() or 1, len(specs))
+    if workers <= 1:
+        return run_serial(df, instruments, specs)
+    with SharedPanel(df, instruments) as panel:
+        with ProcessPoolExecutor(workers, initializer=init_worker,
+                                 initargs=(panel.handles,)) as pool:
+            # Whole-section tasks are the slowest; start them first.
+            order = sorted(range(len(specs)), key=lambda i: specs[i][0] != "section")
+            futures = {i: pool.submit(worker_run, specs[i]) for i in order}
+            return [futures[i].result() for i in range(len(specs))]
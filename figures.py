@@ -1,29 +1,62 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from config import INSTRUMENTS, WINDOWS
-from core import load_data, mid_price, log_return, half_spread, equity_curve
-
-
-def build_ew_series(df: pd.DataFrame) -> tuple:
-    r_list, c_list = [], []
-    for bid, ask, *_ in INSTRUMENTS.values():
-        m = mid_price(df, bid, ask)
-        r_list.append(log_return(m))
-        c_list.append(half_spread(df, bid, ask))
-    return (
-        pd.concat(r_list, axis=1).mean(axis=1),
-        pd.concat(c_list, axis=1).mean(axis=1),
-    )
+from config import INSTRUMENTS, WINDOWS, OUTPUT_DIR
+from core import MODES, load_data, equity_curve, build_instrument_series
+from panel import instrument_panel
+from profiling import span
+
+MAX_POINTS     = 3_000                # per panel; ~2× the pixel width at 200 dpi
+INSTRUMENT_DIR = os.path.join(OUTPUT_DIR, "figures_instruments")
+MODE_LABELS    = {"long_only": "long-only", "long_short": "long-short"}
+
+
+def build_ew_series(df: pd.DataFrame, instruments: dict = INSTRUMENTS) -> tuple:
+    r, c = instrument_panel(df, instruments).ew()
+    return pd.Series(r, index=df.index, copy=False), pd.Series(c, index=df.index, copy=False)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets (Steinarsson 2013): indices of n_out
+    # points that keep the visual shape of (x, y); first and last kept.
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(hi, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        cx, cy = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
 
 
-def plot_equity_figure(mode: str, outfile: str, caption: str):
-    df = load_data()
-    dates = df["Date"]
-    r_ew, c_ew = build_ew_series(df)
+def downsample(eq: pd.Series, max_points: int = MAX_POINTS) -> pd.Series:
+    if len(eq) <= max_points:
+        return eq
+    x = eq.index.asi8.astype(np.float64)
+    return eq.iloc[lttb(x, eq.to_numpy(dtype=np.float64), max_points)]
 
+
+def equity_panels(r: pd.Series, c: pd.Series, mode: str, dates: pd.Series,
+                  windows: list = WINDOWS, max_points: int = MAX_POINTS) -> list:
+    # (window, equity curve) per panel, computed in the parent and shipped
+    # to the render workers already downsampled.
+    return [(n, downsample(equity_curve(r, c, n, mode, dates), max_points)) for n in windows]
+
+
+def render_figure(panels: list, outfile: str, caption: str, mode: str = "") -> str:
     matplotlib.rcParams.update({
         "font.family":      "DejaVu Sans",
         "font.size":         9,
@@ -33,55 +66,127 @@ def plot_equity_figure(mode: str, outfile: str, caption: str):
     })
 
     fig, axes = plt.subplots(
-        nrows=5, ncols=1,
-        figsize=(7.5, 10.5),
+        nrows=len(panels), ncols=1,
+        figsize=(7.5, 2.1 * len(panels)),
         constrained_layout=True,
+        squeeze=False,
     )
 
-    for ax, n in zip(axes, WINDOWS):
-        eq = equity_curve(r_ew, c_ew, n, mode, dates)
-        ax.plot(eq.index, eq.values, color="#1f77b4", linewidth=0.75)
-        ax.set_title(f"lookback = {n}", fontsize=9, pad=4)
-        ax.set_xlabel("Date", fontsize=8)
-        ax.xaxis.set_major_locator(mdates.YearLocator())
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y"))
-        ax.xaxis.set_minor_locator(mdates.MonthLocator(bymonth=[7]))
-        ax.yaxis.grid(True, linestyle="--", linewidth=0.4, alpha=0.55)
-        ax.set_axisbelow(True)
-        ymin, ymax = eq.min(), eq.max()
-        margin = (ymax - ymin) * 0.05
-        ax.set_ylim(ymin - margin, ymax + margin)
-        ax.set_xlim(eq.index[0], eq.index[-1])
-        ax.tick_params(axis="both", labelsize=8)
-        for spine in ax.spines.values():
-            spine.set_linewidth(0.7)
+    for ax, (n, eq) in zip(axes[:, 0], panels):
+        with span(f"figures.panel.{mode}", window=n):
+            ax.plot(eq.index, eq.values, color="#1f77b4", linewidth=0.75)
+            ax.set_title(f"lookback = {n}", fontsize=9, pad=4)
+            ax.set_xlabel("Date", fontsize=8)
+            ax.xaxis.set_major_locator(mdates.YearLocator())
+            ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y"))
+            ax.xaxis.set_minor_locator(mdates.MonthLocator(bymonth=[7]))
+            ax.yaxis.grid(True, linestyle="--", linewidth=0.4, alpha=0.55)
+            ax.set_axisbelow(True)
+            ymin, ymax = eq.min(), eq.max()
+            margin = (ymax - ymin) * 0.05
+            ax.set_ylim(ymin - margin, ymax + margin)
+            ax.set_xlim(eq.index[0], eq.index[-1])
+            ax.tick_params(axis="both", labelsize=8)
+            for spine in ax.spines.values():
+                spine.set_linewidth(0.7)
 
     fig.text(0.5, -0.008, caption, ha="center", va="top",
              fontsize=9, style="italic", wrap=True)
-    fig.savefig(outfile, dpi=200, bbox_inches="tight",
-                facecolor="white", edgecolor="none")
+    with span("figures.savefig", file=outfile):
+        fig.savefig(outfile, dpi=200, bbox_inches="tight",
+                    facecolor="white", edgecolor="none")
     plt.close(fig)
     print(f"[OK] {outfile}")
+    return outfile
 
 
-def run():
-    plot_equity_figure(
-        mode    = "long_only",
-        outfile = "fig3_longonly.png",
-        caption = (
-            "Fig. 3. Equity curve for long-only portfolios (equally-weighted across 13 Vietnamese "
-            "gold instruments) with different lookback windows varying from 1 to 5 days."
-        ),
-    )
-    plot_equity_figure(
-        mode    = "long_short",
-        outfile = "fig4_longshort.png",
-        caption = (
-            "Fig. 4. Equity curve for long-short portfolios (equally-weighted across 13 Vietnamese "
-            "gold instruments) with different lookback windows varying from 1 to 5 days."
-        ),
-    )
+def plot_equity_figure(mode: str, outfile: str, caption: str,
+                       df: pd.DataFrame = None, instruments: dict = INSTRUMENTS,
+                       series: tuple = None):
+    # series: precomputed (r, c) so callers drawing several figures build
+    # the EW series once.
+    if df is None:
+        with span("figures.load_data"):
+            df = load_data()
+    if series is None:
+        with span("figures.build_ew_series"):
+            series = build_ew_series(df, instruments)
+    r_ew, c_ew = series
+    return render_figure(equity_panels(r_ew, c_ew, mode, df["Date"]), outfile, caption, mode)
+
+
+def render_all(jobs: list, workers: int = None) -> list:
+    # jobs: (panels, outfile, caption, mode) tuples; rendered on a process
+    # pool (Agg backend) with the output order preserved.
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [render_figure(*job) for job in jobs]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(render_figure, *zip(*jobs)))
+
+
+FIGURES = [
+    ("long_only", os.path.join(OUTPUT_DIR, "fig3_longonly.png"),
+     "Fig. 3. Equity curve for long-only portfolios (equally-weighted across 13 Vietnamese "
+     "gold instruments) with different lookback windows varying from {lo} to {hi} days."),
+    ("long_short", os.path.join(OUTPUT_DIR, "fig4_longshort.png"),
+     "Fig. 4. Equity curve for long-short portfolios (equally-weighted across 13 Vietnamese "
+     "gold instruments) with different lookback windows varying from {lo} to {hi} days."),
+]
+
+
+def figure_caption(caption: str, windows: list = WINDOWS) -> str:
+    return caption.format(lo=windows[0], hi=windows[-1])
+
+
+def run(workers: int = None, df: pd.DataFrame = None, windows: list = WINDOWS,
+        modes: list = MODES):
+    if df is None:
+        with span("figures.load_data"):
+            df = load_data()
+    with span("figures.build_ew_series"):
+        r_ew, c_ew = build_ew_series(df)
+    with span("figures.equity_panels"):
+        jobs = [(equity_panels(r_ew, c_ew, mode, df["Date"], windows), outfile,
+                 figure_caption(caption, windows), mode)
+                for mode, outfile, caption in FIGURES if mode in modes]
+    with span("figures.render"):
+        return render_all(jobs, workers)
+
+
+def slug(name: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]+", "_", name).strip("_").lower()
+
+
+def run_instruments(outdir: str = INSTRUMENT_DIR, modes: list = MODES, workers: int = None,
+                    df: pd.DataFrame = None, instruments: dict = INSTRUMENTS,
+                    windows: list = WINDOWS) -> list:
+    # One figure per instrument (plus EW and benchmark) and mode, from a
+    # single load and a single pass over the instrument series.
+    if df is None:
+        df = load_data()
+    os.makedirs(outdir, exist_ok=True)
+    with span("figures.instrument_panels"):
+        jobs = [
+            (equity_panels(r, c, mode, df["Date"], windows),
+             os.path.join(outdir, f"{slug(name)}_{mode}.png"),
+             f"Equity curve for {MODE_LABELS.get(mode, mode)} momentum on {name} with "
+             f"lookback windows varying from {windows[0]} to {windows[-1]} days.",
+             mode)
+            for name, (r, c) in build_instrument_series(df, instruments).items()
+            for mode in modes
+        ]
+    with span("figures.render"):
+        return render_all(jobs, workers)
 
 
 if __name__ == "__main__":
-    run()
+    import argparse
+    ap = argparse.ArgumentParser(description="Render the equity-curve figures.")
+    ap.add_argument("--workers", type=int, help="render processes (default: all cores)")
+    ap.add_argument("--instruments", action="store_true",
+                    help=f"also render one figure per instrument into {INSTRUMENT_DIR}/")
+    args = ap.parse_args()
+    run(args.workers)
+    if args.instruments:
+        run_instruments(workers=args.workers)
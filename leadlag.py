@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+from config import INSTRUMENTS, BENCHMARK_LABEL, TRADING_DAYS
+from core import MIN_OBS, load_data
+from panel import instrument_panel
+
+MAX_LAG     = 5             # sessions either side of zero
+ROLL_WINDOW = TRADING_DAYS  # sessions per rolling window
+ROLL_STEP   = 21            # sessions between rolling window ends
+BLOCK_CELLS = 4_000_000     # complex cross-spectrum cells held at once
+FFT_GAIN    = 32.0          # FFT beats per-lag BLAS products once (2L+1)·T > this × n·log2(n)
+
+
+# Lag convention: corr[ℓ, i, j] = corr(r_i,t , r_j,t+ℓ). A peak at ℓ > 0
+# means i leads j by ℓ sessions; corr[-ℓ, i, j] = corr[ℓ, j, i].
+
+def fast_len(n: int) -> int:
+    # Smallest 2^a·3^b·5^c ≥ n: an FFT length pocketfft handles quickly.
+    best = 1 << (n - 1).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            m = p35
+            while m < n:
+                m *= 2
+            best = min(best, m)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def standardize(R: np.ndarray) -> tuple:
+    # Column z-scores over each series' own valid sessions with missing
+    # sessions set to zero, and the 0/1 validity mask. Time runs along the
+    # second-to-last axis, so a stack of windows is standardized at once.
+    M = ~np.isnan(R)
+    N = M.sum(axis=-2, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mu = np.where(M, R, 0.0).sum(axis=-2, keepdims=True) / N
+        Z = np.where(M, R - mu, 0.0)
+        sd = np.sqrt((Z * Z).sum(axis=-2, keepdims=True) / N)
+        Z = np.where(sd > 0, Z / sd, 0.0)
+    return Z, M.astype(np.float64)
+
+
+# ══════════════════════════════════════════════════════════════════
+# LAGGED CROSS-PRODUCTS — every pair and lag at once
+# ══════════════════════════════════════════════════════════════════
+
+def lagged_products(A: np.ndarray, B: np.ndarray, max_lag: int = MAX_LAG,
+                    method: str = "auto") -> np.ndarray:
+    # P[ℓ + L, i, j] = Σ_t A[t, i]·B[t + ℓ, j] for ℓ = -L..L over (T × Ka)
+    # and (T × Kb) matrices with zeros for missing sessions.
+    #   fft: one zero-padded transform per column, then each block of the
+    #        cross-spectrum conj(F_A)·F_B inverted along time — O(Ka·Kb·n log n)
+    #   dot: one (Ka × T)·(T × Kb) product per lag — O(L·Ka·Kb·T)
+    # auto takes whichever is cheaper for this T and L.
+    T = len(A)
+    L = min(max_lag, T - 1)
+    n = fast_len(T + L)
+    if method == "auto":
+        method = "fft" if (2 * L + 1) * T > FFT_GAIN * n * np.log2(n) else "dot"
+    if method == "dot":
+        out = np.empty((2 * L + 1, A.shape[1], B.shape[1]))
+        for lag in range(-L, L + 1):
+            a, b = (A[:T - lag], B[lag:]) if lag >= 0 else (A[-lag:], B[:T + lag])
+            out[lag + L] = a.T @ b
+        return out
+
+    FA = np.conj(np.fft.rfft(A, n, axis=0))
+    FB = np.fft.rfft(B, n, axis=0)
+    out = np.empty((2 * L + 1, A.shape[1], B.shape[1]))
+    rows = max(1, BLOCK_CELLS // (FA.shape[0] * max(B.shape[1], 1)))
+    for i in range(0, A.shape[1], rows):
+        c = np.fft.irfft(FA[:, i:i + rows, None] * FB[:, None, :], n, axis=0)
+        # Circular lags: ℓ ≥ 0 at the front, ℓ < 0 wrapped to the end.
+        out[L:, i:i + rows] = c[:L + 1]
+        out[:L, i:i + rows] = c[n - L:]
+    return out
+
+
+def cross_correlations(R: np.ndarray, max_lag: int = MAX_LAG,
+                       method: str = "auto") -> np.ndarray:
+    # (2L+1) × K × K lagged correlations of the columns of R. Each pair and
+    # lag is normalized by the sessions both series are quoted in; fewer
+    # than MIN_OBS common sessions give NaN.
+    Z, M = standardize(R)
+    P = lagged_products(Z, Z, max_lag, method)
+    m = M[:, :1]
+    if (M == m).all():
+        # Only whole sessions missing (e.g. the first): one count per lag.
+        N = np.rint(lagged_products(m, m, max_lag, "dot"))
+    else:
+        N = np.rint(lagged_products(M, M, max_lag, method))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(N >= MIN_OBS, P / N, np.nan)
+
+
+def rolling_cross_correlations(R: np.ndarray, pairs: list, window: int = ROLL_WINDOW,
+                               step: int = ROLL_STEP, max_lag: int = MAX_LAG) -> tuple:
+    # Lagged correlations of the (i, j) column pairs in windows of `window`
+    # sessions ending every `step` sessions, each window standardized on its
+    # own: (window end rows, n_windows × (2L+1) × pairs). All windows of a
+    # block of pairs are transformed together along the time axis.
+    T = len(R)
+    ends = np.arange(window - 1, T, step)
+    L = min(max_lag, window - 1)
+    n = fast_len(window + L)
+    I = np.array([i for i, _ in pairs], dtype=np.int64)
+    J = np.array([j for _, j in pairs], dtype=np.int64)
+    out = np.empty((len(ends), 2 * L + 1, len(pairs)))
+    idx = ends[:, None] - window + 1 + np.arange(window)
+    cols = np.unique(np.concatenate([I, J]))
+    pos = {c: k for k, c in enumerate(cols)}
+    Z, M = standardize(R[:, cols][idx])
+    FZ = np.fft.rfft(Z, n, axis=1)
+    # Overlap counts are window - |ℓ| unless a window has missing quotes;
+    # only those windows need the mask transforms.
+    gappy = np.flatnonzero(M.min(axis=(1, 2)) == 0)
+    FM = np.fft.rfft(M[gappy], n, axis=1)
+    full = np.zeros(n)
+    full[:L + 1] = window - np.arange(L + 1)
+    full[n - L:] = window - np.arange(L, 0, -1)
+    I, J = np.array([pos[i] for i in I]), np.array([pos[j] for j in J])
+    block = max(1, BLOCK_CELLS // (len(ends) * FZ.shape[1]))
+    for p in range(0, len(pairs), block):
+        i, j = I[p:p + block], J[p:p + block]
+        P = np.fft.irfft(np.conj(FZ[:, :, i]) * FZ[:, :, j], n, axis=1)
+        N = np.broadcast_to(full[None, :, None], P.shape).copy()
+        N[gappy] = np.rint(np.fft.irfft(np.conj(FM[:, :, i]) * FM[:, :, j], n, axis=1))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            C = np.where(N >= MIN_OBS, P / N, np.nan)
+        out[:, L:, p:p + block] = C[:, :L + 1]
+        out[:, :L, p:p + block] = C[:, n - L:]
+    return ends, out
+
+
+# ══════════════════════════════════════════════════════════════════
+# SUMMARIES
+# ══════════════════════════════════════════════════════════════════
+
+def peak_lags(C: np.ndarray, axis: int = 0) -> np.ndarray:
+    # Lag of the largest |correlation| along `axis` (NaN where all missing).
+    L = (C.shape[axis] - 1) // 2
+    A = np.where(np.isnan(C), -np.inf, np.abs(C))
+    lag = np.argmax(A, axis=axis) - L
+    return np.where(np.isnan(C).all(axis=axis), np.nan, lag)
+
+
+def return_matrix(df: pd.DataFrame, instruments: dict = INSTRUMENTS,
+                  clean: bool = False) -> tuple:
+    # Instrument and benchmark returns (the EW portfolio is left out: it is
+    # an average of the others).
+    panel = instrument_panel(df, instruments, clean=clean)
+    names, R, _ = panel.matrix(ew=False)
+    return names, R
+
+
+def lead_lag_frame(C: np.ndarray, names: list) -> pd.DataFrame:
+    # Long format: one row per (leader, follower, lag).
+    L = (len(C) - 1) // 2
+    index = pd.MultiIndex.from_product([range(-L, L + 1), names, names],
+                                       names=["lag", "leader", "follower"])
+    return pd.DataFrame({"corr": C.ravel()}, index=index)
+
+
+def benchmark_lead(C: np.ndarray, names: list, benchmark: str = BENCHMARK_LABEL) -> pd.DataFrame:
+    # corr(benchmark_t, r_i,t+ℓ) for ℓ = 0..L and the peak lag, per instrument.
+    L = (len(C) - 1) // 2
+    b = names.index(benchmark)
+    rows = [k for k, name in enumerate(names) if name != benchmark]
+    out = pd.DataFrame(C[L:, b, rows].T, index=[names[k] for k in rows],
+                       columns=[f"lag {lag}" for lag in range(L + 1)])
+    out["peak lag"] = peak_lags(C[:, b, rows])
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Lead-lag cross-correlations of instrument returns.")
+    ap.add_argument("--max-lag", type=int, default=MAX_LAG)
+    ap.add_argument("--clean", action="store_true", help="drop quotes flagged by the quality screen")
+    args = ap.parse_args()
+    names, R = return_matrix(load_data(), clean=args.clean)
+    C = cross_correlations(R, args.max_lag)
+    L = (len(C) - 1) // 2
+    print("── corr(row_t, column_t+1): row leads column by one session ──")
+    print(pd.DataFrame(C[L + 1], index=names, columns=names).round(3).to_string())
+    print("\n── Benchmark lead ──")
+    print(benchmark_lead(C, names).round(3).to_string())
@@ -0,0 +1,171 @@
+import weakref
+import numpy as np
+import pandas as pd
+from config import INSTRUMENTS, BENCHMARK, BENCHMARK_LABEL
+from quality import instrument_flags
+
+EW_LABEL = "EW Portfolio"
+META     = ("type", "brand", "karat", "region")
+
+
+class Instrument:
+    # One quoted instrument: its bid/ask columns and descriptive metadata,
+    # i.e. one INSTRUMENTS entry.
+    __slots__ = ("name", "bid", "ask") + META
+
+    def __init__(self, name: str, bid: str, ask: str, type: str, brand: str,
+                 karat: str, region: str):
+        self.name, self.bid, self.ask = name, bid, ask
+        self.type, self.brand, self.karat, self.region = type, brand, karat, region
+
+    def spec(self) -> tuple:
+        return (self.bid, self.ask, self.type, self.brand, self.karat, self.region)
+
+    def __repr__(self) -> str:
+        return f"Instrument({self.name!r}, {self.type}, {self.brand}, {self.karat}, {self.region})"
+
+
+class InstrumentPanel:
+    # Bid, ask, mid price, log return and half-spread of every instrument as
+    # C-contiguous (sessions × instruments) matrices, plus the benchmark, all
+    # derived once from the quote frame. select / where / drop return panels
+    # over fewer instruments that share the parent's arrays when the chosen
+    # columns are adjacent, and copy only those columns otherwise.
+    __slots__ = ("dates", "index", "instruments", "column", "bid", "ask", "mid", "R", "C",
+                 "benchmark", "benchmark_R", "ew_cache")
+
+    def __init__(self, dates, index, instruments: list, bid, ask, mid, R, C,
+                 benchmark, benchmark_R):
+        self.dates, self.index = dates, index
+        self.instruments = instruments
+        self.column = {inst.name: k for k, inst in enumerate(instruments)}
+        self.bid, self.ask, self.mid, self.R, self.C = bid, ask, mid, R, C
+        self.benchmark, self.benchmark_R = benchmark, benchmark_R
+        self.ew_cache = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, instruments: dict = INSTRUMENTS,
+                   dtype=np.float64, valid: np.ndarray = None) -> "InstrumentPanel":
+        # Same arithmetic as core.mid_price / log_return / half_spread, so the
+        # matrices equal the per-column Series bit for bit. valid: quotes
+        # outside this (sessions × instruments) mask are treated as missing.
+        specs = [Instrument(name, *spec) for name, spec in instruments.items()]
+        bid = np.ascontiguousarray(df[[i.bid for i in specs]].to_numpy(dtype=np.float64))
+        ask = np.ascontiguousarray(df[[i.ask for i in specs]].to_numpy(dtype=np.float64))
+        if valid is not None:
+            bid[~valid] = np.nan
+            ask[~valid] = np.nan
+        bench = df[BENCHMARK].to_numpy(dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mid = (bid + ask) / 2.0
+            C = (ask - bid) / (2.0 * mid)
+            R, bench_R = log_returns(mid), log_returns(bench)
+        # Read-only: every module shares these arrays.
+        arrays = [x.astype(dtype, copy=False) for x in (bid, ask, mid, R, C, bench, bench_R)]
+        for x in arrays:
+            x.flags.writeable = False
+        return cls(pd.DatetimeIndex(df["Date"]), df.index, specs, *arrays)
+
+    # ── views ────────────────────────────────────────────────────────
+
+    @property
+    def names(self) -> list:
+        return [inst.name for inst in self.instruments]
+
+    def __len__(self) -> int:
+        return len(self.instruments)
+
+    def select(self, names: list) -> "InstrumentPanel":
+        idx = [self.column[name] for name in names]
+        if idx == list(range(len(self))):
+            return self
+        insts = [self.instruments[k] for k in idx]
+        if idx and idx == list(range(idx[0], idx[-1] + 1)):
+            idx = slice(idx[0], idx[-1] + 1)
+        return InstrumentPanel(self.dates, self.index, insts,
+                               *(x[:, idx] for x in (self.bid, self.ask, self.mid, self.R, self.C)),
+                               self.benchmark, self.benchmark_R)
+
+    def where(self, **meta) -> "InstrumentPanel":
+        # where(brand="SJC"), where(region=("Hanoi", "Da Nang"), type="Bullion")
+        def match(inst):
+            return all(getattr(inst, k) in ((v,) if isinstance(v, str) else v)
+                       for k, v in meta.items())
+        return self.select([inst.name for inst in self.instruments if match(inst)])
+
+    def drop(self, names) -> "InstrumentPanel":
+        return self.select([name for name in self.names if name not in names])
+
+    def spec(self) -> dict:
+        return {inst.name: inst.spec() for inst in self.instruments}
+
+    # ── derived series ───────────────────────────────────────────────
+
+    def ew(self) -> tuple:
+        # Equally-weighted return and half-spread: mean over the instruments
+        # quoted in each session, as DataFrame.mean(axis=1) computes it.
+        if self.ew_cache is None:
+            self.ew_cache = tuple(row_mean(X) for X in (self.R, self.C))
+        return self.ew_cache
+
+    def series(self) -> dict:
+        # name → (log return, half-spread) Series over the frame's index, for
+        # every instrument, the EW portfolio and the benchmark.
+        wrap = lambda x: pd.Series(x, index=self.index, copy=False)
+        out = {inst.name: (wrap(self.R[:, k]), wrap(self.C[:, k]))
+               for k, inst in enumerate(self.instruments)}
+        r_ew, c_ew = self.ew()
+        out[EW_LABEL] = (wrap(r_ew), wrap(c_ew))
+        out[BENCHMARK_LABEL] = (wrap(self.benchmark_R), pd.Series(0.0, index=self.index))
+        return out
+
+    def matrix(self, ew: bool = True, benchmark: bool = True) -> tuple:
+        # (names, R, C) in the column order of core.series_matrix(series()).
+        names, R, C = self.names, [self.R], [self.C]
+        if ew:
+            r_ew, c_ew = self.ew()
+            names, R, C = names + [EW_LABEL], R + [r_ew[:, None]], C + [c_ew[:, None]]
+        if benchmark:
+            names = names + [BENCHMARK_LABEL]
+            R, C = R + [self.benchmark_R[:, None]], C + [np.zeros((len(self.index), 1), dtype=self.C.dtype)]
+        if len(R) == 1:
+            return names, self.R, self.C
+        return names, np.hstack(R), np.hstack(C)
+
+
+def row_mean(X: np.ndarray) -> np.ndarray:
+    # NaN-skipping mean across columns. A column-major frame reduces in the
+    # same order as the frame of per-instrument Series the tables were
+    # first computed from, so the EW series match them bit for bit.
+    return pd.DataFrame(np.asfortranarray(X), copy=False).mean(axis=1).to_numpy()
+
+
+def log_returns(P: np.ndarray) -> np.ndarray:
+    out = np.full(P.shape, np.nan)
+    out[1:] = np.log(P[1:] / P[:-1])
+    return out
+
+
+# ══════════════════════════════════════════════════════════════════
+# ONE PANEL PER DATASET
+# ══════════════════════════════════════════════════════════════════
+
+# (id(df), dtype, clean, universe) → panel; the universe is None for the
+# configured instruments, which every subset of them is a view of. An entry
+# is dropped when its frame is garbage-collected, so ids are never reused.
+PANELS = {}
+
+
+def instrument_panel(df: pd.DataFrame, instruments: dict = INSTRUMENTS,
+                     dtype=np.float64, clean: bool = False) -> InstrumentPanel:
+    # clean: drop the quotes flagged by the data-quality screen (quality.py).
+    configured = all(INSTRUMENTS.get(name) == tuple(spec) for name, spec in instruments.items())
+    universe = INSTRUMENTS if configured else instruments
+    key = (id(df), np.dtype(dtype).str, clean,
+           None if configured else tuple((k, tuple(v)) for k, v in instruments.items()))
+    panel = PANELS.get(key)
+    if panel is None:
+        valid = instrument_flags(df, universe) == 0 if clean else None
+        panel = PANELS[key] = InstrumentPanel.from_frame(df, universe, dtype, valid)
+        weakref.finalize(df, PANELS.pop, key, None)
+    return panel.select(list(instruments))
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from config import TRADING_DAYS, WINDOWS
+from core import (
+    MODES, MIN_OBS, signal_scores, positions, net_return_matrix,
+)
+
+
+class PerformanceIndex:
+    # Prefix sums of every cell's net strategy return, so Ra/σa/RR over any
+    # [t0, t1] is a difference of two rows. Returns are centred on the
+    # full-sample mean before summing to keep the variance well conditioned.
+
+    def __init__(self, dates, R: np.ndarray, C: np.ndarray, windows: list = WINDOWS,
+                 modes: list = MODES, names: list = None, signal: str = "sma"):
+        names = list(range(R.shape[1])) if names is None else list(names)
+        self.dates = pd.DatetimeIndex(dates)
+        self.index = pd.MultiIndex.from_product(
+            [modes, windows, names], names=["mode", "window", "instrument"]
+        )
+
+        scores = signal_scores(R, windows, signal)
+        X = np.hstack([
+            net_return_matrix(R, C, positions(scores[n], mode, signal))
+            for mode in modes for n in windows
+        ])
+        valid = ~np.isnan(X)
+        N = valid.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.center = np.where(N > 0, np.where(valid, X, 0.0).sum(axis=0) / N, 0.0)
+        Z = np.where(valid, X - self.center, 0.0)
+
+        T, K = X.shape
+        self.S1 = np.zeros((T + 1, K))
+        self.S2 = np.zeros((T + 1, K))
+        self.SN = np.zeros((T + 1, K), dtype=np.int64)
+        np.cumsum(Z, axis=0, out=self.S1[1:])
+        np.cumsum(Z * Z, axis=0, out=self.S2[1:])
+        np.cumsum(valid, axis=0, out=self.SN[1:])
+
+    def bounds(self, t0, t1) -> tuple:
+        i0 = self.dates.searchsorted(pd.Timestamp(t0), side="left")
+        i1 = self.dates.searchsorted(pd.Timestamp(t1), side="right")
+        return i0, i1
+
+    def span_metrics(self, i0, i1) -> tuple:
+        # i0/i1 are row bounds (scalars or aligned arrays) into the prefix sums.
+        N  = self.SN[i1] - self.SN[i0]
+        s1 = self.S1[i1] - self.S1[i0]
+        s2 = self.S2[i1] - self.S2[i0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            m  = self.center + s1 / N
+            sd = np.sqrt(np.maximum(s2 - s1 * s1 / N, 0.0) / (N - 1))
+            Ra = (1.0 + m) ** TRADING_DAYS - 1.0
+            sa = sd * np.sqrt(TRADING_DAYS)
+            RR = np.where(sa > 0, Ra / sa, np.nan)
+        short = N < MIN_OBS
+        return (np.where(short, np.nan, Ra), np.where(short, np.nan, sa),
+                np.where(short, np.nan, RR), N)
+
+    def query(self, t0, t1) -> pd.DataFrame:
+        Ra, sa, RR, N = self.span_metrics(*self.bounds(t0, t1))
+        return pd.DataFrame({"Ra": Ra, "sa": sa, "RR": RR, "N": N}, index=self.index)
+
+    def rolling(self, length: int = TRADING_DAYS, field: str = "RR") -> pd.DataFrame:
+        i1 = np.arange(length, len(self.dates) + 1)
+        Ra, sa, RR, _ = self.span_metrics(i1 - length, i1)
+        out = {"Ra": Ra, "sa": sa, "RR": RR}[field]
+        return pd.DataFrame(out, index=self.dates[i1 - 1], columns=self.index)
+
+    def calendar(self, freq: str = "Y", field: str = "RR") -> pd.DataFrame:
+        periods = self.dates.to_period(freq)
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        ends = np.r_[starts[1:], len(self.dates)]
+        Ra, sa, RR, _ = self.span_metrics(starts, ends)
+        out = {"Ra": Ra, "sa": sa, "RR": RR}[field]
+        return pd.DataFrame(out, index=periods[starts].astype(str), columns=self.index)
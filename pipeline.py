@@ -0,0 +1,282 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import pandas as pd
+import core
+import panel
+import portfolios
+import results
+import tables
+from config import DATA_FILE, INSTRUMENTS, BENCHMARK, BENCHMARK_LABEL, WINDOWS, OUTPUT_DIR
+from core import CACHE_DIR, MODES, SIGNAL_EPS, file_digest
+from profiling import span
+
+STORE_DIR = os.path.join(OUTPUT_DIR, CACHE_DIR, "pipeline")   # beside the outputs it tracks
+MANIFEST  = "manifest.json"
+VERSIONS  = f"numpy {np.__version__}, pandas {pd.__version__}"
+
+
+class Node:
+    # One artifact of the build. Its key hashes the source of every function
+    # in `code`, the `params` it reads from config, its `kwargs` and the keys
+    # of its `deps`, so an edit only invalidates the nodes that can see it.
+    # `outputs` are files the node writes; `store` pickles its return value
+    # so dependants can be rebuilt without rebuilding it.
+
+    def __init__(self, name: str, build, deps: tuple = (), code: tuple = (),
+                 params: dict = None, kwargs: dict = None, outputs: tuple = (),
+                 store: bool = True):
+        self.name = name
+        self.build = build
+        self.deps = tuple(deps)
+        self.code = tuple(code)
+        self.params = params or {}
+        self.kwargs = kwargs or {}
+        self.outputs = tuple(outputs)
+        self.store = store
+
+    def key(self, dep_keys: list) -> str:
+        h = hashlib.sha256(f"{self.name}\n{VERSIONS}\n".encode())
+        for fn in self.code:
+            h.update(inspect.getsource(fn).encode())
+        h.update(repr(sorted(self.params.items())).encode())
+        h.update(repr(sorted(self.kwargs.items())).encode())
+        for k in dep_keys:
+            h.update(k.encode())
+        return h.hexdigest()
+
+
+# ══════════════════════════════════════════════════════════════════
+# BUILD STEPS
+# ══════════════════════════════════════════════════════════════════
+
+def build_results(df: pd.DataFrame, dataset: str) -> str:
+    results.produce(df, dataset)
+    return dataset
+
+
+def build_table3(dataset: str) -> str:
+    bh = results.ResultsStore().query(
+        dataset, modes=results.BUY_HOLD, instruments=results.universe())
+    return tables.make_table3(bh.droplevel(["mode", "window"]))
+
+
+def build_table4(dataset: str) -> str:
+    return tables.make_table4(results.ResultsStore().query(
+        dataset, modes=MODES, windows=WINDOWS, instruments=results.universe()))
+
+
+def build_table5_6(dataset: str) -> tuple:
+    return tables.make_table5_table6(results.ResultsStore().query(
+        dataset, modes=MODES, windows=WINDOWS, instruments=results.universe()))
+
+
+def build_tables_html(t12: tuple, t3: str, t4: str, t56: tuple) -> None:
+    with open(tables.OUTPUT, "w", encoding="utf-8") as f:
+        core.write_page(f, [*t12, t3, t4, *t56])
+    print(f"[OK] {tables.OUTPUT}")
+
+
+# figures (and with it matplotlib) is imported only when a figure is built.
+
+def build_ew_series(df: pd.DataFrame) -> tuple:
+    import figures
+    return (df["Date"], *figures.build_ew_series(df))
+
+
+def build_figure(ew: tuple, mode: str, outfile: str, caption: str) -> None:
+    import figures
+    dates, r, c = ew
+    figures.render_figure(figures.equity_panels(r, c, mode, dates), outfile,
+                          figures.figure_caption(caption), mode)
+
+
+# ══════════════════════════════════════════════════════════════════
+# GRAPH
+# ══════════════════════════════════════════════════════════════════
+
+SIGNAL_CODE = (core.momentum_signal, core.rolling_signal_means, core.position_matrix)
+PRICE_CODE  = (panel.InstrumentPanel, panel.row_mean, panel.log_returns, panel.instrument_panel)
+# render_table is a wrapper: every table node hashes the code that formats cells.
+RENDER_CODE = (core.render_table, core.iter_table, core.format_column, core.cell_classes)
+RENDER      = {"ROW_CHUNK": core.ROW_CHUNK}
+UNIVERSE    = {"INSTRUMENTS": INSTRUMENTS, "BENCHMARK": BENCHMARK,
+               "BENCHMARK_LABEL": BENCHMARK_LABEL}
+STAGES      = ("tables", "figures")
+
+
+def graph(path: str = DATA_FILE, stages: tuple = STAGES) -> list:
+    # Dataset → metrics → tables / figures, in topological order, for the
+    # chosen stages only.
+    digest = file_digest(path)
+    nodes = [
+        Node("dataset", core.load_data, params={"path": path, "digest": digest},
+             kwargs={"path": path}, store=False),
+    ]
+    if "tables" in stages:
+        nodes += tables_nodes(digest)
+    if "figures" in stages:
+        nodes += figure_nodes()
+    return nodes
+
+
+def tables_nodes(digest: str) -> list:
+    return [
+        # Metrics live in the results store; downstream nodes carry its key.
+        # Unstored, so it re-checks the store whenever a table is rebuilt.
+        Node("results", build_results, ["dataset"],
+             code=(build_results, results.produce, results.buy_hold_metrics, results.universe,
+                   results.report_matrix),
+             params={"ENGINE": results.ENGINE, "WINDOWS": WINDOWS, "MODES": MODES},
+             kwargs={"dataset": digest}, store=False),
+        Node("table1_2", tables.make_table1_table2, ["dataset"],
+             code=(tables.make_table1_table2, *RENDER_CODE, *PRICE_CODE),
+             params={**UNIVERSE, **RENDER}),
+        Node("table3", build_table3, ["results"],
+             code=(build_table3, tables.make_table3, tables.portfolio_note, *RENDER_CODE),
+             params={"PORTFOLIOS": (portfolios.REBALANCE, portfolios.COVARIANCE, portfolios.COV_SPAN,
+                                    portfolios.COV_WINDOW, portfolios.SHRINK), **RENDER}),
+        Node("table4", build_table4, ["results"],
+             code=(build_table4, tables.make_table4, tables.window_table, core.grid_table,
+                   *RENDER_CODE),
+             params={"WINDOWS": WINDOWS, **RENDER}),
+        Node("table5_6", build_table5_6, ["results"],
+             code=(build_table5_6, tables.make_table5_table6, tables.window_table,
+                   core.grid_table, *RENDER_CODE),
+             params={"WINDOWS": WINDOWS, **RENDER}),
+        Node("tables_html", build_tables_html, ["table1_2", "table3", "table4", "table5_6"],
+             code=(build_tables_html, core.write_page, core.page_parts),
+             params={"HEAD": core.PAGE_HEAD, "TAIL": core.PAGE_TAIL},
+             outputs=[tables.OUTPUT], store=False),
+    ]
+
+
+def figure_nodes() -> list:
+    import figures
+    # The EW series is built once and shared by both figures.
+    nodes = [Node("ew_series", build_ew_series, ["dataset"],
+                  code=(build_ew_series, figures.build_ew_series, *PRICE_CODE),
+                  params={"INSTRUMENTS": INSTRUMENTS})]
+    for mode, outfile, caption in figures.FIGURES:
+        nodes.append(Node(
+            os.path.basename(outfile)[:-4], build_figure, ["ew_series"],
+            code=(build_figure, figures.render_figure, figures.equity_panels, figures.downsample,
+                  figures.lttb, figures.figure_caption, core.equity_curve, *SIGNAL_CODE),
+            params={"WINDOWS": WINDOWS, "SIGNAL_EPS": SIGNAL_EPS,
+                    "MAX_POINTS": figures.MAX_POINTS},
+            kwargs={"mode": mode, "outfile": outfile, "caption": caption},
+            outputs=[outfile], store=False,
+        ))
+    return nodes
+
+
+# ══════════════════════════════════════════════════════════════════
+# RUNNER
+# ══════════════════════════════════════════════════════════════════
+
+def read_manifest(store_dir: str) -> dict:
+    try:
+        with open(os.path.join(store_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(manifest: dict, store_dir: str) -> None:
+    tmp = os.path.join(store_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(store_dir, MANIFEST))
+
+
+def is_fresh(node: Node, key: str, entry: dict, store_dir: str) -> bool:
+    if not entry or entry.get("key") != key:
+        return False
+    if node.store and not os.path.isfile(os.path.join(store_dir, f"{node.name}.pkl")):
+        return False
+    return all(os.path.isfile(p) and file_digest(p) == entry["outputs"].get(p)
+               for p in node.outputs)
+
+
+def build_node(node: Node, args: list):
+    with span(f"pipeline.{node.name}"):
+        return node.build(*args, **node.kwargs)
+
+
+def run(nodes: list = None, workers: int = None, force: bool = False,
+        store_dir: str = STORE_DIR, stages: tuple = STAGES) -> dict:
+    # Rebuilds stale nodes only; a node whose dependencies are all done is
+    # submitted at once, so independent branches (tables vs. figures) overlap.
+    nodes = graph(stages=stages) if nodes is None else nodes
+    by_name = {n.name: n for n in nodes}
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = read_manifest(store_dir)
+
+    keys, stale = {}, set()
+    for n in nodes:
+        keys[n.name] = n.key([keys[d] for d in n.deps])
+        if force or not is_fresh(n, keys[n.name], manifest.get(n.name), store_dir):
+            stale.add(n.name)
+    # Unstored nodes are rebuilt whenever a stale node needs their value;
+    # walking the graph backwards carries that through chains of them.
+    for n in reversed(nodes):
+        if n.name not in stale:
+            continue
+        for d in n.deps:
+            if not by_name[d].store:
+                stale.add(d)
+    stale_nodes = [n for n in nodes if n.name in stale]
+
+    for n in nodes:
+        if n.name not in stale and n.outputs:
+            print(f"[--] {', '.join(n.outputs)} up to date")
+    if not stale_nodes:
+        return {}
+
+    values = {}
+
+    def value(name):
+        if name not in values:
+            with open(os.path.join(store_dir, f"{name}.pkl"), "rb") as f:
+                values[name] = pickle.load(f)
+        return values[name]
+
+    def record(node, result):
+        values[node.name] = result
+        if node.store:
+            with open(os.path.join(store_dir, f"{node.name}.pkl"), "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        manifest[node.name] = {"key": keys[node.name],
+                               "outputs": {p: file_digest(p) for p in node.outputs}}
+        write_manifest(manifest, store_dir)
+
+    workers = min(workers or os.cpu_count() or 1, len(stale_nodes))
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        pending, running, built = list(stale_nodes), {}, set()
+        while pending or running:
+            for n in [n for n in pending if all(d in built or d not in stale for d in n.deps)]:
+                pending.remove(n)
+                args = [value(d) for d in n.deps]
+                if pool is None or not (n.store or n.outputs):
+                    fut = Future()
+                    try:
+                        fut.set_result(build_node(n, args))
+                    except Exception as exc:
+                        fut.set_exception(exc)
+                else:
+                    fut = pool.submit(build_node, n, args)
+                running[fut] = n
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                n = running.pop(fut)
+                record(n, fut.result())
+                built.add(n.name)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return {n.name: keys[n.name] for n in stale_nodes}
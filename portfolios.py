@@ -0,0 +1,272 @@
+import numpy as np
+from config import TRADING_DAYS
+from core import MIN_OBS
+
+REBALANCE   = 21            # sessions between rebalances; 1 rebalances daily
+COVARIANCE  = "ewma"        # covariance estimator: "ewma" or "rolling"
+COV_SPAN    = 60            # EWMA span in sessions
+COV_WINDOW  = TRADING_DAYS  # rolling-window length in sessions
+SHRINK      = 0.10          # weight moved from the covariances to the diagonal
+SPREAD_RISK = 1.0           # mean half-spread counted as a common risk factor of this size
+RC_TOL      = 1e-8          # risk-parity stop: largest relative error of a risk contribution
+NEWTON_ITER = 50
+
+# name → (row label, weights). weights(S, c, w0) maps a covariance matrix,
+# the mean half-spreads and the previous weights (a warm start) to long-only
+# weights summing to one.
+WEIGHTINGS = {}
+
+
+def register(name: str, label: str):
+    def wrap(fn):
+        WEIGHTINGS[name] = (label, fn)
+        return fn
+    return wrap
+
+
+# ══════════════════════════════════════════════════════════════════
+# COVARIANCE — running sums updated by the sessions since the last call
+# ══════════════════════════════════════════════════════════════════
+
+def add_outer(S: np.ndarray, B: np.ndarray, w) -> None:
+    # S += Bᵀ·diag(w)·B in place. A single row is a BLAS rank-1 update of S
+    # (symmetric, so its transpose is the column-major matrix BLAS expects)
+    # rather than a temporary outer product added to it.
+    from scipy.linalg.blas import dger   # ~0.2 s to import; only a store miss needs it
+    if len(B) == 1:
+        dger(float(w[0]), B[0], B[0], a=S.T, overwrite_a=True)
+    else:
+        S += (B * w[:, None]).T @ B
+
+
+def central(S: np.ndarray, sx: np.ndarray, W: float, shrink: float) -> np.ndarray:
+    # (S/W − m·mᵀ) with m = sx/W and the off-diagonal entries scaled by
+    # 1 − shrink, built in one new array.
+    from scipy.linalg.blas import dger
+    m = sx / W
+    d = np.diag(S) / W - m * m
+    out = np.multiply(S, (1.0 - shrink) / W)
+    dger(shrink - 1.0, m, m, a=out.T, overwrite_a=True)
+    out[np.diag_indices(len(out))] = d
+    return out
+
+
+class RollingCovariance:
+    # Covariance of the last `window` rows of X before t, and the mean of the
+    # same rows of Y. advance(t) adds the new rows and subtracts those that
+    # left the window, so a step costs O(h·K²) for h new sessions whatever
+    # the window length.
+
+    def __init__(self, X: np.ndarray, Y: np.ndarray, window: int = COV_WINDOW):
+        self.X, self.Y, self.window = X, Y, window
+        K = X.shape[1]
+        self.t, self.S, self.sx, self.sy = 0, np.zeros((K, K)), np.zeros(K), np.zeros(K)
+
+    def add(self, rows: slice, sign: float) -> None:
+        B = self.X[rows]
+        add_outer(self.S, B, np.full(len(B), sign))
+        self.sx += sign * B.sum(axis=0)
+        self.sy += sign * self.Y[rows].sum(axis=0)
+
+    def advance(self, t: int) -> None:
+        w = self.window
+        self.add(slice(max(self.t, t - w), t), 1.0)
+        gone = slice(max(self.t - w, 0), min(max(t - w, 0), self.t))
+        if gone.stop > gone.start:
+            self.add(gone, -1.0)
+        self.t = t
+
+    @property
+    def n(self) -> int:
+        return min(self.t, self.window)
+
+    def moments(self, shrink: float = 0.0) -> tuple:
+        return central(self.S, self.sx, self.n, shrink), self.sy / self.n
+
+
+class EwmaCovariance:
+    # Covariance of the rows of X before t weighted by λ^age, and the same
+    # weighted mean of Y. Rows are added with weight λ^-(s - base), so old
+    # sums never need decaying: the common factor cancels in the moments,
+    # and the sums are rebased onto the latest row before it can overflow.
+
+    def __init__(self, X: np.ndarray, Y: np.ndarray, span: float = COV_SPAN):
+        self.X, self.Y, self.lam = X, Y, 1.0 - 2.0 / (span + 1.0)
+        K = X.shape[1]
+        self.t, self.base, self.W = 0, 0, 0.0
+        self.S, self.sx, self.sy = np.zeros((K, K)), np.zeros(K), np.zeros(K)
+
+    def advance(self, t: int) -> None:
+        if self.lam ** (self.base - t) > 1e100:
+            f = self.lam ** (self.t - self.base)
+            self.S *= f
+            self.sx *= f
+            self.sy *= f
+            self.W *= f
+            self.base = self.t
+        w = self.lam ** (self.base - np.arange(self.t, t, dtype=np.float64))
+        B = self.X[self.t:t]
+        add_outer(self.S, B, w)
+        self.sx += w @ B
+        self.sy += w @ self.Y[self.t:t]
+        self.W += w.sum()
+        self.t = t
+
+    @property
+    def n(self) -> int:
+        return self.t
+
+    def moments(self, shrink: float = 0.0) -> tuple:
+        return central(self.S, self.sx, self.W, shrink), self.sy / self.W
+
+
+ESTIMATORS = {"ewma": EwmaCovariance, "rolling": RollingCovariance}
+
+
+# ══════════════════════════════════════════════════════════════════
+# WEIGHTINGS
+# ══════════════════════════════════════════════════════════════════
+
+def long_only_min_variance(S: np.ndarray, w0: np.ndarray) -> np.ndarray:
+    # Active set: solve S·x = 1 on the instruments held, drop those with
+    # negative weight, re-admit an excluded one whose marginal variance
+    # (S·w)_i is below the portfolio's. Starts from the holdings of w0.
+    from scipy.linalg import cho_factor, cho_solve   # ~0.2 s to import; only a store miss needs it
+    K = len(S)
+    on = w0 > 0
+    w = np.full(K, 1.0 / K)
+    for _ in range(2 * K + 1):
+        idx = np.flatnonzero(on)
+        x = cho_solve(cho_factor(S[np.ix_(idx, idx)]), np.ones(len(idx)))
+        x /= x.sum()
+        if (x < 0).any():
+            on[idx[x < 0]] = False
+            continue
+        w = np.zeros(K)
+        w[idx] = x
+        g = S @ w
+        add = ~on & (g < (w @ g) * (1.0 - 1e-12))
+        if not add.any():
+            break
+        on[np.argmin(np.where(add, g, np.inf))] = True
+    return w
+
+
+@register("inverse_vol", "Inverse-volatility Portfolio")
+def inverse_vol(S: np.ndarray, c: np.ndarray, w0: np.ndarray) -> np.ndarray:
+    v = 1.0 / np.sqrt(np.diag(S))
+    return v / v.sum()
+
+
+@register("risk_parity", "Risk-parity Portfolio")
+def risk_parity(S: np.ndarray, c: np.ndarray, w0: np.ndarray) -> np.ndarray:
+    # Equal risk contributions w_i·(S·w)_i: Newton's method on the convex
+    # ½xᵀSx − (1/K)·Σ log x_i, whose minimizer is proportional to them,
+    # from w0 scaled onto xᵀSx = 1, with steps halved to keep x > 0. Near a
+    # warm start the Hessian barely moves, so its factorization is reused
+    # while each step still cuts the error tenfold.
+    from scipy.linalg import cho_factor, cho_solve
+    b = 1.0 / len(S)
+    x = w0 / np.sqrt(w0 @ S @ w0)
+    H, last = None, np.inf
+    for _ in range(NEWTON_ITER):
+        Sx = S @ x
+        err = np.abs(x * Sx - b).max()
+        if err <= RC_TOL * b:
+            break
+        if H is None or err > 0.1 * last:
+            H = cho_factor(S + np.diag(b / (x * x)), overwrite_a=True)
+        last = err
+        dx = cho_solve(H, Sx - b / x)
+        step = 1.0
+        while (x - step * dx <= 0).any():
+            step /= 2.0
+        x = x - step * dx
+    return x / x.sum()
+
+
+@register("min_variance", "Minimum-variance Portfolio")
+def min_variance(S: np.ndarray, c: np.ndarray, w0: np.ndarray) -> np.ndarray:
+    return long_only_min_variance(S, w0)
+
+
+@register("spread_penalized", "Spread-penalized Portfolio")
+def spread_penalized(S: np.ndarray, c: np.ndarray, w0: np.ndarray) -> np.ndarray:
+    # Minimum variance with the half-spreads as one more, fully correlated
+    # risk: wide-spread instruments cost as if they were that much riskier.
+    return long_only_min_variance(S + SPREAD_RISK * np.outer(c, c), w0)
+
+
+# ══════════════════════════════════════════════════════════════════
+# PORTFOLIOS
+# ══════════════════════════════════════════════════════════════════
+
+def portfolio_weights(R: np.ndarray, C: np.ndarray, weighting: str,
+                      every: int = REBALANCE, estimator: str = COVARIANCE) -> np.ndarray:
+    # (sessions × instruments) weights held over each session's return, set
+    # at the last rebalance before it from returns and half-spreads up to the
+    # previous session. Missing values count as flat sessions. Weights are
+    # equal until MIN_OBS sessions are available; instruments without
+    # variance in the estimation window get none.
+    T, K = R.shape
+    fn = WEIGHTINGS[weighting][1]
+    est = ESTIMATORS[estimator](np.nan_to_num(R), np.nan_to_num(C))
+    W = np.empty((T, K))
+    w = np.full(K, 1.0 / K)
+    W[0] = w
+    for t in range(1, T, every):
+        est.advance(t)
+        if est.n >= MIN_OBS:
+            S, c = est.moments(SHRINK)
+            ok = np.diag(S) > 0
+            if ok.any():
+                if not ok.all():
+                    S, c = S[np.ix_(ok, ok)], c[ok]
+                w0 = w[ok] if w[ok].sum() > 0 else np.ones(ok.sum())
+                w = np.zeros(K)
+                w[ok] = fn(S, c, w0 / w0.sum())
+        W[t:t + every] = w
+    return W
+
+
+def weighted_mean(X: np.ndarray, W: np.ndarray) -> np.ndarray:
+    # Σ w·x over the instruments quoted in each session, reweighted to sum to
+    # one like the NaN-skipping EW mean; NaN where none is.
+    valid = ~np.isnan(X)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = np.where(valid, W, 0.0).sum(axis=1)
+        out = np.where(valid, X * W, 0.0).sum(axis=1) / total
+    return np.where(total > 0, out, np.nan)
+
+
+def portfolio_matrix(panel, weightings: list = None, every: int = REBALANCE,
+                     estimator: str = COVARIANCE) -> tuple:
+    # (labels, R, C) of the weighted portfolios of a panel's instruments, one
+    # column each, in WEIGHTINGS order.
+    names = list(weightings or WEIGHTINGS)
+    T = len(panel.R)
+    R, C = np.empty((T, len(names))), np.empty((T, len(names)))
+    for k, name in enumerate(names):
+        W = portfolio_weights(panel.R, panel.C, name, every, estimator)
+        R[:, k] = weighted_mean(panel.R, W)
+        C[:, k] = weighted_mean(panel.C, W)
+    return [WEIGHTINGS[name][0] for name in names], R, C
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import pandas as pd
+    from core import load_data
+    from panel import instrument_panel
+    ap = argparse.ArgumentParser(description="Average weights of the alternative portfolios.")
+    ap.add_argument("--every", type=int, default=REBALANCE, help="sessions between rebalances")
+    ap.add_argument("--estimator", default=COVARIANCE, choices=list(ESTIMATORS))
+    args = ap.parse_args()
+    panel = instrument_panel(load_data())
+    out = {}
+    for name, (label, _) in WEIGHTINGS.items():
+        t0 = time.perf_counter()
+        out[label] = portfolio_weights(panel.R, panel.C, name, args.every, args.estimator).mean(axis=0)
+        print(f"  {label:<30} {time.perf_counter() - t0:7.3f} s")
+    print(pd.DataFrame(out, index=panel.names).round(3).to_string())
@@ -0,0 +1,187 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:                      # not available on Windows
+    resource = None
+
+TRACE_FILE   = "run_trace.json"
+PROFILE_TOP  = 25                        # rows printed per cProfile dump
+
+TRACER = None
+
+
+def rss_mb() -> float:
+    # Current resident set size, from /proc where available.
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb() -> float:
+    # Process-lifetime high-water mark (kB on Linux, bytes on macOS).
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class Tracer:
+    # Collects nested timing spans with memory readings and writes them as
+    # Chrome trace events (chrome://tracing, ui.perfetto.dev). One span name
+    # may be wrapped in cProfile on request.
+
+    def __init__(self, profile: str = None, profile_dir: str = "."):
+        self.t0 = time.perf_counter_ns()
+        self.spans = []
+        self.stack = []
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.profiler = None
+
+    def now_us(self) -> float:
+        return (time.perf_counter_ns() - self.t0) / 1e3
+
+    @contextmanager
+    def span(self, name: str, **args):
+        depth = len(self.stack)
+        self.stack.append(name)
+        prof = self.start_profile(name)
+        blocks0, peak0 = sys.getallocatedblocks(), peak_rss_mb()
+        start = self.now_us()
+        try:
+            yield
+        finally:
+            end = self.now_us()
+            if prof:
+                self.stop_profile(name)
+            peak = peak_rss_mb()
+            self.spans.append({
+                "name": name, "depth": depth, "ts": start, "dur": end - start,
+                "rss_mb": rss_mb(), "peak_rss_mb": peak,
+                "peak_growth_mb": None if peak is None else peak - peak0,
+                "blocks": sys.getallocatedblocks() - blocks0,
+                "args": args,
+            })
+            self.stack.pop()
+
+    # ── cProfile ─────────────────────────────────────────────────────
+
+    def start_profile(self, name: str) -> bool:
+        # cProfile cannot nest, so only the outermost matching span is profiled.
+        if self.profile is None or self.profiler is not None or not matches(name, self.profile):
+            return False
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        return True
+
+    def stop_profile(self, name: str) -> None:
+        self.profiler.disable()
+        path = os.path.join(self.profile_dir, f"profile_{name.replace('/', '_')}.prof")
+        self.profiler.dump_stats(path)
+        buf = io.StringIO()
+        pstats.Stats(self.profiler, stream=buf).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(f"── cProfile: {name} → {path} ──")
+        print(buf.getvalue().rstrip())
+        self.profiler = None
+
+    # ── output ───────────────────────────────────────────────────────
+
+    def trace_events(self) -> list:
+        pid, tid = os.getpid(), threading.get_ident()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": tid,
+                   "args": {"name": " ".join(sys.argv) or "python"}}]
+        for s in sorted(self.spans, key=lambda s: (s["ts"], s["depth"])):
+            events.append({
+                "name": s["name"], "cat": s["name"].split(".")[0], "ph": "X",
+                "ts": s["ts"], "dur": s["dur"], "pid": pid, "tid": tid,
+                "args": {**s["args"], "rss_mb": s["rss_mb"], "peak_rss_mb": s["peak_rss_mb"],
+                         "peak_growth_mb": s["peak_growth_mb"], "blocks": s["blocks"]},
+            })
+            if s["rss_mb"] is not None:
+                events.append({"name": "memory", "ph": "C", "ts": s["ts"] + s["dur"],
+                               "pid": pid, "tid": tid, "args": {"rss_mb": s["rss_mb"]}})
+        return events
+
+    def write(self, path: str = TRACE_FILE) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        print(f"[OK] {path}")
+
+    def summary(self) -> str:
+        # Spans in start order, indented by depth; repeated names are
+        # aggregated under their first occurrence.
+        rows = {}
+        for s in sorted(self.spans, key=lambda s: (s["ts"], s["depth"])):
+            r = rows.setdefault(s["name"], {"depth": s["depth"], "calls": 0, "secs": 0.0,
+                                            "peak": None, "growth": 0.0, "blocks": 0})
+            r["calls"] += 1
+            r["secs"] += s["dur"] / 1e6
+            r["blocks"] += s["blocks"]
+            r["growth"] += s["peak_growth_mb"] or 0.0
+            if s["peak_rss_mb"] is not None:
+                r["peak"] = max(r["peak"] or 0.0, s["peak_rss_mb"])
+        width = max([len(n) + 2 * r["depth"] for n, r in rows.items()] + [5])
+        lines = [f"{'Stage':<{width}}  {'calls':>5}  {'time (s)':>9}  {'peak RSS':>9}  "
+                 f"{'+peak':>8}  {'Δblocks':>9}"]
+        for name, r in rows.items():
+            peak = "" if r["peak"] is None else f"{r['peak']:6.0f} MB"
+            lines.append(f"{'  ' * r['depth'] + name:<{width}}  {r['calls']:>5}  {r['secs']:>9.3f}  "
+                         f"{peak:>9}  {r['growth']:5.0f} MB  {r['blocks']:>9,}")
+        return "\n".join(lines)
+
+
+def matches(name: str, target: str) -> bool:
+    # "robustness" matches "robustness" itself; "section_spa" matches
+    # "robustness.section_spa".
+    return name == target or name.endswith("." + target)
+
+
+@contextmanager
+def span(name: str, **args):
+    # No-op unless a Tracer has been installed with enable().
+    if TRACER is None:
+        yield
+    else:
+        with TRACER.span(name, **args):
+            yield
+
+
+def enable(profile: str = None, profile_dir: str = ".") -> Tracer:
+    global TRACER
+    TRACER = Tracer(profile, profile_dir)
+    return TRACER
+
+
+def disable() -> None:
+    global TRACER
+    TRACER = None
+
+
+def import_times(modules: list) -> tuple:
+    # Wall time of a fresh interpreter running `import <modules>`, and the
+    # (module, self ms, cumulative ms) of each top-level import it made,
+    # from -X importtime. Nested imports are inside their parent's total.
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+                         capture_output=True, text=True, check=True)
+    wall = (time.perf_counter() - t0) * 1e3
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cum, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            rows.append((name.strip(), int(own) / 1e3, int(cum) / 1e3))
+    return wall, rows
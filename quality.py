@@ -0,0 +1,168 @@
+import hashlib
+import inspect
+import os
+import weakref
+import numpy as np
+import pandas as pd
+from config import INSTRUMENTS, BENCHMARK
+
+STALE_RUN = 10       # sessions with unchanged bid and ask before the repeats are stale
+SPIKE     = 0.10     # |log return| of a one-session excursion …
+REVERT    = 0.25     # … undone the next session to within this fraction of its size
+BENCH_GAP = 0.08     # one-session move of log(mid / benchmark) not seen in world gold
+
+# One bit per rule in the uint8 flag matrix; a cell is valid when no bit is set.
+RULES = {"stale": 1, "crossed": 2, "spike": 4, "gap": 8}
+BID, ASK = "_Buy", "_Sell"
+
+
+def quote_pairs(columns) -> list:
+    # Every (bid, ask) column pair of the dataset, by the X_Buy / X_Sell naming.
+    columns = set(columns)
+    return [(c, c[:-len(BID)] + ASK) for c in sorted(columns)
+            if c.endswith(BID) and c[:-len(BID)] + ASK in columns]
+
+
+# ══════════════════════════════════════════════════════════════════
+# RULES — one vectorized pass over the (sessions × pairs) quote matrices
+# ══════════════════════════════════════════════════════════════════
+
+def long_runs(u: np.ndarray, n: int) -> np.ndarray:
+    # True cells inside a run of at least n consecutive True cells down their
+    # column, i.e. covered by some all-True window of n cells: one cumulative
+    # sum finds the windows, a second spreads each over the cells it covers.
+    # Scratch arrays follow u's memory order, so column-major input stays
+    # column-major and every scan runs along contiguous memory.
+    T, K = u.shape
+    order = "F" if u.flags.f_contiguous else "C"
+    if n > T:
+        return np.zeros((T, K), dtype=bool, order=order)
+    c = np.zeros((T + 1, K), dtype=np.int32, order=order)
+    np.cumsum(u, axis=0, out=c[1:])
+    W = np.zeros((T + 1, K), dtype=np.int32, order=order)
+    np.cumsum(c[n:] - c[:-n] == n, axis=0, out=W[1:T - n + 2])
+    W[T - n + 2:] = W[T - n + 1]
+    out = np.empty((T, K), dtype=bool, order=order)
+    out[:n - 1] = W[1:n] > 0
+    out[n - 1:] = W[n:] > W[:T - n + 1]
+    return out
+
+
+def screen(bid: np.ndarray, ask: np.ndarray, bench: np.ndarray = None) -> np.ndarray:
+    # Flags per quote cell. Missing quotes are left unflagged: they are
+    # already NaN. A round trip flags the excursion session only, so the
+    # move back is not also counted as a benchmark gap.
+    T, K = bid.shape
+    flags = np.zeros_like(bid, dtype=np.uint8)
+
+    def mark(mask, rule):
+        flags[...] |= mask.view(np.uint8) * np.uint8(RULES[rule])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mark((bid <= 0) | (ask <= 0) | (ask <= bid), "crossed")
+
+        same = np.zeros_like(bid, dtype=bool)
+        same[1:] = (bid[1:] == bid[:-1]) & (ask[1:] == ask[:-1])
+        mark(long_runs(same, STALE_RUN), "stale")
+
+        logmid = np.log((bid + ask) / 2.0)
+        r = np.full_like(logmid, np.nan)
+        np.subtract(logmid[1:], logmid[:-1], out=r[1:])
+        # Large moves are rare: the reversal test only runs on candidates.
+        big = np.abs(r) > SPIKE
+        t, k = np.nonzero(big[:-1] & big[1:])
+        back = r[t, k] * r[t + 1, k] < 0
+        back &= np.abs(r[t, k] + r[t + 1, k]) < REVERT * np.abs(r[t, k])
+        t, k = t[back], k[back]
+        flags[t, k] |= RULES["spike"]
+
+        if bench is not None:
+            # A move of log(mid / benchmark) is the return net of the benchmark's.
+            rb = np.full(T, np.nan)
+            rb[1:] = np.diff(np.log(bench))
+            gap = np.abs(r - rb[:, None]) > BENCH_GAP
+            gap[t, k] = False
+            gap[np.minimum(t + 1, T - 1), k] = False
+            mark(gap, "gap")
+    return flags
+
+
+def screen_frame(df: pd.DataFrame, pairs: list) -> np.ndarray:
+    bid = df[[b for b, _ in pairs]].to_numpy(dtype=np.float64)
+    ask = df[[a for _, a in pairs]].to_numpy(dtype=np.float64)
+    bench = df[BENCHMARK].to_numpy(dtype=np.float64) if BENCHMARK in df else None
+    return screen(bid, ask, bench)
+
+
+# ══════════════════════════════════════════════════════════════════
+# CACHE — next to the dataset, one set of flags per frame
+# ══════════════════════════════════════════════════════════════════
+
+RULES_KEY = hashlib.sha256(repr((
+    [inspect.getsource(fn) for fn in (long_runs, screen)],
+    STALE_RUN, SPIKE, REVERT, BENCH_GAP, BENCHMARK,
+)).encode()).hexdigest()[:12]
+
+# id(df) → (pairs, flags); an entry is dropped with its frame.
+FLAGS = {}
+
+
+def register(df: pd.DataFrame, pairs: list, flags: np.ndarray) -> tuple:
+    flags.flags.writeable = False
+    FLAGS[id(df)] = (pairs, flags)
+    weakref.finalize(df, FLAGS.pop, id(df), None)
+    return pairs, flags
+
+
+def load_flags(df: pd.DataFrame, target: str) -> tuple:
+    # Flags of a cached dataset, stored in its cache directory (already keyed
+    # by the source file's content hash) under a hash of the rules.
+    path = os.path.join(target, f"quality-{RULES_KEY}.npz")
+    if os.path.isfile(path):
+        with np.load(path) as z:
+            return register(df, [tuple(p) for p in z["pairs"].tolist()], z["flags"])
+    pairs = quote_pairs(df.columns)
+    flags = screen_frame(df, pairs)
+    tmp = f"{path[:-4]}.tmp{os.getpid()}.npz"
+    np.savez(tmp, pairs=np.array(pairs, dtype=str).reshape(-1, 2), flags=flags)
+    os.replace(tmp, path)
+    return register(df, pairs, flags)
+
+
+def quality_flags(df: pd.DataFrame) -> tuple:
+    # (pairs, flags) for every quote pair of the frame: from load_data's cache
+    # when the frame came from there, otherwise screened now and kept.
+    hit = FLAGS.get(id(df))
+    if hit is not None:
+        return hit
+    pairs = quote_pairs(df.columns)
+    return register(df, pairs, screen_frame(df, pairs))
+
+
+def instrument_flags(df: pd.DataFrame, instruments: dict = INSTRUMENTS) -> np.ndarray:
+    # (sessions × instruments) flags in the order of `instruments`.
+    pairs, flags = quality_flags(df)
+    column = {p: j for j, p in enumerate(pairs)}
+    wanted = [(bid, ask) for bid, ask, *_ in instruments.values()]
+    if all(p in column for p in wanted):
+        return flags[:, [column[p] for p in wanted]]
+    return screen_frame(df, wanted)
+
+
+def valid_mask(df: pd.DataFrame, instruments: dict = INSTRUMENTS) -> pd.DataFrame:
+    return pd.DataFrame(instrument_flags(df, instruments) == 0, index=df["Date"],
+                        columns=list(instruments))
+
+
+def summary(df: pd.DataFrame, instruments: dict = INSTRUMENTS) -> pd.DataFrame:
+    # Flagged cells per instrument and rule, and the share of valid sessions.
+    flags = instrument_flags(df, instruments)
+    out = pd.DataFrame({rule: ((flags & bit) > 0).sum(axis=0) for rule, bit in RULES.items()},
+                       index=list(instruments))
+    out["valid"] = (flags == 0).mean(axis=0)
+    return out
+
+
+if __name__ == "__main__":
+    from core import load_data
+    print(summary(load_data()).to_string())
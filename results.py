@@ -0,0 +1,255 @@
+import hashlib
+import inspect
+import os
+import sqlite3
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import core
+import executor
+import panel
+import periods
+import portfolios
+import signals
+from config import DATA_FILE, INSTRUMENTS, BENCHMARK, BENCHMARK_LABEL, TRADING_DAYS, WINDOWS
+from core import CACHE_DIR, MODES, MIN_OBS, SIGNAL_EPS, file_digest
+
+RESULTS_DB = os.path.join(CACHE_DIR, "results.sqlite")
+LRU_SIZE   = 256
+METRICS    = ["Ra", "sa", "RR", "skew", "turnover", "N"]
+BASE_COST  = "0+1x"        # fixed + multiple × realized half-spread
+FULL       = "full"
+BUY_HOLD   = "buy_hold"    # mode of the buy-and-hold rows (window 0)
+SIGNAL     = "sma"         # signal rule of the paper's tables
+
+# Results are only reused while the code and config that produced them are
+# unchanged: every row carries a hash of the numerical engine.
+ENGINE_CODE = [
+    panel.InstrumentPanel, panel.row_mean, panel.log_returns, core.annualize,
+    core.series_matrix, signals.lagged, signals.lagged_log_price,
+    signals.ema, signals.rolling_max, signals.rolling_min, signals.forward_fill, signals.snap,
+    *[fn for _, fn, _ in signals.SIGNALS.values()], signals.signal_scores,
+    signals.position_matrix, signals.positions, core.net_return_matrix, core.column_metrics, core.column_skew,
+    core.metric_block, core.grid_frame, core.backtest_grid, core.cost_moments, core.cost_surface,
+    executor.ew_columns, executor.scenario_ew_grid, executor.scenario_period,
+    periods.PerformanceIndex,
+    portfolios.add_outer, portfolios.central, portfolios.RollingCovariance,
+    portfolios.EwmaCovariance, portfolios.long_only_min_variance,
+    *[fn for _, fn in portfolios.WEIGHTINGS.values()], portfolios.portfolio_weights,
+    portfolios.weighted_mean, portfolios.portfolio_matrix,
+]
+ENGINE = hashlib.sha256(repr((
+    [inspect.getsource(fn) for fn in ENGINE_CODE],
+    INSTRUMENTS, BENCHMARK, BENCHMARK_LABEL, TRADING_DAYS, MIN_OBS, SIGNAL_EPS,
+    signals.EMA_SLOW, signals.VOL_SPAN, signals.TARGET_VOL, signals.MAX_LEVERAGE,
+    portfolios.REBALANCE, portfolios.COVARIANCE, portfolios.COV_SPAN, portfolios.COV_WINDOW,
+    portfolios.SHRINK, portfolios.SPREAD_RISK, portfolios.RC_TOL,
+)).encode()).hexdigest()[:16]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    dataset    TEXT    NOT NULL,
+    engine     TEXT    NOT NULL,
+    cost       TEXT    NOT NULL,
+    period     TEXT    NOT NULL,
+    signal     TEXT    NOT NULL,
+    mode       TEXT    NOT NULL,
+    window     INTEGER NOT NULL,
+    instrument TEXT    NOT NULL,
+    Ra REAL, sa REAL, RR REAL, skew REAL, turnover REAL, N INTEGER,
+    PRIMARY KEY (dataset, engine, cost, period, signal, mode, window, instrument)
+)
+"""
+
+
+def cost_label(fixed: float = 0.0, multiple: float = 1.0) -> str:
+    return f"{fixed:g}+{multiple:g}x"
+
+
+def period_label(t0, t1) -> str:
+    return f"{t0}..{t1}"
+
+
+def ew_label(excl=None) -> str:
+    return "EW Portfolio" if not excl else "EW Portfolio excl. " + ", ".join(sorted(excl))
+
+
+class ResultsStore:
+    # SQLite table of per-cell metrics keyed by (dataset hash, engine hash,
+    # cost scenario, period, signal rule, mode, window, instrument). Queries go through an
+    # in-process LRU that is cleared on every write; cached frames are shared,
+    # so callers must not modify them in place.
+
+    def __init__(self, path: str = RESULTS_DB, engine: str = ENGINE, cache_size: int = LRU_SIZE):
+        self.path = path
+        self.engine = engine
+        self.conn = None
+        self.cached = lru_cache(maxsize=cache_size)(self.fetch)
+
+    def connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30)
+            # Stores written before the signal column are derived data: rebuilt.
+            cols = [r[1] for r in self.conn.execute("PRAGMA table_info(results)")]
+            if cols and "signal" not in cols:
+                with self.conn:
+                    self.conn.execute("DROP TABLE results")
+            self.conn.execute(SCHEMA)
+        return self.conn
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def put(self, dataset: str, frame: pd.DataFrame, cost: str = BASE_COST,
+            period: str = FULL, replace: bool = True, signal: str = SIGNAL) -> None:
+        # `frame` is indexed by (mode, window, instrument); missing metric
+        # columns are stored as NULL. replace=False keeps rows already stored.
+        flat = frame.reset_index()
+        rows = zip(
+            flat["mode"], flat["window"].astype(int), flat["instrument"],
+            *[flat[m] if m in flat else [None] * len(flat) for m in METRICS],
+        )
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO results "
+                "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                [(dataset, self.engine, cost, period, signal, mode, window, name,
+                  *[None if v is None or pd.isna(v) else float(v) for v in vals[:-1]],
+                  None if vals[-1] is None or pd.isna(vals[-1]) else int(vals[-1]))
+                 for mode, window, name, *vals in rows],
+            )
+        self.cached.cache_clear()
+
+    def fetch(self, dataset: str, cost: str, period: str, modes: tuple,
+              windows: tuple, instruments: tuple, signal: str = SIGNAL) -> pd.DataFrame:
+        sql = ("SELECT mode, window, instrument, Ra, sa, RR, skew, turnover, N FROM results "
+               "WHERE dataset = ? AND engine = ? AND cost = ? AND period = ? AND signal = ?")
+        args = [dataset, self.engine, cost, period, signal]
+        for col, vals in (("mode", modes), ("window", windows), ("instrument", instruments)):
+            if vals is not None:
+                sql += f" AND {col} IN ({','.join('?' * len(vals))})"
+                args += list(vals)
+        rows = self.connect().execute(sql, args).fetchall()
+        index = pd.MultiIndex.from_tuples([r[:3] for r in rows],
+                                          names=["mode", "window", "instrument"])
+        out = pd.DataFrame(np.array([r[3:] for r in rows], dtype=np.float64).reshape(-1, 6),
+                           index=index, columns=METRICS)
+        out["N"] = out["N"].fillna(0).astype(np.int64)
+        # Rows come back in the order the filters list them; unfiltered
+        # levels keep the primary-key order.
+        order = pd.MultiIndex.from_product(
+            [list(v) if v is not None else out.index.unique(level).tolist()
+             for v, level in ((modes, "mode"), (windows, "window"), (instruments, "instrument"))],
+            names=out.index.names,
+        )
+        return out.reindex(order[order.isin(out.index)])
+
+    def query(self, dataset: str, cost: str = BASE_COST, period: str = FULL,
+              modes=None, windows=None, instruments=None, signal: str = SIGNAL) -> pd.DataFrame:
+        def key(v):
+            return None if v is None else tuple([v] if isinstance(v, (str, int)) else v)
+        return self.cached(dataset, cost, period, key(modes), key(windows), key(instruments),
+                           signal)
+
+    def has(self, dataset: str, cost: str = BASE_COST, period: str = FULL,
+            modes=None, windows=None, instruments=None, rows: int = 1,
+            signal: str = SIGNAL) -> bool:
+        return len(self.query(dataset, cost, period, modes, windows, instruments, signal)) >= rows
+
+    def datasets(self) -> pd.DataFrame:
+        rows = self.connect().execute(
+            "SELECT dataset, engine, signal, COUNT(*) FROM results "
+            "GROUP BY dataset, engine, signal").fetchall()
+        return pd.DataFrame(rows, columns=["dataset", "engine", "signal", "rows"])
+
+    # ── robustness scenarios ─────────────────────────────────────────
+
+    def scenario_keys(self, spec: tuple) -> tuple:
+        # (cost, period, mode, windows, instrument) of an executor scenario,
+        # or None for kinds the store does not index.
+        kind, p = spec
+        if kind == "ew_grid":
+            cost = cost_label(p.get("fixed", 0.0), p.get("multiple", 1.0))
+            return cost, FULL, p["mode"], tuple(p["windows"]), ew_label(p.get("excl"))
+        if kind == "period":
+            return (BASE_COST, period_label(p["t0"], p["t1"]), p["mode"],
+                    tuple(p["windows"]), ew_label(p.get("excl")))
+        return None
+
+    def get_scenario(self, dataset: str, spec: tuple) -> dict:
+        keys = self.scenario_keys(spec)
+        if keys is None:
+            return None
+        cost, period, mode, windows, name = keys
+        out = self.query(dataset, cost, period, mode, windows, name)
+        if len(out) != len(windows):
+            return None
+        out = out.droplevel(["mode", "instrument"]).reindex(list(windows))
+        return {m: out[m].tolist() for m in ["Ra", "sa", "RR", "N"]}
+
+    def put_scenario(self, dataset: str, spec: tuple, result: dict) -> None:
+        keys = self.scenario_keys(spec)
+        if keys is None or result is None:
+            return
+        cost, period, mode, windows, name = keys
+        index = pd.MultiIndex.from_product([[mode], windows, [name]],
+                                           names=["mode", "window", "instrument"])
+        self.put(dataset, pd.DataFrame(result, index=index), cost, period, replace=False)
+
+
+# ══════════════════════════════════════════════════════════════════
+# PRODUCERS
+# ══════════════════════════════════════════════════════════════════
+
+def universe(instruments: dict = INSTRUMENTS) -> list:
+    # Row order of every report table.
+    return (list(instruments) + ["EW Portfolio"]
+            + [label for label, _ in portfolios.WEIGHTINGS.values()] + [BENCHMARK_LABEL])
+
+
+def report_matrix(data: panel.InstrumentPanel) -> tuple:
+    # (names, R, C) in universe() order: the panel's instrument, EW and
+    # benchmark columns with the weighted portfolios before the benchmark.
+    names, R, C = data.matrix()
+    labels, Rp, Cp = portfolios.portfolio_matrix(data)
+    k = len(names) - 1
+    return (names[:k] + labels + names[k:], np.hstack([R[:, :k], Rp, R[:, k:]]),
+            np.hstack([C[:, :k], Cp, C[:, k:]]))
+
+
+def buy_hold_metrics(series: dict) -> pd.DataFrame:
+    from scipy.stats import skew     # imported here: only a store miss needs scipy
+    rows = {}
+    for name, (r, _) in series.items():
+        r_clean = r.dropna()
+        Ra, sa, RR = core.annualize(r_clean)
+        rows[(BUY_HOLD, 0, name)] = {"Ra": Ra, "sa": sa, "RR": RR,
+                                     "skew": float(skew(r_clean.values)),
+                                     "turnover": 0.0, "N": len(r_clean)}
+    out = pd.DataFrame.from_dict(rows, orient="index")
+    out.index.names = ["mode", "window", "instrument"]
+    return out
+
+
+def produce(df: pd.DataFrame, dataset: str, store: ResultsStore = None,
+            windows: list = WINDOWS, modes: list = MODES, signal: str = SIGNAL) -> None:
+    # Buy-and-hold and the full-sample strategy grid, written once per
+    # (dataset, engine, signal); later calls find them in the store.
+    store = store or ResultsStore()
+    names = universe()
+    if (store.has(dataset, modes=BUY_HOLD, instruments=names, rows=len(names)) and
+            store.has(dataset, modes=modes, windows=windows, instruments=names,
+                      rows=len(modes) * len(windows) * len(names), signal=signal)):
+        return
+    names, R, C = report_matrix(panel.instrument_panel(df))
+    store.put(dataset, buy_hold_metrics(
+        {name: (pd.Series(R[:, k], index=df.index), None) for k, name in enumerate(names)}))
+    store.put(dataset, core.backtest_grid(R, C, windows, modes, names, signal), signal=signal)
+
+
+def dataset_key(path: str = DATA_FILE) -> str:
+    return file_digest(path)
@@ -1,15 +1,28 @@
-# robustness.py  (updated: removed Bootstrap SPA Test)
+# robustness.py  (updated: Bootstrap SPA Test reinstated, see spa.py)
 
+import os
 import pandas as pd
 import numpy as np
 from core import (
-    load_data, mid_price, log_return, half_spread,
-    annualize, momentum_signal, net_return,
-    build_instrument_series, html_page, CSS,
+    load_data, build_instrument_series, write_page, format_column, cell_classes,
+    cost_moments, break_even_costs, backtest_grid, MODES,
 )
-from config import INSTRUMENTS, BENCHMARK, BENCHMARK_LABEL, TRADING_DAYS
-
-OUTPUT = "robustness_output.html"
+from executor import run_serial, run_scenarios
+from panel import instrument_panel
+from profiling import span
+from results import ResultsStore, dataset_key
+from periods import PerformanceIndex
+from leadlag import MAX_LAG, ROLL_WINDOW, ROLL_STEP, cross_correlations, peak_lags, \
+    return_matrix, rolling_cross_correlations
+from execution import fill_costs, execution_grid
+from quality import RULES, STALE_RUN, SPIKE, REVERT, BENCH_GAP, summary as quality_summary
+from spa import spa_table, N_BOOT, BLOCK_LEN
+from walkforward import walk_forward_table, WF_WINDOWS, TRAIN as WF_TRAIN, STEP as WF_STEP
+from signals import SIGNALS, EMA_SLOW, VOL_SPAN, TARGET_VOL, MAX_LEVERAGE
+from subsets import FIELDS, MAX_SUBSETS, family, family_size, instrument_matrix, subset_grid, summarize
+from config import INSTRUMENTS, BENCHMARK_LABEL, TRADING_DAYS, WINDOWS, OUTPUT_DIR
+
+OUTPUT = os.path.join(OUTPUT_DIR, "robustness_output.html")
 
 # ── Sub-periods ───────────────────────────────────────────────────
 PERIODS = {
@@ -25,6 +38,15 @@ COST_SCENARIOS = {
     "Fixed cost (c=0.25%)":  "fixed",
 }
 
+# Cost per trade = fixed + multiple × realized half-spread
+COST_LEVELS = {
+    "dynamic": (0.0,    1.0),
+    "zero":    (0.0,    0.0),
+    "fixed":   (0.0025, 0.0),
+}
+
+FULL_PERIOD = ("Full sample (2015–2025)", ("2015-01-01", "2025-12-31"))
+
 # ── Extended windows ──────────────────────────────────────────────
 WINDOWS_EXT = [1, 2, 3, 4, 5, 10, 20]
 
@@ -36,18 +58,13 @@ EXCL_MEKONG = {"PNJ Mekong Delta", "SJC Mekong Delta"}
 # HELPERS
 # ══════════════════════════════════════════════════════════════════
 
-def rr_metrics(r, c, n, mode, cost_type="dynamic"):
-    if cost_type == "zero":
-        c_use = pd.Series(0.0, index=c.index)
-    elif cost_type == "fixed":
-        c_use = pd.Series(0.0025, index=c.index)
-    else:
-        c_use = c
-    R = net_return(r, c_use, n, mode)
-    if len(R) < 30:
-        return float("nan"), float("nan"), float("nan")
-    Ra, sa, RR = annualize(R)
-    return round(Ra, 4), round(sa, 4), round(RR, 2)
+def rounded(vals, digits=2):
+    return [round(v, digits) for v in vals]
+
+
+def ew_series(df, excl=None, instruments=INSTRUMENTS):
+    r, c = instrument_panel(df, instruments).drop(excl or ()).ew()
+    return pd.Series(r, index=df.index, copy=False), pd.Series(c, index=df.index, copy=False)
 
 
 def th(cols, first=""):
@@ -56,54 +73,63 @@ def th(cols, first=""):
     return f"<thead><tr>{h}</tr></thead>"
 
 
+def td_cells(vals, neg_red=True, bold_thresh=None):
+    text, x, numeric, _ = format_column(vals, ".2f")
+    cls = cell_classes(x, numeric, neg_red, bold_thresh).tolist()
+    return [f'<td class="R {c}">{t}</td>' if ok else f'<td class="R">{t}</td>'
+            for t, c, ok in zip(text, cls, numeric.tolist())]
+
+
 def td_r(v, neg_red=True, bold_thresh=None):
-    if pd.isna(v):
-        return '<td class="R">—</td>'
-    try:
-        fv  = float(v)
-        s   = f"{fv:.2f}"
-        cc  = ""
-        if neg_red and fv < 0:
-            cc = "neg"
-        elif bold_thresh and fv >= bold_thresh:
-            cc = "hi"
-        return f'<td class="R {cc}">{s}</td>'
-    except (ValueError, TypeError):
-        return f'<td class="R">{v}</td>'
+    return td_cells([v], neg_red, bold_thresh)[0]
+
+
+def tr_rows(labels, rows, cls="", neg_red=True, bold_thresh=None):
+    # Formats the block one column at a time; cls is one class or one per row.
+    labels = list(labels)
+    block  = pd.DataFrame(list(rows))
+    cols   = [td_cells(block[c], neg_red, bold_thresh) for c in block.columns]
+    cells  = ["".join(parts) for parts in zip(*cols)] if cols else [""] * len(labels)
+    classes = [cls] * len(labels) if isinstance(cls, str) else list(cls)
+    return "".join(
+        f'<tr{"" if not c else f" class={chr(34)}{c}{chr(34)}"}><td class="L">{label}</td>{row}</tr>'
+        for label, c, row in zip(labels, classes, cells)
+    )
 
 
 def tr_row(label, vals, cls="", neg_red=True, bold_thresh=None):
-    cells  = f'<td class="L">{label}</td>'
-    cells += "".join(td_r(v, neg_red, bold_thresh) for v in vals)
-    return f'<tr{"" if not cls else f" class={chr(34)}{cls}{chr(34)}"}>{cells}</tr>'
+    return tr_rows([label], [list(vals)], cls, neg_red, bold_thresh)
+
+
+def window_text(windows=WINDOWS):
+    # "1 to 5" for a run of consecutive windows, else "1, 5, 10".
+    if list(windows) == list(range(windows[0], windows[-1] + 1)) and len(windows) > 2:
+        return f"{windows[0]} to {windows[-1]}"
+    return ", ".join(str(n) for n in windows)
 
 
 # ══════════════════════════════════════════════════════════════════
 # TEST 1 — Sub-period Analysis
 # ══════════════════════════════════════════════════════════════════
 
-def section_subperiod(df):
-    windows    = [1, 2, 3, 4, 5]
-    col_labels = [f"n={n}" for n in windows]
+def plan_subperiod():
+    return [
+        ("period", {"t0": t0, "t1": t1, "windows": WINDOWS, "mode": "long_only", "min_rows": 60})
+        for t0, t1 in list(PERIODS.values()) + [FULL_PERIOD[1]]
+    ]
 
-    rows_html = ""
-    for period_name, (t0, t1) in list(PERIODS.items()) + [("Full sample (2015–2025)", ("2015-01-01", "2025-12-31"))]:
-        mask = (df["Date"] >= t0) & (df["Date"] <= t1)
-        sub  = df[mask].reset_index(drop=True)
-        if len(sub) < 60:
-            continue
 
-        r_list, c_list = [], []
-        for name, (bid, ask, *_) in INSTRUMENTS.items():
-            m = mid_price(sub, bid, ask)
-            r_list.append(log_return(m))
-            c_list.append(half_spread(sub, bid, ask))
-        r_ew = pd.concat(r_list, axis=1).mean(axis=1)
-        c_ew = pd.concat(c_list, axis=1).mean(axis=1)
+def section_subperiod(df, instruments=INSTRUMENTS, results=None):
+    col_labels = [f"n={n}" for n in WINDOWS]
+    if results is None:
+        results = run_serial(df, instruments, plan_subperiod())
 
-        vals = [rr_metrics(r_ew, c_ew, n, "long_only")[2] for n in windows]
+    rows_html = ""
+    for period_name, vals in zip(list(PERIODS) + [FULL_PERIOD[0]], results):
+        if vals is None:
+            continue
         cls  = "avg" if "Full" in period_name else ""
-        rows_html += tr_row(period_name, vals, cls=cls, bold_thresh=1.0)
+        rows_html += tr_row(period_name, rounded(vals["RR"]), cls=cls, bold_thresh=1.0)
 
     body = f"<tbody>{rows_html}</tbody>"
     tbl  = f"<table>{th(col_labels, 'Sub-period')}{body}</table>"
@@ -116,7 +142,9 @@ def section_subperiod(df):
         "rules out the possibility that a single episode drives the aggregate result.</p>"
         f"{tbl}"
         "<p class='note'><em>Note:</em> Long-only strategy, dynamic transaction cost "
-        "(half-spread). EW portfolio = equally-weighted average of 13 domestic gold instruments. "
+        f"(half-spread). EW portfolio = equally-weighted average of {len(instruments)} domestic "
+        "gold instruments. "
+        "Signals are formed on the full history and evaluated within each sub-period. "
         "<b>Bold</b>: RR ≥ 1.00. <span style='color:#c00'>Red</span>: RR &lt; 0.</p>"
         "</section>"
     )
@@ -126,23 +154,25 @@ def section_subperiod(df):
 # TEST 2 — Alternative Transaction Costs
 # ══════════════════════════════════════════════════════════════════
 
-def section_altcost(df):
-    windows    = [1, 2, 3, 4, 5]
-    col_labels = [f"n={n}" for n in windows]
+def plan_altcost():
+    # Net return is linear in the cost, so each scenario is a point on the
+    # closed-form cost surface rather than a separate backtest.
+    return [
+        ("ew_grid", {"windows": WINDOWS, "mode": "long_only",
+                     "fixed": COST_LEVELS[cost_type][0], "multiple": COST_LEVELS[cost_type][1]})
+        for cost_type in COST_SCENARIOS.values()
+    ]
 
-    r_list, c_list = [], []
-    for name, (bid, ask, *_) in INSTRUMENTS.items():
-        m = mid_price(df, bid, ask)
-        r_list.append(log_return(m))
-        c_list.append(half_spread(df, bid, ask))
-    r_ew = pd.concat(r_list, axis=1).mean(axis=1)
-    c_ew = pd.concat(c_list, axis=1).mean(axis=1)
+
+def section_altcost(df, instruments=INSTRUMENTS, results=None):
+    col_labels = [f"n={n}" for n in WINDOWS]
+    if results is None:
+        results = run_serial(df, instruments, plan_altcost())
 
     rows_html = ""
-    for scenario_name, cost_type in COST_SCENARIOS.items():
-        vals = [rr_metrics(r_ew, c_ew, n, "long_only", cost_type)[2] for n in windows]
+    for (scenario_name, cost_type), vals in zip(COST_SCENARIOS.items(), results):
         cls  = "ben" if cost_type == "fixed" else ""
-        rows_html += tr_row(scenario_name, vals, cls=cls, bold_thresh=1.0)
+        rows_html += tr_row(scenario_name, rounded(vals["RR"]), cls=cls, bold_thresh=1.0)
 
     body = f"<tbody>{rows_html}</tbody>"
     tbl  = f"<table>{th(col_labels, 'Cost scenario')}{body}</table>"
@@ -166,21 +196,21 @@ def section_altcost(df):
 # TEST 3 — Extended Lookback Windows
 # ══════════════════════════════════════════════════════════════════
 
-def section_extended_windows(df):
-    col_labels = [f"n={n}" for n in WINDOWS_EXT]
+EXT_MODES = [("long_only", "Long-Only"), ("long_short", "Long-Short")]
+
+
+def plan_extended_windows():
+    return [("ew_grid", {"windows": WINDOWS_EXT, "mode": mode}) for mode, _ in EXT_MODES]
+
 
-    r_list, c_list = [], []
-    for name, (bid, ask, *_) in INSTRUMENTS.items():
-        m = mid_price(df, bid, ask)
-        r_list.append(log_return(m))
-        c_list.append(half_spread(df, bid, ask))
-    r_ew = pd.concat(r_list, axis=1).mean(axis=1)
-    c_ew = pd.concat(c_list, axis=1).mean(axis=1)
+def section_extended_windows(df, instruments=INSTRUMENTS, results=None):
+    col_labels = [f"n={n}" for n in WINDOWS_EXT]
+    if results is None:
+        results = run_serial(df, instruments, plan_extended_windows())
 
     rows_html = ""
-    for mode, label in [("long_only", "Long-Only"), ("long_short", "Long-Short")]:
-        vals = [rr_metrics(r_ew, c_ew, n, mode)[2] for n in WINDOWS_EXT]
-        rows_html += tr_row(label, vals, bold_thresh=1.0)
+    for (mode, label), vals in zip(EXT_MODES, results):
+        rows_html += tr_row(label, rounded(vals["RR"]), bold_thresh=1.0)
 
     body = f"<tbody>{rows_html}</tbody>"
     tbl  = f"<table>{th(col_labels, 'Strategy')}{body}</table>"
@@ -202,24 +232,22 @@ def section_extended_windows(df):
 # TEST 4 — Exclude PNJ & SJC Mekong Delta
 # ══════════════════════════════════════════════════════════════════
 
-def section_excl_mekong(df):
-    windows    = [1, 2, 3, 4, 5]
-    col_labels = [f"n={n}" for n in windows]
+def plan_excl_mekong():
+    return [
+        ("ew_grid", {"windows": WINDOWS, "mode": "long_only", "excl": excl})
+        for excl in (None, tuple(sorted(EXCL_MEKONG)))
+    ]
+
+
+def section_excl_mekong(df, instruments=INSTRUMENTS, results=None):
+    col_labels = [f"n={n}" for n in WINDOWS]
+    if results is None:
+        results = run_serial(df, instruments, plan_excl_mekong())
 
-    def ew_rr(excl=None):
-        keys = [k for k in INSTRUMENTS if (excl is None or k not in excl)]
-        r_list, c_list = [], []
-        for k in keys:
-            bid, ask = INSTRUMENTS[k][0], INSTRUMENTS[k][1]
-            m = mid_price(df, bid, ask)
-            r_list.append(log_return(m))
-            c_list.append(half_spread(df, bid, ask))
-        r = pd.concat(r_list, axis=1).mean(axis=1)
-        c = pd.concat(c_list, axis=1).mean(axis=1)
-        return [rr_metrics(r, c, n, "long_only")[2] for n in windows]
-
-    rows_html  = tr_row("EW Full (13 instruments)",      ew_rr(None),        bold_thresh=1.0)
-    rows_html += tr_row("EW ex-Mekong (11 instruments)", ew_rr(EXCL_MEKONG), bold_thresh=1.0, cls="avg")
+    k_full = len(instruments)
+    k_excl = k_full - len(EXCL_MEKONG & set(instruments))
+    rows_html  = tr_row(f"EW Full ({k_full} instruments)",      rounded(results[0]["RR"]), bold_thresh=1.0)
+    rows_html += tr_row(f"EW ex-Mekong ({k_excl} instruments)", rounded(results[1]["RR"]), bold_thresh=1.0, cls="avg")
 
     body = f"<tbody>{rows_html}</tbody>"
     tbl  = f"<table>{th(col_labels, 'Portfolio')}{body}</table>"
@@ -227,49 +255,539 @@ def section_excl_mekong(df):
     return (
         "<section>"
         "<h1>Table R4 — Exclusion of Anomalous Instruments (PNJ &amp; SJC Mekong Delta)</h1>"
-        "<p class='sub'>RR comparison between the full EW portfolio (13 instruments) and "
+        f"<p class='sub'>RR comparison between the full EW portfolio ({k_full} instruments) and "
         "a restricted portfolio excluding PNJ Mekong Delta and SJC Mekong Delta, which "
         "exhibit anomalous returns of ±39% due to data gaps in the source. Consistent "
         "negative RR in both portfolios confirms result robustness.</p>"
         f"{tbl}"
         "<p class='note'><em>Note:</em> Long-only strategy, dynamic transaction cost, "
-        "n = 1 to 5 days. <b>Bold</b>: RR ≥ 1.00. "
+        f"n = {window_text()} days. <b>Bold</b>: RR ≥ 1.00. "
         "<span style='color:#c00'>Red</span>: RR &lt; 0.</p>"
         "</section>"
     )
 
 
 # ══════════════════════════════════════════════════════════════════
-# MASTER RUNNER
+# TEST 5 — Break-even Transaction Costs
 # ══════════════════════════════════════════════════════════════════
 
-def run():
-    print("── Robustness tests ──────────────────────────")
-    df = load_data()
-
-    sections = [
-        "<h1 style='font-size:15px;margin-bottom:6px'>"
-        "Robustness Checks — Vietnamese Physical Gold Momentum Study</h1>"
-        "<p class='sub'>Full-sample period: 02 January 2015 – 31 December 2025 "
-        "(N = 2,837 sessions). All tests based on the EW equally-weighted portfolio "
-        "of 13 domestic gold instruments unless otherwise stated.</p><hr><br>",
+def section_breakeven(df, instruments=INSTRUMENTS):
+    windows    = WINDOWS
+    col_labels = [f"n={n}" for n in windows]
+
+    names, R, C = instrument_panel(df, instruments).matrix()
+    be = break_even_costs(cost_moments(R, C, windows, ["long_only"], names))
+
+    tbls = ""
+    for field, scale, first in [("fixed", 1e4, "Fixed cost (bps)"),
+                                ("multiple", 1.0, "Half-spread multiple")]:
+        vals = (be.loc["long_only", field].unstack("window").reindex(index=names, columns=windows)
+                * scale).round(2)
+        cls  = ["avg" if name == "EW Portfolio" else ("ben" if name == BENCHMARK_LABEL else "")
+                for name in names]
+        rows_html = tr_rows(names, vals.to_numpy().tolist(), cls=cls)
+        tbls += f"<table>{th(col_labels, first)}<tbody>{rows_html}</tbody></table><br>"
+
+    return (
+        "<section>"
+        "<h1>Table R5 — Break-even Transaction Costs</h1>"
+        "<p class='sub'>Cost per trade at which the long-only strategy's RR falls to zero, "
+        "expressed (top) as a fixed cost in basis points and (bottom) as a multiple of the "
+        "realized half-spread c<sub>t</sub>. Values below the realized spread confirm that "
+        "transaction costs, not the signal, drive the negative RR.</p>"
+        f"{tbls}"
+        "<p class='note'><em>Note:</em> Solved in closed form from the mean gross strategy "
+        "return and mean turnover (RR = 0 where the mean net return is zero); no backtest is "
+        "rerun per cost level. Half-spread multiple undefined for the frictionless benchmark. "
+        "<span style='color:#c00'>Red</span>: strategy loses money even at zero cost.</p>"
+        "</section>"
+    )
+
+
+# ══════════════════════════════════════════════════════════════════
+# TEST 6 — Calendar-year and Rolling 1-year RR
+# ══════════════════════════════════════════════════════════════════
+
+def section_calendar(df, instruments=INSTRUMENTS):
+    windows    = WINDOWS
+    col_labels = [f"n={n}" for n in windows]
+
+    r_ew, c_ew = ew_series(df, instruments=instruments)
+    index = PerformanceIndex(df["Date"], r_ew.to_numpy()[:, None], c_ew.to_numpy()[:, None],
+                             windows, ["long_only"])
+    years   = index.calendar("Y")
+    rolling = index.rolling(TRADING_DAYS)
+
+    rows_html  = tr_rows(years.index, years.round(2).to_numpy().tolist(), bold_thresh=1.0)
+    rows_html += tr_row("Rolling 1-year: median RR", rolling.median().round(2).tolist(),
+                        cls="avg", bold_thresh=1.0)
+    rows_html += tr_row("Rolling 1-year: best RR", rolling.max().round(2).tolist(),
+                        cls="ben", bold_thresh=1.0)
+
+    body = f"<tbody>{rows_html}</tbody>"
+    tbl  = f"<table>{th(col_labels, 'Calendar year')}{body}</table>"
+
+    return (
+        "<section>"
+        "<h1>Table R6 — Calendar-year and Rolling 1-year Risk-Return Ratios</h1>"
+        "<p class='sub'>RR of the long-only EW portfolio in each calendar year, with the "
+        f"median and best RR across all rolling {TRADING_DAYS}-session windows. Negative RR in every "
+        "year shows the result is not confined to particular market regimes.</p>"
+        f"{tbl}"
+        "<p class='note'><em>Note:</em> Long-only strategy, dynamic transaction cost. "
+        "All periods are read from one prefix-sum index of the daily strategy returns. "
+        "<b>Bold</b>: RR ≥ 1.00. <span style='color:#c00'>Red</span>: RR &lt; 0.</p>"
+        "</section>"
+    )
+
+
+# ══════════════════════════════════════════════════════════════════
+# TEST 7 — Data-snooping: White Reality Check & Hansen SPA
+# ══════════════════════════════════════════════════════════════════
+
+def section_spa(df, instruments=INSTRUMENTS, n_boot=N_BOOT):
+    col_labels = ["Best rule", "Mean (bps/day)", "RC", "SPA<sub>l</sub>",
+                  "SPA<sub>c</sub>", "SPA<sub>u</sub>"]
+
+    tbl_spa = spa_table(build_instrument_series(df, instruments), n_boot=n_boot)
+
+    vals   = tbl_spa[["Best rule", "Best mean (bps/day)", "RC p", "SPA_l p", "SPA_c p", "SPA_u p"]]
+    labels = [f"{s} (K={k})" for s, k in zip(tbl_spa["Strategy set"], tbl_spa["K"])]
+    cls    = ["avg" if s == "Both" else "" for s in tbl_spa["Strategy set"]]
+    rows_html = tr_rows(labels, vals.to_numpy().tolist(), cls=cls)
+
+    body = f"<tbody>{rows_html}</tbody>"
+    tbl  = f"<table>{th(col_labels, 'Strategy set')}{body}</table>"
+
+    return (
+        "<section>"
+        "<h1>Table R7 — Data-snooping Tests (White Reality Check &amp; Hansen SPA)</h1>"
+        "<p class='sub'>Bootstrap p-values for the null hypothesis that no instrument × "
+        "lookback-window momentum rule earns a positive mean net return over holding cash. "
+        "The tests account for searching over the full strategy universe, so a high p-value "
+        "means even the best rule is consistent with luck.</p>"
+        f"{tbl}"
+        f"<p class='note'><em>Note:</em> Universe = {len(instruments)} instruments + EW portfolio "
+        f"× n = {window_text()}, "
+        f"dynamic transaction cost. Stationary bootstrap, {n_boot:,} resamples, mean block "
+        f"length {BLOCK_LEN}. SPA<sub>l</sub>, SPA<sub>c</sub>, SPA<sub>u</sub>: lower, "
+        "consistent and upper p-values of Hansen (2005); RC: White (2000). "
+        "<span style='color:#c00'>Red</span>: negative mean.</p>"
+        "</section>"
+    )
+
+
+# ══════════════════════════════════════════════════════════════════
+# TEST 8 — Walk-forward Lookback Selection
+# ══════════════════════════════════════════════════════════════════
+
+def section_walkforward(df, instruments=INSTRUMENTS):
+    col_labels = ["Best window (in-sample)", "RR (in-sample)",
+                  f"RR (WF, every {WF_STEP})", f"Modal window (WF, every {WF_STEP})",
+                  "RR (WF, daily)", "Modal window (WF, daily)"]
+
+    wf = walk_forward_table(build_instrument_series(df, instruments), steps=(WF_STEP, 1),
+                            dates=df["Date"])
+    # Window columns print as plain integers, without RR colouring.
+    vals = wf.astype(object)
+    for col in wf.columns:
+        vals[col] = ([None if pd.isna(v) else f"n={int(v)}" for v in wf[col]] if " n" in col
+                     else wf[col].astype(float).round(2))
+    names = list(wf.index)
+    cls   = ["avg" if name == "EW Portfolio" else ("ben" if name == BENCHMARK_LABEL else "")
+             for name in names]
+    rows_html = tr_rows(names, vals.to_numpy().tolist(), cls=cls, bold_thresh=1.0)
+
+    body = f"<tbody>{rows_html}</tbody>"
+    tbl  = f"<table>{th(col_labels, 'Instrument')}{body}</table>"
+
+    return (
+        "<section>"
+        "<h1>Table R8 — Walk-forward Lookback Selection</h1>"
+        "<p class='sub'>Long-only RR when the lookback is chosen out of sample: at each "
+        f"re-estimation date the window n = {WF_WINDOWS[0]} to {WF_WINDOWS[-1]} with the best RR "
+        f"over the trailing {WF_TRAIN} sessions is traded until the next re-estimation. "
+        "The in-sample columns pick the best window over the full sample with hindsight.</p>"
+        f"{tbl}"
+        "<p class='note'><em>Note:</em> Dynamic transaction cost; switching windows pays the "
+        "resulting position change. Out-of-sample returns are stitched from the first "
+        "re-estimation onwards. Training statistics are updated one session at a time. "
+        "<b>Bold</b>: RR ≥ 1.00. <span style='color:#c00'>Red</span>: RR &lt; 0.</p>"
+        "</section>"
+    )
+
+
+# ══════════════════════════════════════════════════════════════════
+# TEST 9 — Alternative Signal Rules
+# ══════════════════════════════════════════════════════════════════
+
+def section_signals(df, instruments=INSTRUMENTS):
+    windows    = WINDOWS
+    col_labels = [f"n={n}" for n in windows]
+
+    names, R, C = instrument_panel(df, instruments).matrix()
+    ew = names.index("EW Portfolio")
+    tbls = ""
+    for mode, first in [("long_only", "Long-only"), ("long_short", "Long-short")]:
+        labels, rows, cls = [], [], []
+        for name, (label, _, _) in SIGNALS.items():
+            grid = backtest_grid(R, C, windows, [mode], names, signal=name)
+            rr = grid.loc[mode, "RR"].unstack("window").reindex(index=names, columns=windows)
+            labels += [f"{label}: EW Portfolio", f"{label}: instruments with RR &gt; 0"]
+            # Counts print as "k/K", without RR colouring.
+            wins = (rr.drop(index=["EW Portfolio", BENCHMARK_LABEL]) > 0).sum()
+            rows   += [rr.iloc[ew].round(2).tolist(), [f"{k}/{len(instruments)}" for k in wins]]
+            cls    += ["avg" if name == "sma" else "", "ben"]
+        rows_html = tr_rows(labels, rows, cls=cls, bold_thresh=1.0)
+        tbls += f"<table>{th(col_labels, first)}<tbody>{rows_html}</tbody></table><br>"
+
+    return (
+        "<section>"
+        "<h1>Table R9 — Alternative Signal Rules</h1>"
+        f"<p class='sub'>RR of the EW portfolio, and the number of the {len(instruments)} "
+        "instruments with a positive RR, when the moving-average signal is replaced by other trend rules with the "
+        "same lookback n. Rules that react to the same price history differently all face the "
+        "same transaction costs.</p>"
+        f"{tbls}"
+        "<p class='note'><em>Note:</em> Dynamic transaction cost. EMA crossover: EMA(n) − "
+        f"EMA({EMA_SLOW}n) of the log price. Donchian breakout: long above the previous n-session "
+        "high, short (flat if long-only) below the low, held until the opposite breakout. "
+        f"Vol-scaled TSMOM: sign of the n-session mean sized to {TARGET_VOL:.0%} annualized "
+        f"volatility (EWMA span {VOL_SPAN}, at most {MAX_LEVERAGE:g}× notional). Sign vote: "
+        "up minus down sessions among the last n. Every rule is computed for all instruments "
+        "at once in one pass over the sample. "
+        "<b>Bold</b>: RR ≥ 1.00. <span style='color:#c00'>Red</span>: RR &lt; 0.</p>"
+        "</section>"
+    )
+
+
+# ══════════════════════════════════════════════════════════════════
+# TEST 10 — Portfolio Composition
+# ══════════════════════════════════════════════════════════════════
+
+SUBSET_FAMILIES = [
+    ("Leave-one-out",                     ["leave1"]),
+    ("Leave-two-out",                     ["leave2"]),
+    ("By type, brand, karat and region",  list(FIELDS)),
+    ("All subsets",                       ["all"]),
+]
+
+
+def section_subsets(df, instruments=INSTRUMENTS):
+    windows    = WINDOWS
+    col_labels = [f"n={n}" for n in windows]
+
+    names, R, C = instrument_matrix(df, instruments)
+    summaries = []
+    for label, fams in SUBSET_FAMILIES:
+        # Families too large to enumerate (all subsets of a big universe) are
+        # listed with their size but not built.
+        size = sum(family_size(f, len(names), instruments) for f in fams)
+        if size > MAX_SUBSETS:
+            summaries.append((label, size))
+            continue
+        built  = [family(f, names, instruments) for f in fams]
+        labels = [x for lab, _ in built for x in lab]
+        masks  = np.vstack([m for _, m in built])
+        summaries.append((label, summarize(subset_grid(R, C, masks, labels, windows))))
+
+    n_all = 2 ** len(names) - 1
+    every = (f"every one of the {n_all:,} non-empty subsets" if n_all <= MAX_SUBSETS else
+             f"all 2<sup>{len(names)}</sup>&#8722;1 non-empty subsets (too many to enumerate)")
+
+    tbls = ""
+    for mode, first in [("long_only", "Long-only"), ("long_short", "Long-short")]:
+        labels, rows, cls = [], [], []
+        for label, summ in summaries:
+            if isinstance(summ, int):
+                labels.append(f"{label} ({summ:,}): not enumerated")
+                rows.append([np.nan] * len(windows))
+                cls.append("")
+                continue
+            s = summ.loc[mode].reindex(windows)
+            k = int(s["subsets"].iloc[0])
+            labels += [f"{label} ({k:,}): median", f"{label}: best",
+                       f"{label}: portfolios with RR &gt; 0"]
+            # Counts print as "k/S", without RR colouring.
+            rows   += [s["p50"].round(2).tolist(), s["max"].round(2).tolist(),
+                       [f"{round(x * k):,}/{k:,}" for x in s["share > 0"]]]
+            cls    += ["avg", "", "ben"]
+        rows_html = tr_rows(labels, rows, cls=cls, bold_thresh=1.0)
+        tbls += f"<table>{th(col_labels, first)}<tbody>{rows_html}</tbody></table><br>"
+
+    return (
+        "<section>"
+        "<h1>Table R10 — Portfolio Composition</h1>"
+        "<p class='sub'>Distribution of the EW portfolio's RR when the portfolio is built "
+        f"from other combinations of the {len(names)} instruments: dropping any one or two, "
+        f"keeping or dropping each type, brand, karat and region, and {every}. "
+        "Table R4 is one point of this distribution.</p>"
+        f"{tbls}"
+        "<p class='note'><em>Note:</em> Dynamic transaction cost. Each subset portfolio is "
+        "the equally-weighted mean of its quoted instruments, built from running column sums "
+        "that add or remove one instrument at a time. Families of more than "
+        f"{MAX_SUBSETS:,} portfolios are not enumerated. "
+        "<b>Bold</b>: RR ≥ 1.00. <span style='color:#c00'>Red</span>: RR &lt; 0.</p>"
+        "</section>"
+    )
+
+
+# ══════════════════════════════════════════════════════════════════
+# TEST 11 — Data-quality Screening
+# ══════════════════════════════════════════════════════════════════
+
+def section_quality(df, instruments=INSTRUMENTS):
+    windows    = WINDOWS
+    col_labels = [f"n={n}" for n in windows]
+
+    counts = quality_summary(df, instruments)
+    # Counts print as plain integers, without RR colouring.
+    rows_html = "".join(
+        f'<tr><td class="L">{name}</td>'
+        + "".join(f'<td class="R">{int(row[rule]):,}</td>' for rule in RULES)
+        + f'<td class="R">{row["valid"]:.1%}</td></tr>'
+        for name, row in counts.iterrows()
+    )
+    rule_labels = ["Stale", "Crossed / zero spread", "Round-trip spike", "Benchmark gap",
+                   "Valid sessions"]
+    tbl_flags = f"<table>{th(rule_labels, 'Instrument')}<tbody>{rows_html}</tbody></table><br>"
+
+    raw = instrument_panel(df, instruments)
+    portfolios = [
+        (f"EW Full ({len(raw)} instruments, raw quotes)",  raw.ew(),                    ""),
+        (f"EW ex-Mekong ({len(raw.drop(EXCL_MEKONG))} instruments, Table R4)",
+         raw.drop(EXCL_MEKONG).ew(), ""),
+        (f"EW Full ({len(raw)} instruments, screened quotes)",
+         instrument_panel(df, instruments, clean=True).ew(), "avg"),
     ]
+    labels, rows, cls = [], [], []
+    for label, (r, c), klass in portfolios:
+        grid = backtest_grid(r[:, None], c[:, None], windows, ["long_only"])
+        labels.append(label)
+        rows.append(grid["RR"].round(2).tolist())
+        cls.append(klass)
+    tbl_rr = (f"<table>{th(col_labels, 'Portfolio')}"
+              f"<tbody>{tr_rows(labels, rows, cls=cls, bold_thresh=1.0)}</tbody></table>")
+
+    return (
+        "<section>"
+        "<h1>Table R11 — Data-quality Screening</h1>"
+        "<p class='sub'>Quote cells flagged by an automatic screen of every bid/ask series "
+        "(top), and the long-only RR of the EW portfolio when flagged quotes are treated as "
+        "missing instead of dropping the Mekong Delta instruments by hand (bottom).</p>"
+        f"{tbl_flags}{tbl_rr}"
+        "<p class='note'><em>Note:</em> Stale: bid and ask unchanged for at least "
+        f"{STALE_RUN} consecutive sessions (the repeats are flagged). Round-trip spike: a "
+        f"one-session move above {SPIKE:.0%} in log mid price reversed to within "
+        f"{REVERT:.0%} the next session. Benchmark gap: a one-session move above "
+        f"{BENCH_GAP:.0%} in the log mid price relative to XAU/VND. A flagged quote removes "
+        "the returns into and out of that session. Dynamic transaction cost. "
+        "<b>Bold</b>: RR ≥ 1.00. <span style='color:#c00'>Red</span>: RR &lt; 0.</p>"
+        "</section>"
+    )
+
 
-    print("  [1/4] Sub-period analysis …")
-    sections.append(section_subperiod(df))
+# ══════════════════════════════════════════════════════════════════
+# TEST 12 — Lead-lag Structure (price discovery)
+# ══════════════════════════════════════════════════════════════════
 
-    print("  [2/4] Alternative transaction costs …")
-    sections.append(section_altcost(df))
+LEADER = "SJC Ho Chi Minh"
 
-    print("  [3/4] Extended lookback windows …")
-    sections.append(section_extended_windows(df))
 
-    print("  [4/4] Exclusion of Mekong Delta instruments …")
-    sections.append(section_excl_mekong(df))
+def heat_td(v):
+    # Blue for positive, red for negative correlation, shaded by size.
+    if np.isnan(v):
+        return '<td class="R">—</td>'
+    rgb = "0,90,200" if v >= 0 else "200,0,0"
+    return f'<td class="R" style="background:rgba({rgb},{min(abs(v), 1.0) * 0.6:.2f})">{v:.2f}</td>'
+
+
+def section_leadlag(df, instruments=INSTRUMENTS):
+    names, R = return_matrix(df, instruments)
+    C = cross_correlations(R, MAX_LAG)
+    L = (len(C) - 1) // 2
+    K = len(names)
+
+    # Panel A: corr(row_t, column_t+1), so a row leads the columns it is dark in.
+    heat = "".join(
+        f'<tr><td class="L">({i + 1}) {name}</td>{"".join(heat_td(v) for v in C[L + 1, i])}</tr>'
+        for i, name in enumerate(names))
+    tbl_heat = f"<table>{th([str(j + 1) for j in range(K)], 'Leader (t) → follower (t+1)')}<tbody>{heat}</tbody></table><br>"
+
+    # Panels B and C: every instrument against the benchmark and the leader,
+    # over the full sample and in rolling one-year windows.
+    refs = [k for k in (names.index(BENCHMARK_LABEL), names.index(LEADER) if LEADER in names else None)
+            if k is not None]
+    pairs = [(a, k) for a in refs for k in range(K) if k != a]
+    _, roll = rolling_cross_correlations(R, pairs, ROLL_WINDOW, ROLL_STEP, MAX_LAG)
+    roll_peak = peak_lags(roll, axis=1)
+    with np.errstate(invalid="ignore"):
+        share = np.where(np.isnan(roll_peak), np.nan, roll_peak > 0)
+    leads = dict(zip(pairs, zip(np.nanmedian(roll_peak, axis=0), np.nanmean(share, axis=0))))
+
+    col_labels = ([f"lag {lag}" for lag in range(-2, 3)]
+                  + ["Peak lag", "Rolling 1y: median peak", "Rolling 1y: share leading"])
+
+    def panel(a):
+        rows = ""
+        for k in range(K):
+            if k == a:
+                continue
+            corr = C[L - 2:L + 3, a, k]
+            med, frac = leads[(a, k)]
+            rows += (f'<tr><td class="L">{names[k]}</td>'
+                     + "".join(td_r(round(v, 2)) for v in corr)
+                     + "".join(f'<td class="R">{"—" if np.isnan(v) else fmt.format(v)}</td>'
+                               for v, fmt in [(peak_lags(C[:, a, k]), "{:+.0f}"),
+                                              (med, "{:+.0f}"), (frac, "{:.0%}")])
+                     + "</tr>")
+        return f"<table>{th(col_labels, f'{names[a]} (t) → instrument (t+lag)')}<tbody>{rows}</tbody></table><br>"
 
-    html = html_page(sections)
-    with open(OUTPUT, "w", encoding="utf-8") as f:
-        f.write(html)
+    return (
+        "<section>"
+        "<h1>Table R12 — Lead-lag Structure</h1>"
+        "<p class='sub'>Lagged cross-correlations of daily log returns for every pair of "
+        "instruments and XAU/VND (top), and the lead-lag profile of each instrument against "
+        f"XAU/VND and {LEADER} over the full sample and rolling one-year windows (below).</p>"
+        f"{tbl_heat}{''.join(panel(a) for a in refs)}"
+        "<p class='note'><em>Note:</em> lag ℓ entry: corr(leader<sub>t</sub>, "
+        "instrument<sub>t+ℓ</sub>); ℓ &gt; 0 means the leader moves first. Peak lag: the lag "
+        f"of the largest absolute correlation within ±{MAX_LAG} sessions. Rolling: "
+        f"{ROLL_WINDOW}-session windows every {ROLL_STEP} sessions, each standardized on "
+        "its own; share leading is the fraction of windows whose peak lag is positive. "
+        "All pairs and lags come from one batched cross-correlation of the return matrix. "
+        "<span style='color:#c00'>Red</span>: negative correlation.</p>"
+        "</section>"
+    )
+
+
+# ══════════════════════════════════════════════════════════════════
+# TEST 13 — Bid/ask Execution
+# ══════════════════════════════════════════════════════════════════
+
+def section_execution(df, instruments=INSTRUMENTS):
+    windows = [WINDOWS[0], WINDOWS[-1]]
+    p = instrument_panel(df, instruments)
+    A, B = fill_costs(p)
+    models = [("Half-spread",           dict(A=p.C, B=p.C, delay=0)),
+              ("Bid/ask",               dict(A=A,   B=B,   delay=0)),
+              ("Bid/ask, next session", dict(A=A,   B=B,   delay=1))]
+    grids = {label: execution_grid(p.R, kw["A"], kw["B"], WINDOWS, MODES, p.names,
+                                   delay=kw["delay"])
+             for label, kw in models}
+
+    # Panel A: long-only RR per instrument under each model.
+    col_labels = [f"{label}: n={n}" for label, _ in models for n in windows]
+    rows = [[grids[label].loc[("long_only", n, name), "RR"].round(2)
+             for label, _ in models for n in windows] for name in p.names]
+    tbl_rr = (f"<table>{th(col_labels, 'Instrument')}"
+              f"<tbody>{tr_rows(p.names, rows, bold_thresh=1.0)}</tbody></table><br>")
+
+    # Panel B: how far the bid/ask metrics move from the half-spread ones,
+    # over every instrument and window.
+    half = grids["Half-spread"]
+    rows_html = ""
+    for label, _ in models[1:]:
+        gap = grids[label][["Ra", "RR"]] - half[["Ra", "RR"]]
+        for mode in MODES:
+            g = gap.xs(mode, level="mode")
+            rows_html += (f'<tr><td class="L">{label} — {mode}</td>'
+                          + "".join(f'<td class="R">{fmt.format(v)}</td>'
+                                    for v, fmt in [(g["Ra"].mean(), "{:+.4f}"),
+                                                   (g["Ra"].abs().max(), "{:.4f}"),
+                                                   (g["RR"].mean(), "{:+.4f}"),
+                                                   (g["RR"].abs().max(), "{:.4f}")])
+                          + "</tr>")
+    tbl_gap = (f"<table>{th(['Ra: mean gap', 'Ra: max |gap|', 'RR: mean gap', 'RR: max |gap|'], 'Model — mode')}"
+               f"<tbody>{rows_html}</tbody></table>")
+
+    return (
+        "<section>"
+        "<h1>Table R13 — Bid/ask Execution</h1>"
+        "<p class='sub'>Long-only RR when trades fill at the quoted ask (entries) and bid "
+        "(exits) instead of paying half the spread at the mid price, with fills at the "
+        "signal session or the next one (top), and the gap to the half-spread model across "
+        f"all instruments and windows n = {WINDOWS[0]}–{WINDOWS[-1]} (bottom).</p>"
+        f"{tbl_rr}{tbl_gap}"
+        "<p class='note'><em>Note:</em> A fill costs ln(ask/mid) per unit bought and "
+        "ln(mid/bid) per unit sold, so a round trip returns exactly ln(bid<sub>exit</sub> / "
+        "ask<sub>entry</sub>); the half-spread (ask − bid)/(2·mid) is their first-order "
+        "approximation. Next session: positions are filled one session after the signal. "
+        "A position cannot change in a session without a quote. Gaps are each bid/ask model "
+        "minus the half-spread model, for the same signals; Ra in log-return units. "
+        "<b>Bold</b>: RR ≥ 1.00. <span style='color:#c00'>Red</span>: RR &lt; 0.</p>"
+        "</section>"
+    )
+
+
+# ══════════════════════════════════════════════════════════════════
+# MASTER RUNNER
+# ══════════════════════════════════════════════════════════════════
+
+# (label, section, plan): sections with a plan fan their scenarios out to
+# the executor; the rest run whole as a single task.
+SECTIONS = [
+    ("Sub-period analysis",                    section_subperiod,        plan_subperiod),
+    ("Alternative transaction costs",          section_altcost,          plan_altcost),
+    ("Extended lookback windows",              section_extended_windows, plan_extended_windows),
+    ("Exclusion of Mekong Delta instruments",  section_excl_mekong,      plan_excl_mekong),
+    ("Break-even transaction costs",           section_breakeven,        None),
+    ("Calendar-year and rolling RR",           section_calendar,         None),
+    ("Bootstrap Reality Check / SPA",          section_spa,              None),
+    ("Walk-forward lookback selection",        section_walkforward,      None),
+    ("Alternative signal rules",               section_signals,          None),
+    ("Portfolio composition",                  section_subsets,          None),
+    ("Data-quality screening",                 section_quality,          None),
+    ("Lead-lag structure",                     section_leadlag,          None),
+    ("Bid/ask execution",                      section_execution,        None),
+]
+
+
+def run(workers=None, select=None):
+    # select: table numbers (1 = R1 …) to build; default all.
+    chosen = [s for i, s in enumerate(SECTIONS, 1) if select is None or i in select]
+    print("── Robustness tests ──────────────────────────")
+    with span("robustness.load_data"):
+        df = load_data()
+
+    specs, spans = [], []
+    for label, section, plan in chosen:
+        todo = plan() if plan else [("section", {"name": section.__name__})]
+        spans.append((len(specs), len(specs) + len(todo)))
+        specs += todo
+
+    # Indexed scenarios already in the results store are read back; only the
+    # rest (and the whole-section tasks) are computed.
+    store   = ResultsStore()
+    dataset = dataset_key()
+    results = [store.get_scenario(dataset, s) for s in specs]
+    todo    = [i for i, r in enumerate(results) if r is None]
+    print(f"  {len(specs)} scenarios across {len(chosen)} sections "
+          f"({len(specs) - len(todo)} from the results store) …")
+    with span("robustness.scenarios", n=len(todo), workers=workers):
+        fresh = run_scenarios(df, [specs[i] for i in todo], workers=workers)
+    for i, res in zip(todo, fresh):
+        results[i] = res
+        store.put_scenario(dataset, specs[i], res)
+
+    def sections():
+        yield (
+            "<h1 style='font-size:15px;margin-bottom:6px'>"
+            "Robustness Checks — Vietnamese Physical Gold Momentum Study</h1>"
+            f"<p class='sub'>Full-sample period: {df['Date'].iloc[0]:%d %B %Y} – "
+            f"{df['Date'].iloc[-1]:%d %B %Y} (N = {len(df) - 1:,} sessions). All tests based on "
+            f"the EW equally-weighted portfolio of {len(INSTRUMENTS)} domestic gold instruments "
+            "unless otherwise stated.</p><hr><br>"
+        )
+        for i, ((label, section, plan), (a, b)) in enumerate(zip(chosen, spans), 1):
+            print(f"  [{i}/{len(chosen)}] {label}")
+            with span(f"robustness.{section.__name__}.render"):
+                html = section(df, results=results[a:b]) if plan else results[a]
+            yield html
+
+    # Each section is written as soon as it is rendered.
+    with span("robustness.write"), open(OUTPUT, "w", encoding="utf-8") as f:
+        write_page(f, sections())
 
     print(f"[OK] {OUTPUT}")
     print("── Done ──────────────────────────────────────")
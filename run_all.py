@@ -1,12 +1,162 @@
-import tables
-import figures
+import argparse
+import sys
+import profiling
+from config import INSTRUMENTS, WINDOWS
+from profiling import span, TRACE_FILE
+
+# Only config and profiling are imported up front; every stage imports its
+# own modules (and with them pandas, matplotlib, scipy) when it runs.
+MODES        = ["long_only", "long_short"]
+TABLES       = [1, 2, 3, 4, 5, 6]
+FIGURES      = {3: "long_only", 4: "long_short"}
+N_ROBUSTNESS = 13
+
+# stage → (modules it imports, import-time budget in ms for a fresh interpreter);
+# about 1.5× the slowest of repeated runs on a 1-CPU machine (cli 65, tables
+# 600, figures 1270, robustness 650 ms), to absorb run-to-run noise
+IMPORT_BUDGET = {
+    "cli":        (["run_all"],             100),
+    "tables":     (["pipeline"],            900),
+    "figures":    (["pipeline", "figures"], 1800),
+    "robustness": (["robustness"],          900),
+}
+
+
+def int_list(text: str, prefix: str = "", choices=None) -> list:
+    try:
+        vals = sorted({int(x.strip().upper().removeprefix(prefix)) for x in text.split(",") if x.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a comma-separated list of numbers, got {text!r}")
+    bad = [v for v in vals if choices is not None and v not in choices]
+    if bad:
+        raise argparse.ArgumentTypeError(f"unknown: {', '.join(map(str, bad))}")
+    return vals
+
+
+def choice_list(text: str, choices) -> list:
+    vals = [x.strip() for x in text.split(",") if x.strip()]
+    bad = [v for v in vals if v not in choices]
+    if bad:
+        raise argparse.ArgumentTypeError(f"unknown: {', '.join(bad)} (choose from {', '.join(choices)})")
+    return vals
+
+
+def import_report(stages: list) -> bool:
+    ok = True
+    for stage in ["cli"] + stages:
+        modules, budget = IMPORT_BUDGET[stage]
+        wall, rows = profiling.import_times(modules)
+        total = sum(cum for _, _, cum in rows)
+        flag = "ok" if total <= budget else "OVER BUDGET"
+        ok &= total <= budget
+        heavy = sorted(rows, key=lambda r: -r[2])[:5]
+        print(f"  {stage:<11} imports {total:7.1f} ms / budget {budget:4d} ms  "
+              f"(interpreter + imports {wall:6.1f} ms)  {flag}")
+        print("  " + " " * 11 + "  " + ", ".join(f"{m} {cum:.0f}" for m, _, cum in heavy))
+    return ok
+
 
 if __name__ == "__main__":
-    print("── Generating tables ──────────────────────────")
-    tables.run()
-    print("\n── Generating figures ─────────────────────────")
-    figures.run()
+    ap = argparse.ArgumentParser(
+        description="Generate the tables, figures and robustness report. With no stage "
+                    "selected, builds all tables and figures.")
+    ap.add_argument("--tables", nargs="?", const=TABLES, metavar="LIST",
+                    type=lambda t: int_list(t, choices=TABLES),
+                    help="tables to build, e.g. 4,6 (default: all)")
+    ap.add_argument("--figures", nargs="?", const=list(FIGURES), metavar="LIST",
+                    type=lambda t: int_list(t, choices=FIGURES),
+                    help="equity figures to build: 3 (long-only), 4 (long-short)")
+    ap.add_argument("--robustness", nargs="?", const=list(range(1, N_ROBUSTNESS + 1)), metavar="LIST",
+                    type=lambda t: int_list(t, "R", range(1, N_ROBUSTNESS + 1)),
+                    help=f"robustness tables to build, e.g. R2,R5 (default: R1–R{N_ROBUSTNESS}); "
+                         "not narrowed by --instruments/--windows/--modes")
+    ap.add_argument("--instruments", type=lambda t: choice_list(t, INSTRUMENTS), metavar="LIST",
+                    help="comma-separated instruments: table rows and per-instrument figures")
+    ap.add_argument("--windows", type=int_list, metavar="LIST",
+                    help=f"lookback windows for Tables 4–6 and the figures (default: {WINDOWS})")
+    ap.add_argument("--modes", type=lambda t: choice_list(t, MODES), metavar="LIST",
+                    help="long_only and/or long_short")
+    ap.add_argument("--instrument-figures", action="store_true",
+                    help="also render one equity figure per instrument and mode")
+    ap.add_argument("--import-report", action="store_true",
+                    help="measure the import time of the selected stages (-X importtime) and exit")
+    ap.add_argument("--trace", default=TRACE_FILE, metavar="JSON",
+                    help="Chrome trace-event output (open in chrome://tracing or ui.perfetto.dev)")
+    ap.add_argument("--profile", metavar="STAGE",
+                    help="wrap STAGE in cProfile, e.g. table3, fig3_longonly, section_spa")
+    ap.add_argument("--force", action="store_true", help="rebuild every artifact, even if up to date")
+    ap.add_argument("--workers", type=int, help="processes for independent stale artifacts (default: all cores)")
+    ap.add_argument("--no-trace", action="store_true", help="disable instrumentation")
+    args = ap.parse_args()
+
+    if args.tables is None and args.figures is None and args.robustness is None:
+        args.tables, args.figures = TABLES, list(FIGURES)
+    select_tables  = args.tables or []
+    select_figures = args.figures or []
+    select_rob     = args.robustness or []
+    instruments = ({k: INSTRUMENTS[k] for k in args.instruments} if args.instruments
+                   else INSTRUMENTS)
+    windows = args.windows or WINDOWS
+    modes   = args.modes or MODES
+    narrowed = bool(args.instruments or args.windows or args.modes)
+    stages = ((["tables"] if select_tables else []) + (["figures"] if select_figures else [])
+              + (["robustness"] if select_rob else []))
+
+    if args.import_report:
+        print("── Import time ─────────────────────────────────")
+        sys.exit(0 if import_report(stages) else 1)
+
+    tracer = None if args.no_trace else profiling.enable(args.profile)
+    written = []
+
+    # The full tables and figures go through the cached pipeline; narrowed
+    # selections are built directly and do not touch its manifest.
+    full_tables  = select_tables == TABLES and not narrowed
+    full_figures = select_figures == [3, 4] and not (args.windows or args.modes)
+    pipe_stages  = ((["tables"] if full_tables else []) + (["figures"] if full_figures else []))
+    if select_tables or select_figures:
+        print("── Generating tables and figures ──────────────")
+    if pipe_stages:
+        import pipeline
+        with span("pipeline"):
+            # Build in-process when profiling so the chosen stage is visible.
+            pipeline.run(workers=1 if args.profile else args.workers, force=args.force,
+                         stages=tuple(pipe_stages))
+    if select_tables and not full_tables:
+        import tables
+        with span("tables"):
+            tables.run(select=select_tables, instruments=instruments, windows=windows, modes=modes)
+    if select_figures and not full_figures:
+        import figures
+        with span("figures"):
+            figures.run(args.workers, windows=windows,
+                        modes=[FIGURES[f] for f in select_figures if FIGURES[f] in modes])
+    if select_tables:
+        written.append("output_tables.html")
+    written += [f"fig{f}_{FIGURES[f].replace('_', '')}.png" for f in select_figures
+                if FIGURES[f] in modes]
+
+    if args.instrument_figures:
+        import figures
+        print("\n── Per-instrument figures ─────────────────────")
+        with span("figures.instruments"):
+            figures.run_instruments(modes=modes, workers=args.workers, instruments=instruments,
+                                    windows=windows)
+        written.append("figures_instruments/")
+    if select_rob:
+        import robustness
+        print()
+        # Sections run inside pool workers are invisible to the tracer, so
+        # profiling a robustness stage keeps them in-process.
+        with span("robustness"):
+            robustness.run(workers=1 if args.profile else None, select=select_rob)
+        written.append("robustness_output.html")
+
     print("\n[DONE]")
-    print("  output_tables.html")
-    print("  fig3_longonly.png")
-    print("  fig4_longshort.png")
+    for path in written:
+        print(f"  {path}")
+
+    if tracer:
+        print("\n── Stage summary ──────────────────────────────")
+        print(tracer.summary())
+        tracer.write(args.trace)
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pandas as pd
+from config import WINDOWS
+from core import (
+    MODES, MIN_OBS, load_data, signal_scores, positions, net_return_matrix, column_metrics,
+    column_skew,
+)
+from panel import instrument_panel
+from signals import SIGNALS
+
+HOST       = "127.0.0.1"
+PORT       = 8765
+LRU_SIZE   = 4_096       # cached query results
+SCORE_SIZE = 64          # cached (signal, window) score matrices
+MAX_WINDOW = 260
+WORKERS    = 4           # threads running uncached queries off the event loop
+MAX_HEADER = 16_384
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error"}
+
+
+class QueryError(ValueError):
+    pass
+
+
+def session_date(text: str) -> pd.Timestamp:
+    # Sessions are tz-naive local dates: an offset is dropped, keeping the
+    # wall-clock time it was written in.
+    ts = pd.Timestamp(text)
+    if pd.isna(ts):
+        raise ValueError(text)
+    return ts.tz_localize(None) if ts.tz is not None else ts
+
+
+def finite(text: str) -> float:
+    x = float(text)
+    if not np.isfinite(x):
+        raise ValueError(text)
+    return x
+
+
+class BacktestService:
+    # The dataset and its instrument matrices, loaded once. Scores per
+    # (signal, window) and query results live in bounded LRUs, so a repeated
+    # question is a dictionary lookup and a new one a single-column backtest.
+
+    def __init__(self, df: pd.DataFrame = None, cache_size: int = LRU_SIZE):
+        df = load_data() if df is None else df
+        self.dates = pd.DatetimeIndex(df["Date"])
+        self.names, self.R, self.C = instrument_panel(df).matrix()
+        self.column = {name: k for k, name in enumerate(self.names)}
+        self.scores = lru_cache(maxsize=SCORE_SIZE)(self.signal_matrix)
+        self.cache_size = cache_size
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+        # Every rule's scores at the configured windows, which also pays for
+        # the imports the rules defer (scipy.signal for the EMAs) at start-up.
+        for signal in SIGNALS:
+            for n in WINDOWS:
+                self.scores(signal, n)
+
+    def signal_matrix(self, signal: str, n: int) -> np.ndarray:
+        return signal_scores(self.R, [n], signal)[n]
+
+    def backtest(self, instrument: str, n: int, mode: str, start, end,
+                 fixed: float, multiple: float, signal: str) -> dict:
+        # Signals use the full history; metrics cover the sessions in
+        # [start, end]. Cost per trade = fixed + multiple × half-spread.
+        k = self.column[instrument]
+        I = positions(self.scores(signal, n)[:, k:k + 1], mode, signal)
+        X = net_return_matrix(self.R[:, k:k + 1], fixed + multiple * self.C[:, k:k + 1], I)
+        dI = np.zeros_like(I)
+        dI[1:] = np.abs(I[1:] - I[:-1])
+        i0 = 0 if start is None else self.dates.searchsorted(start, side="left")
+        i1 = len(self.dates) if end is None else self.dates.searchsorted(end, side="right")
+        X, dI = X[i0:i1], dI[i0:i1]
+
+        Ra, sa, RR, N = (v[0] for v in column_metrics(X))
+        sk = column_skew(X)[0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            turnover = np.where(np.isnan(X), 0.0, dI).sum() / N
+        short = N < MIN_OBS
+        out = {key: None if short or np.isnan(v) else float(v)
+               for key, v in (("Ra", Ra), ("sa", sa), ("RR", RR), ("skew", sk))}
+        out["turnover"] = None if np.isnan(turnover) else float(turnover)
+        out["N"] = int(N)
+        return out
+
+    # ── result cache ─────────────────────────────────────────────────
+
+    def lookup(self, keys: list) -> dict:
+        # All keys' results, or None if any is missing.
+        with self.lock:
+            if not all(key in self.results for key in keys):
+                return None
+            for key in keys:
+                self.results.move_to_end(key)
+            self.hits += 1
+            return {key[0]: self.results[key] for key in keys}
+
+    def compute(self, keys: list) -> dict:
+        out = {}
+        for key in keys:
+            with self.lock:
+                res = self.results.get(key)
+            if res is None:
+                res = self.backtest(*key)
+                with self.lock:
+                    self.results[key] = res
+                    if len(self.results) > self.cache_size:
+                        self.results.popitem(last=False)
+            out[key[0]] = res
+        with self.lock:
+            self.misses += 1
+        return out
+
+    # ── queries ──────────────────────────────────────────────────────
+
+    def parse(self, q: dict) -> list:
+        # One normalized cache key per requested instrument (default: all).
+        def one(name, default=None, cast=str):
+            vals = q.get(name)
+            if not vals:
+                return default
+            try:
+                return cast(vals[-1])
+            except ValueError:
+                raise QueryError(f"bad value for {name}: {vals[-1]!r}")
+
+        names = q.get("instrument") or self.names
+        for name in names:
+            if name not in self.column:
+                raise QueryError(f"unknown instrument {name!r}")
+        n = one("n", WINDOWS[0], int)
+        if not 1 <= n <= MAX_WINDOW:
+            raise QueryError(f"n must be between 1 and {MAX_WINDOW}")
+        mode = one("mode", "long_only")
+        if mode not in MODES:
+            raise QueryError(f"mode must be one of {', '.join(MODES)}")
+        signal = one("signal", "sma")
+        if signal not in SIGNALS:
+            raise QueryError(f"signal must be one of {', '.join(SIGNALS)}")
+        start = one("start", None, session_date)
+        end = one("end", None, session_date)
+        fixed = one("fixed", 0.0, finite)
+        # A fixed cost alone replaces the half-spread unless a multiple is given.
+        multiple = one("multiple", 0.0 if "fixed" in q else 1.0, finite)
+        return [(name, n, mode, start, end, fixed, multiple, signal) for name in names]
+
+    def info(self) -> dict:
+        return {"instruments": self.names, "windows": WINDOWS, "modes": MODES,
+                "signals": {k: v[0] for k, v in SIGNALS.items()},
+                "first": f"{self.dates[0]:%Y-%m-%d}", "last": f"{self.dates[-1]:%Y-%m-%d}"}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"cached": len(self.results), "capacity": self.cache_size,
+                    "hits": self.hits, "misses": self.misses,
+                    "scores": self.scores.cache_info().currsize}
+
+
+# ══════════════════════════════════════════════════════════════════
+# HTTP
+# ══════════════════════════════════════════════════════════════════
+
+def response(status: int, body: dict, keep_alive: bool) -> bytes:
+    payload = json.dumps(body, separators=(",", ":")).encode()
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + payload
+
+
+class Server:
+    # Minimal HTTP/1.1 JSON API on asyncio streams (GET only, keep-alive).
+    # Cached answers are served on the event loop; anything that has to be
+    # computed runs on a thread pool so slow queries do not block others.
+    #
+    #   GET /info                       instruments, windows, modes, signals
+    #   GET /backtest?instrument=..&n=..&mode=..&start=..&end=..
+    #                &fixed=..&multiple=..&signal=..
+    #   GET /stats                      cache and request counters
+
+    def __init__(self, service: BacktestService, workers: int = WORKERS):
+        self.service = service
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="backtest")
+        self.started = time.time()
+        self.requests = 0
+
+    async def route(self, method: str, target: str) -> tuple:
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}
+        url = urlsplit(target)
+        if url.path == "/info":
+            return 200, self.service.info()
+        if url.path == "/stats":
+            return 200, {**self.service.stats(), "requests": self.requests,
+                         "uptime": round(time.time() - self.started, 1)}
+        if url.path != "/backtest":
+            return 404, {"error": f"no such endpoint {url.path}"}
+        t0 = time.perf_counter()
+        try:
+            keys = self.service.parse(parse_qs(url.query))
+        except QueryError as exc:
+            return 400, {"error": str(exc)}
+        res = self.service.lookup(keys)
+        cached = res is not None
+        if not cached:
+            loop = asyncio.get_running_loop()
+            res = await loop.run_in_executor(self.pool, self.service.compute, keys)
+        return 200, {"results": res, "cached": cached,
+                     "ms": round((time.perf_counter() - t0) * 1e3, 3)}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    writer.write(response(400, {"error": "malformed request line"}, False))
+                    break
+                headers = {k.strip().lower(): v.strip()
+                           for k, _, v in (line.partition(":") for line in lines[1:] if line)}
+                if int(headers.get("content-length", 0) or 0):
+                    await reader.readexactly(int(headers["content-length"]))
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.strip() == "HTTP/1.1")
+                self.requests += 1
+                try:
+                    status, body = await self.route(method, target)
+                except Exception as exc:
+                    status, body = 500, {"error": f"{type(exc).__name__}: {exc}"}
+                writer.write(response(status, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = HOST, port: int = PORT) -> None:
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER)
+        print(f"[OK] listening on http://{host}:{port}  (GET /info, /backtest, /stats)")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Serve backtest queries over a local HTTP JSON API.")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--workers", type=int, default=WORKERS, help="threads for uncached queries")
+    ap.add_argument("--cache", type=int, default=LRU_SIZE, help="query results kept in memory")
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    service = BacktestService(cache_size=args.cache)
+    print(f"  loaded {len(service.dates):,} sessions × {len(service.names)} series "
+          f"in {time.perf_counter() - t0:.2f}s")
+    try:
+        asyncio.run(Server(service, args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,178 @@
+import numpy as np
+from config import TRADING_DAYS
+
+# Rolling means of returns that cancel out exactly (e.g. +x, -x) leave
+# ±1e-17 rounding residue; anything this small is treated as a zero signal.
+SIGNAL_EPS   = 1e-12
+EMA_SLOW     = 4        # slow EMA span = EMA_SLOW × n
+VOL_SPAN     = 60       # EWMA span of the volatility estimate (sessions)
+TARGET_VOL   = 0.10     # annualized volatility targeted by the vol-scaled rule
+MAX_LEVERAGE = 1.0      # cap on the vol-scaled position
+
+# name → (label, scores, sized). scores(R, windows) returns {n: T × K} with
+# row t built from returns up to t-1 only; sized rules trade the score
+# itself as the position, the others its sign.
+SIGNALS = {}
+
+
+def register(name: str, label: str, sized: bool = False):
+    def wrap(fn):
+        SIGNALS[name] = (label, fn, sized)
+        return fn
+    return wrap
+
+
+# ══════════════════════════════════════════════════════════════════
+# O(T) BUILDING BLOCKS — whole dates × instruments matrix at once
+# ══════════════════════════════════════════════════════════════════
+
+def lagged(R: np.ndarray) -> np.ndarray:
+    x = np.full(R.shape, np.nan)
+    x[1:] = R[:-1]
+    return x
+
+
+def lagged_log_price(R: np.ndarray) -> np.ndarray:
+    # Log price at t-1 relative to the first session; missing returns are
+    # flat sessions.
+    return np.cumsum(np.nan_to_num(lagged(R), nan=0.0), axis=0)
+
+
+def ema(X: np.ndarray, span: float) -> np.ndarray:
+    # y_t = α·x_t + (1-α)·y_{t-1}, started at y_0 = x_0, as one IIR filter
+    # down every column.
+    from scipy.signal import lfilter     # ~0.5 s to import; only the EMA rules need it
+    alpha = 2.0 / (span + 1.0)
+    y, _ = lfilter([alpha], [1.0, alpha - 1.0], X, axis=0, zi=(1.0 - alpha) * X[:1])
+    return y
+
+
+def rolling_max(X: np.ndarray, n: int) -> np.ndarray:
+    # max(X[t-n+1..t]) by van Herk / Gil–Werman: running maxima forwards and
+    # backwards inside blocks of n rows, so each window is the max of one
+    # suffix and one prefix whatever n is. NaN until the window is full.
+    T, K = X.shape
+    out = np.full((T, K), np.nan)
+    if n > T:
+        return out
+    m = -(-T // n) * n
+    P = np.full((m, K), -np.inf)
+    P[:T] = X
+    B = P.reshape(-1, n, K)
+    g = np.maximum.accumulate(B, axis=1).reshape(m, K)
+    h = np.maximum.accumulate(B[:, ::-1], axis=1)[:, ::-1].reshape(m, K)
+    out[n - 1:] = np.maximum(h[:T - n + 1], g[n - 1:T])
+    return out
+
+
+def rolling_min(X: np.ndarray, n: int) -> np.ndarray:
+    return -rolling_max(-X, n)
+
+
+def forward_fill(X: np.ndarray) -> np.ndarray:
+    ok = ~np.isnan(X)
+    idx = np.where(ok, np.arange(len(X))[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    out = np.take_along_axis(X, idx, axis=0)
+    out[~np.maximum.accumulate(ok, axis=0)] = np.nan
+    return out
+
+
+def snap(a: np.ndarray) -> np.ndarray:
+    a[np.abs(a) <= SIGNAL_EPS] = 0.0
+    return a
+
+
+# ══════════════════════════════════════════════════════════════════
+# RULES
+# ══════════════════════════════════════════════════════════════════
+
+@register("sma", "Moving average (paper)")
+def rolling_signal_means(R: np.ndarray, windows: list) -> dict:
+    # a_{t,n} = (1/n)·Σ r_{t-i}, i=1..n, for every window from one cumulative sum.
+    T, K = R.shape
+    x = lagged(R)
+    bad = np.isnan(x)
+    S = np.zeros((T + 1, K))
+    np.cumsum(np.where(bad, 0.0, x), axis=0, out=S[1:])
+    B = np.zeros((T + 1, K), dtype=np.int64)
+    np.cumsum(bad, axis=0, out=B[1:])
+
+    means = {}
+    for n in windows:
+        a = np.full((T, K), np.nan)
+        if n <= T:
+            a[n - 1:] = np.where(B[n:] == B[:-n], (S[n:] - S[:-n]) / n, np.nan)
+        means[n] = snap(a)
+    return means
+
+
+@register("ema", "EMA crossover")
+def ema_crossover(R: np.ndarray, windows: list) -> dict:
+    # EMA(n) − EMA(EMA_SLOW·n) of the log price; no signal on a session
+    # whose previous return is missing or before the slow EMA has warmed up.
+    P = lagged_log_price(R)
+    gap = np.isnan(lagged(R))
+    out = {}
+    for n in windows:
+        a = ema(P, n) - ema(P, EMA_SLOW * n)
+        a[:EMA_SLOW * n] = np.nan
+        a[gap] = np.nan
+        out[n] = snap(a)
+    return out
+
+
+@register("donchian", "Donchian breakout")
+def donchian(R: np.ndarray, windows: list) -> dict:
+    # +1 once the price closes above its previous n-session high, −1 once it
+    # closes below the low, held until the opposite breakout.
+    P = lagged_log_price(R)
+    out = {}
+    for n in windows:
+        hi = np.full(P.shape, np.nan)
+        lo = np.full(P.shape, np.nan)
+        hi[1:], lo[1:] = rolling_max(P, n)[:-1], rolling_min(P, n)[:-1]
+        state = np.where(P > hi, 1.0, np.where(P < lo, -1.0, np.nan))
+        state[:n + 1] = np.nan
+        out[n] = forward_fill(state)
+    return out
+
+
+@register("volscaled", "Vol-scaled TSMOM", sized=True)
+def vol_scaled(R: np.ndarray, windows: list) -> dict:
+    # Sign of the n-session mean scaled to TARGET_VOL by an EWMA estimate of
+    # daily volatility (missing returns count as zero), capped at MAX_LEVERAGE.
+    x2 = np.nan_to_num(lagged(R), nan=0.0) ** 2
+    sigma = np.sqrt(ema(x2, VOL_SPAN))
+    with np.errstate(divide="ignore"):
+        size = np.minimum(MAX_LEVERAGE, TARGET_VOL / np.sqrt(TRADING_DAYS) / sigma)
+    size[:VOL_SPAN] = np.nan
+    means = rolling_signal_means(R, windows)
+    return {n: np.sign(means[n]) * size for n in windows}
+
+
+@register("vote", "Sign vote")
+def sign_vote(R: np.ndarray, windows: list) -> dict:
+    # Share of up minus down sessions among the last n.
+    return rolling_signal_means(np.sign(R), windows)
+
+
+# ══════════════════════════════════════════════════════════════════
+# POSITIONS
+# ══════════════════════════════════════════════════════════════════
+
+def signal_scores(R: np.ndarray, windows: list, signal: str = "sma") -> dict:
+    return SIGNALS[signal][1](R, windows)
+
+
+def position_matrix(a: np.ndarray, mode: str) -> np.ndarray:
+    if mode == "long_only":
+        return (a > 0).astype(np.float64)
+    return np.sign(np.nan_to_num(a, nan=0.0))
+
+
+def positions(a: np.ndarray, mode: str, signal: str = "sma") -> np.ndarray:
+    if not SIGNALS[signal][2]:
+        return position_matrix(a, mode)
+    a = np.nan_to_num(a, nan=0.0)
+    return np.maximum(a, 0.0) if mode == "long_only" else a
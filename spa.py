@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+from config import WINDOWS, BENCHMARK_LABEL
+from core import MODES, signal_scores, positions, net_return_matrix, series_matrix
+
+N_BOOT      = 10_000
+BLOCK_LEN   = 10          # mean block length of the stationary bootstrap
+CHUNK       = 500         # resamples held in memory at once …
+CHUNK_CELLS = 2_000_000   # … capped so chunk × sessions stays bounded
+SEED        = 20210501
+
+
+def strategy_returns(series: dict, windows: list = WINDOWS, modes: list = MODES,
+                     exclude: tuple = (BENCHMARK_LABEL,), signal: str = "sma") -> pd.DataFrame:
+    names = [k for k in series if k not in exclude]
+    _, R, C = series_matrix({k: series[k] for k in names})
+    scores = signal_scores(R, windows, signal)
+    X = np.hstack([
+        net_return_matrix(R, C, positions(scores[n], mode, signal))
+        for mode in modes for n in windows
+    ])
+    columns = pd.MultiIndex.from_product(
+        [modes, windows, names], names=["mode", "window", "instrument"]
+    )
+    out = pd.DataFrame(X, columns=columns)
+    return out.dropna(how="any").reset_index(drop=True)
+
+
+def stationary_indices(rng: np.random.Generator, B: int, T: int, block_len: float) -> np.ndarray:
+    # Politis–Romano: each step starts a new block with probability 1/block_len,
+    # otherwise continues the current one (wrapping at T).
+    new = rng.random((B, T)) < 1.0 / block_len
+    new[:, 0] = True
+    start = rng.integers(0, T, size=(B, T))
+    t = np.arange(T)
+    last = np.maximum.accumulate(np.where(new, t, 0), axis=1)
+    return (np.take_along_axis(start, last, axis=1) + (t - last)) % T
+
+
+def bootstrap_variance(D: np.ndarray, block_len: float) -> np.ndarray:
+    # Var of √T·d̄ under the stationary bootstrap (Politis & Romano 1994):
+    # γ0 + 2 Σ_i κ_i γ_i, with autocovariances from one FFT per column.
+    T = D.shape[0]
+    Z = D - D.mean(axis=0)
+    F = np.fft.rfft(Z, n=2 * T, axis=0)
+    gamma = np.fft.irfft(F * np.conj(F), axis=0)[:T] / T
+    i = np.arange(1, T)
+    q = 1.0 / block_len
+    kappa = (T - i) / T * (1 - q) ** i + i / T * (1 - q) ** (T - i)
+    return gamma[0] + 2.0 * (kappa[:, None] * gamma[1:]).sum(axis=0)
+
+
+def spa_test(D: np.ndarray, n_boot: int = N_BOOT, block_len: float = BLOCK_LEN,
+             chunk: int = CHUNK, seed: int = SEED) -> dict:
+    # White (2000) Reality Check and Hansen (2005) SPA for H0: no strategy
+    # beats the benchmark, given excess returns D (sessions × strategies).
+    T, K = D.shape
+    chunk = max(1, min(chunk, CHUNK_CELLS // T))
+    dbar = D.mean(axis=0)
+    omega = np.sqrt(np.maximum(bootstrap_variance(D, block_len), 1e-300))
+    A = np.sqrt(omega ** 2 / T * 2.0 * np.log(np.log(T)))
+    centres = {
+        "lower":      np.maximum(dbar, 0.0),
+        "consistent": np.where(dbar >= -A, dbar, 0.0),
+        "upper":      dbar,
+    }
+
+    rc_stat  = np.sqrt(T) * dbar.max()
+    spa_stat = max(0.0, (np.sqrt(T) * dbar / omega).max())
+    hits = {"rc": 0, **{k: 0 for k in centres}}
+
+    rng = np.random.default_rng(seed)
+    rows = np.arange(chunk)[:, None] * T
+    for b0 in range(0, n_boot, chunk):
+        B = min(chunk, n_boot - b0)
+        idx = stationary_indices(rng, B, T, block_len)
+        # Resample means as (B × T counts) @ (T × K): one BLAS call per chunk.
+        counts = np.bincount((idx + rows[:B]).ravel(), minlength=B * T).reshape(B, T)
+        boot = counts @ D / T
+        hits["rc"] += int((np.sqrt(T) * (boot - dbar).max(axis=1) >= rc_stat).sum())
+        for k, mu in centres.items():
+            stat = np.maximum((np.sqrt(T) * (boot - mu) / omega).max(axis=1), 0.0)
+            hits[k] += int((stat >= spa_stat).sum())
+
+    best = int(np.argmax(dbar / omega))
+    return {
+        "best": best,
+        "best_mean": dbar[best],
+        "rc_p": hits["rc"] / n_boot,
+        "spa_l_p": hits["lower"] / n_boot,
+        "spa_c_p": hits["consistent"] / n_boot,
+        "spa_u_p": hits["upper"] / n_boot,
+    }
+
+
+def spa_table(series: dict, windows: list = WINDOWS, n_boot: int = N_BOOT,
+              seed: int = SEED, signal: str = "sma") -> pd.DataFrame:
+    X = strategy_returns(series, windows, signal=signal)
+    groups = [("Long-Only", ["long_only"]), ("Long-Short", ["long_short"]),
+              ("Both", list(MODES))]
+    rows = []
+    for label, modes in groups:
+        D = X.loc[:, X.columns.get_level_values("mode").isin(modes)]
+        res = spa_test(D.to_numpy(), n_boot=n_boot, seed=seed)
+        mode, n, name = D.columns[res["best"]]
+        rows.append({
+            "Strategy set": label,
+            "K": D.shape[1],
+            "Best rule": f"{name}, n={n}" + (f" ({mode})" if len(modes) > 1 else ""),
+            "Best mean (bps/day)": res["best_mean"] * 1e4,
+            "RC p": res["rc_p"],
+            "SPA_l p": res["spa_l_p"],
+            "SPA_c p": res["spa_c_p"],
+            "SPA_u p": res["spa_u_p"],
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,99 @@
+import os
+import sys
+import pandas as pd
+from config import INSTRUMENTS, BENCHMARK
+from core import load_data
+from profiling import peak_rss_mb
+from updater import STATE_FILE, StrategyState, check_consistency
+
+CHUNK_ROWS = 200_000      # quote rows held in memory at once
+TIME_COL   = "Date"
+
+
+def quote_columns(instruments: dict = INSTRUMENTS, time_col: str = TIME_COL) -> list:
+    cols = [time_col]
+    for bid, ask, *_ in instruments.values():
+        cols += [bid, ask]
+    return cols + [BENCHMARK]
+
+
+def read_chunks(path: str, columns: list, chunk_rows: int = CHUNK_ROWS):
+    # Bounded-size DataFrames of the quote columns, in file order.
+    if path.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq     # only needed for Parquet feeds
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def read_sessions(path: str, freq: str = None, chunk_rows: int = CHUNK_ROWS,
+                  instruments: dict = INSTRUMENTS, time_col: str = TIME_COL):
+    # Session closes from a time-ordered quote file: snapshots are bucketed by
+    # `freq` (None: every timestamp is a session) and each column keeps its
+    # last quote in the bucket. The last, possibly unfinished, session of a
+    # chunk is carried into the next one as a single aggregated row.
+    carry, last_ts = None, None
+    for chunk in read_chunks(path, quote_columns(instruments, time_col), chunk_rows):
+        ts = pd.to_datetime(chunk[time_col])
+        if not ts.is_monotonic_increasing or (last_ts is not None and ts.iloc[0] < last_ts):
+            raise ValueError(f"{path}: quotes are not in time order")
+        last_ts = ts.iloc[-1]
+        chunk[time_col] = ts.dt.floor(freq) if freq else ts
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        closes = chunk.groupby(time_col, sort=False).last().reset_index()
+        carry = closes.iloc[-1:]
+        if len(closes) > 1:
+            yield closes.iloc[:-1]
+    if carry is not None:
+        yield carry
+
+
+def stream(path: str, state: StrategyState = None, freq: str = None,
+           chunk_rows: int = CHUNK_ROWS, sessions_out: str = None) -> tuple:
+    # Feeds every new session close into the incremental strategy state, so
+    # memory is one chunk plus the state however long the history is.
+    # sessions_out: also append the session closes to a CSV.
+    state = state or StrategyState()
+    added = 0
+    header = not (sessions_out and os.path.isfile(sessions_out))
+    for closes in read_sessions(path, freq, chunk_rows, state.instruments):
+        if state.last_date is not None:
+            closes = closes[closes[TIME_COL] > state.last_date]
+        for row in closes.to_dict("records"):
+            state.update(row)
+        if sessions_out and len(closes):
+            closes.to_csv(sessions_out, mode="a", header=header, index=False)
+            header = False
+        added += len(closes)
+    return state, added
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Stream a quote file into the incremental strategy state.")
+    ap.add_argument("path", help="CSV or Parquet quote file, sorted by time")
+    ap.add_argument("--freq", help="resample snapshots to sessions of this length, e.g. 1D, 1h")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows read at a time")
+    ap.add_argument("--state", default=STATE_FILE, help="state file to resume and save")
+    ap.add_argument("--sessions-out", metavar="CSV", help="append the session closes to CSV")
+    ap.add_argument("--check", action="store_true",
+                    help="compare with the in-memory path (loads the sessions; small files only)")
+    args = ap.parse_args()
+
+    try:
+        state = StrategyState.load(args.state)
+    except FileNotFoundError:
+        state = None
+    state, added = stream(args.path, state, args.freq, args.chunk_rows, args.sessions_out)
+    state.save(args.state)
+    print(f"[OK] {args.state}: +{added} sessions, last = {state.last_date:%Y-%m-%d %H:%M}, "
+          f"peak RSS {peak_rss_mb():.0f} MB")
+    if args.check:
+        if args.freq and not args.sessions_out:
+            sys.exit("--check with --freq needs --sessions-out")
+        report = check_consistency(state, load_data(args.sessions_out or args.path))
+        print(report.to_string())
+        if not report["ok"].all():
+            sys.exit(1)
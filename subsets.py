@@ -0,0 +1,178 @@
+import sys
+from itertools import combinations
+from math import comb
+import numpy as np
+import pandas as pd
+from config import INSTRUMENTS, WINDOWS
+from core import MODES, load_data, backtest_grid
+from panel import Instrument, instrument_panel
+
+FIELDS    = {"Type": "type", "Brand": "brand", "Karat": "karat", "Region": "region"}
+BLOCK     = 512          # subset portfolios backtested together as one matrix
+BLOCK_CELLS = 1 << 21    # … at most this many sessions × subsets, for long samples
+RESUM     = 256          # incremental updates between exact rebuilds of the sums
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+MAX_SUBSETS = 2 ** 16 - 1  # largest family enumerated: every subset of up to 16 instruments
+
+
+# ══════════════════════════════════════════════════════════════════
+# SUBSET FAMILIES — boolean masks over the instrument columns
+# ══════════════════════════════════════════════════════════════════
+
+def gray_masks(K: int) -> np.ndarray:
+    # Every non-empty subset in reflected Gray-code order, so consecutive
+    # subsets differ by exactly one instrument.
+    g = np.arange(1, 2 ** K)
+    g ^= g >> 1
+    return (g[:, None] >> np.arange(K)) & 1 == 1
+
+
+def leave_out_masks(K: int, k: int) -> np.ndarray:
+    outs = list(combinations(range(K), k))
+    masks = np.ones((len(outs), K), dtype=bool)
+    for i, out in enumerate(outs):
+        masks[i, list(out)] = False
+    return masks
+
+
+def group_masks(field: str, instruments: dict = INSTRUMENTS) -> tuple:
+    # "only <value>" and "excl. <value>" for every value of a metadata field.
+    values = [getattr(Instrument(name, *spec), FIELDS[field]) for name, spec in instruments.items()]
+    labels, masks = [], []
+    for v in dict.fromkeys(values):
+        m = np.array([x == v for x in values])
+        labels += [f"{field} = {v}", f"{field} ≠ {v}"]
+        masks  += [m, ~m]
+    return labels, np.array(masks)
+
+
+def subset_labels(names: list, masks: np.ndarray) -> list:
+    # Named by the excluded instruments when that is the shorter list.
+    out = []
+    for m in masks:
+        if m.all():
+            out.append("All")
+        elif m.sum() <= (~m).sum():
+            out.append(" + ".join(n for n, keep in zip(names, m) if keep))
+        else:
+            out.append("excl. " + ", ".join(n for n, keep in zip(names, m) if not keep))
+    return out
+
+
+# ══════════════════════════════════════════════════════════════════
+# EW RETURNS FROM RUNNING COLUMN SUMS
+# ══════════════════════════════════════════════════════════════════
+
+def ew_matrix(R: np.ndarray, C: np.ndarray, masks: np.ndarray) -> tuple:
+    # T × S equally-weighted returns and costs, one column per mask, with the
+    # same NaN handling as the EW Portfolio row (mean over quoted instruments).
+    # Each subset's sums and counts are the previous subset's plus or minus
+    # the instrument columns that changed, so Gray-ordered or leave-k-out
+    # families cost O(T) per subset; the sums are rebuilt exactly every
+    # RESUM subsets so rounding cannot drift.
+    T, K = R.shape
+    cols = [np.where(np.isnan(X), 0.0, X) for X in (R, C)]
+    okay = [(~np.isnan(X)).astype(np.float64) for X in (R, C)]
+    S = np.zeros((4, T))
+    prev = np.zeros(K, dtype=bool)
+    out_r = np.empty((T, len(masks)))
+    out_c = np.empty((T, len(masks)))
+    for j, m in enumerate(masks):
+        changed = np.flatnonzero(m != prev)
+        if j % RESUM == 0 or len(changed) > m.sum():
+            keep = np.flatnonzero(m)
+            S[:] = [cols[0][:, keep].sum(axis=1), okay[0][:, keep].sum(axis=1),
+                    cols[1][:, keep].sum(axis=1), okay[1][:, keep].sum(axis=1)]
+        else:
+            for k in changed:
+                sign = 1.0 if m[k] else -1.0
+                S[0] += sign * cols[0][:, k]
+                S[1] += sign * okay[0][:, k]
+                S[2] += sign * cols[1][:, k]
+                S[3] += sign * okay[1][:, k]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out_r[:, j] = S[0] / S[1]
+            out_c[:, j] = S[2] / S[3]
+        prev = m
+    return out_r, out_c
+
+
+def subset_grid(R: np.ndarray, C: np.ndarray, masks: np.ndarray, labels: list = None,
+                windows: list = WINDOWS, modes: list = MODES, block: int = BLOCK) -> pd.DataFrame:
+    # backtest_grid over the subset portfolios, `block` columns at a time.
+    labels = list(range(len(masks))) if labels is None else list(labels)
+    block = max(1, min(block, BLOCK_CELLS // len(R)))
+    parts = []
+    for b in range(0, len(masks), block):
+        r, c = ew_matrix(R, C, masks[b:b + block])
+        parts.append(backtest_grid(r, c, windows, modes, labels[b:b + block]))
+    order = pd.MultiIndex.from_product([modes, windows, labels],
+                                       names=["mode", "window", "instrument"])
+    grid = pd.concat(parts).reindex(order).rename_axis(index={"instrument": "subset"})
+    size = pd.Series(masks.sum(axis=1), index=labels)
+    grid["size"] = size.reindex(grid.index.get_level_values("subset")).to_numpy()
+    return grid
+
+
+def summarize(grid: pd.DataFrame, field: str = "RR") -> pd.DataFrame:
+    # Distribution of `field` across subsets for every (mode, window).
+    g = grid[field].groupby(level=["mode", "window"], sort=False)
+    out = g.quantile(QUANTILES).unstack()
+    out.columns = [f"p{int(q * 100)}" for q in QUANTILES]
+    out.insert(0, "min", g.min())
+    out["max"]  = g.max()
+    out["mean"] = g.mean()
+    out["share > 0"] = g.apply(lambda x: (x > 0).mean())
+    out.insert(0, "subsets", g.count())
+    return out
+
+
+# ══════════════════════════════════════════════════════════════════
+# FAMILIES
+# ══════════════════════════════════════════════════════════════════
+
+def family_size(name: str, K: int, instruments: dict = INSTRUMENTS) -> int:
+    # Portfolios in a family over K instruments, without building it.
+    if name == "all":
+        return 2 ** K - 1
+    if name.startswith("leave"):
+        return comb(K, int(name[5:]))
+    if name in FIELDS:
+        return 2 * len({getattr(Instrument(n, *s), FIELDS[name]) for n, s in instruments.items()})
+    raise ValueError(f"unknown subset family {name!r}")
+
+
+def family(name: str, names: list, instruments: dict = INSTRUMENTS) -> tuple:
+    # (labels, masks) for "leave1", "leave2", "all" or a metadata field.
+    K = len(names)
+    size = family_size(name, K, instruments)
+    if size > MAX_SUBSETS:
+        raise ValueError(f"subset family {name!r} over {K} instruments has {size:,} portfolios "
+                         f"(more than MAX_SUBSETS = {MAX_SUBSETS:,})")
+    if name == "all":
+        masks = gray_masks(K)
+    elif name.startswith("leave"):
+        masks = leave_out_masks(K, int(name[5:]))
+    else:
+        return group_masks(name, instruments)
+    return subset_labels(names, masks), masks
+
+
+def instrument_matrix(df: pd.DataFrame, instruments: dict = INSTRUMENTS) -> tuple:
+    return instrument_panel(df, instruments).matrix(ew=False, benchmark=False)
+
+
+def family_grid(df: pd.DataFrame, name: str, windows: list = WINDOWS, modes: list = MODES,
+                instruments: dict = INSTRUMENTS) -> pd.DataFrame:
+    names, R, C = instrument_matrix(df, instruments)
+    labels, masks = family(name, names, instruments)
+    return subset_grid(R, C, masks, labels, windows, modes)
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "leave1"
+    grid = family_grid(load_data(), name)
+    print(summarize(grid).round(3).to_string())
+    if name != "all":
+        print()
+        print(grid["RR"].unstack("window").round(2).to_string())
@@ -1,26 +1,37 @@
+import os
 import pandas as pd
-from scipy.stats import skew
-from config import INSTRUMENTS, BENCHMARK, BENCHMARK_LABEL, WINDOWS
-from core import (
-    load_data, mid_price, log_return, half_spread,
-    annualize, strategy_metrics, build_instrument_series,
-    html_page, render_table,
-)
+from config import INSTRUMENTS, BENCHMARK_LABEL, WINDOWS, OUTPUT_DIR
+from core import MODES, load_data, grid_table, write_page, render_table
+from panel import instrument_panel
+from portfolios import REBALANCE, COVARIANCE, COV_SPAN, COV_WINDOW, SHRINK
+from profiling import span
+from results import ResultsStore, BUY_HOLD, SIGNAL, dataset_key, produce, universe
+from signals import SIGNALS
 
+OUTPUT      = os.path.join(OUTPUT_DIR, "output_tables.html")
+TABLES      = [1, 2, 3, 4, 5, 6]
+TABLE_MODES = {4: "long_only", 5: "long_only", 6: "long_short"}
 
-def make_table1_table2(df: pd.DataFrame) -> tuple:
+
+def output_file(signal: str = SIGNAL) -> str:
+    return OUTPUT if signal == SIGNAL else os.path.join(OUTPUT_DIR, f"output_tables_{signal}.html")
+
+
+def make_table1_table2(df: pd.DataFrame, instruments: dict = INSTRUMENTS) -> tuple:
     rows1, rows2 = [], []
+    panel = instrument_panel(df, instruments)
+    column = lambda X, k: pd.Series(X[:, k], copy=False)
 
-    for name, (bid, ask, asset_type, brand, karat, region) in INSTRUMENTS.items():
-        m  = mid_price(df, bid, ask)
-        sp = half_spread(df, bid, ask) * 2.0 * 100.0
-        r  = log_return(m).dropna() * 100.0
+    for k, inst in enumerate(panel.instruments):
+        m  = column(panel.mid, k)
+        sp = column(panel.C, k) * 2.0 * 100.0
+        r  = column(panel.R, k).dropna() * 100.0
         rows1.append({
-            "Instrument":   name,
-            "Type":         asset_type,
-            "Brand":        brand,
-            "Karat":        karat,
-            "Region":       region,
+            "Instrument":   inst.name,
+            "Type":         inst.type,
+            "Brand":        inst.brand,
+            "Karat":        inst.karat,
+            "Region":       inst.region,
             "N":            len(r),
             "Start":        df["Date"].min().strftime("%d/%m/%Y"),
             "End":          df["Date"].max().strftime("%d/%m/%Y"),
@@ -28,7 +39,7 @@ def make_table1_table2(df: pd.DataFrame) -> tuple:
             "Avg. Spread (%)":    round(sp.dropna().mean(), 4),
         })
         rows2.append({
-            "Instrument": name,
+            "Instrument": inst.name,
             "Mean":   round(r.mean(), 6),
             "Std":    round(r.std(),  6),
             "Min":    round(r.min(),  6),
@@ -38,7 +49,7 @@ def make_table1_table2(df: pd.DataFrame) -> tuple:
             "Max":    round(r.max(),  6),
         })
 
-    r_bm = log_return(df[BENCHMARK]).dropna() * 100.0
+    r_bm = pd.Series(panel.benchmark_R, copy=False).dropna() * 100.0
     rows2.append({
         "Instrument": BENCHMARK_LABEL,
         "Mean":   round(r_bm.mean(), 6),
@@ -76,19 +87,16 @@ def make_table1_table2(df: pd.DataFrame) -> tuple:
     return s1, s2
 
 
-def make_table3(df: pd.DataFrame) -> str:
-    series = build_instrument_series(df)
+def make_table3(bh: pd.DataFrame) -> str:
+    # bh: buy-and-hold rows from the results store, indexed by instrument.
     rows = []
-    for name, (r, _) in series.items():
-        r_clean = r.dropna()
-        Ra, sa, RR = annualize(r_clean)
-        sk = float(skew(r_clean.values))
+    for name, m in bh.iterrows():
         rows.append({
             "Instrument": name,
-            "Ann. Return (R_a)": round(Ra, 6),
-            "Ann. Std (σ_a)":    round(sa, 6),
-            "RR":                round(RR, 6),
-            "Skewness":          round(sk, 6),
+            "Ann. Return (R_a)": round(m["Ra"], 6),
+            "Ann. Std (σ_a)":    round(m["sa"], 6),
+            "RR":                round(m["RR"], 6),
+            "Skewness":          round(m["skew"], 6),
         })
     df3 = pd.DataFrame(rows)
     v3  = ["Ann. Return (R_a)", "Ann. Std (σ_a)", "RR", "Skewness"]
@@ -100,19 +108,31 @@ def make_table3(df: pd.DataFrame) -> str:
         "R<sub>a</sub>=(1+r&#772;)<sup>252</sup>&#8722;1; "
         "&#963;<sub>a</sub>=&#963;<sub>d</sub>&#183;&#8730;252; "
         "RR=R<sub>a</sub>/&#963;<sub>a</sub> (zero risk-free rate). "
-        "<strong>Bold</strong>: RR&#8805;1.00. <em>EW Portfolio</em>: equally-weighted across 13 domestic instruments.</p></section>"
+        "<strong>Bold</strong>: RR&#8805;1.00. <em>EW Portfolio</em>: equally-weighted across 13 domestic instruments. "
+        f"{portfolio_note()}</p></section>"
+    )
+
+
+def portfolio_note() -> str:
+    estimate = (f"an EWMA covariance (span {COV_SPAN} sessions)" if COVARIANCE == "ewma"
+                else f"a rolling {COV_WINDOW}-session covariance")
+    return (
+        "<em>Inverse-volatility, Risk-parity, Minimum-variance</em> and <em>Spread-penalized</em> "
+        f"portfolios: long-only weights reset every {REBALANCE} sessions from {estimate} of "
+        f"returns up to the previous session, with {SHRINK:.0%} shrinkage towards its diagonal; "
+        "the spread-penalized portfolio adds the mean half-spreads as a common risk factor."
     )
 
 
-def make_table4(df: pd.DataFrame) -> str:
-    series = build_instrument_series(df)
-    rows = {
-        name: {f"{n}d": strategy_metrics(r, c, n, "long_only")[1] for n in WINDOWS}
-        for name, (r, c) in series.items()
-    }
-    df4 = pd.DataFrame(rows).T.reset_index().rename(columns={"index": "Instrument"})
-    df4.columns = ["Instrument"] + [f"{n} day" for n in WINDOWS]
-    vc = [f"{n} day" for n in WINDOWS]
+def window_table(grid: pd.DataFrame, field: str, mode: str, digits: int) -> pd.DataFrame:
+    out = grid_table(grid, field, mode).round(digits)
+    out.columns = [f"{n} day" for n in out.columns]
+    return out.rename_axis("Instrument").reset_index()
+
+
+def make_table4(grid: pd.DataFrame) -> str:
+    df4 = window_table(grid, "RR", "long_only", 2)
+    vc = list(df4.columns[1:])
     return (
         "<section><h1>Table 4</h1>"
         "<p class='sub'>Annualized risk-return ratios for different lookback windows (long-only strategy). "
@@ -120,31 +140,18 @@ def make_table4(df: pd.DataFrame) -> str:
         f"<table>{render_table(df4, 'Instrument', vc, '.2f', threshold=1.0)}</table>"
         "<p class='note'><em>Source:</em> Author's calculations (Jan 2015–Dec 2025). N = 2,837 sessions. "
         "Momentum signal: a<sub>t,n</sub>=(1/n)&#8721;r<sub>t&#8722;i</sub> (i=1..n, no look-ahead bias). "
-        "Position: I<sub>t</sub>=1 if a&gt;0, else 0. "
+        "Position: I<sub>t</sub>=1 if a&gt;0, else 0; a is taken as 0 when |a|&#8804;10<sup>&#8722;12</sup> "
+        "(returns over the window cancel, up to rounding). "
         "Net return: R<sub>t</sub>=I<sub>t&#8722;1</sub>&#183;r<sub>t</sub>&#8722;|I<sub>t</sub>&#8722;I<sub>t&#8722;1</sub>|&#183;c<sub>t</sub>, "
         "where c<sub>t</sub>=(P<sup>ask</sup>&#8722;P<sup>bid</sup>)/(2P<sup>mid</sup>). "
         "<strong>Bold</strong>: RR&#8805;1. Red: RR&lt;0.</p></section>"
     )
 
 
-def make_table5_table6(df: pd.DataFrame) -> tuple:
-    series = build_instrument_series(df)
-    t5 = {
-        name: {f"{n}d": strategy_metrics(r, c, n, "long_only")[0]  for n in WINDOWS}
-        for name, (r, c) in series.items()
-    }
-    t6 = {
-        name: {f"{n}d": strategy_metrics(r, c, n, "long_short")[1] for n in WINDOWS}
-        for name, (r, c) in series.items()
-    }
-
-    def to_df(d):
-        out = pd.DataFrame(d).T.reset_index().rename(columns={"index": "Instrument"})
-        out.columns = ["Instrument"] + [f"{n} day" for n in WINDOWS]
-        return out
-
-    df5, df6 = to_df(t5), to_df(t6)
-    vc = [f"{n} day" for n in WINDOWS]
+def make_table5_table6(grid: pd.DataFrame) -> tuple:
+    df5 = window_table(grid, "Ra", "long_only", 3)
+    df6 = window_table(grid, "RR", "long_short", 2)
+    vc = list(df5.columns[1:])
 
     s5 = (
         "<section><h1>Table 5</h1>"
@@ -161,23 +168,68 @@ def make_table5_table6(df: pd.DataFrame) -> tuple:
         "Column headers denote lookback window length in trading days.</p>"
         f"<table>{render_table(df6, 'Instrument', vc, '.2f', threshold=1.0)}</table>"
         "<p class='note'><em>Source:</em> Author's calculations (Jan 2015–Dec 2025). "
-        "I<sub>t</sub>=1 if a&gt;0; &#8722;1 if a&lt;0; 0 if a=0. "
+        "I<sub>t</sub>=1 if a&gt;0; &#8722;1 if a&lt;0; 0 if a=0 (|a|&#8804;10<sup>&#8722;12</sup>). "
         "Short-selling physical gold is legally prohibited in Vietnam — results are theoretical benchmarks only. "
         "<strong>Bold</strong>: RR&#8805;1. Red: RR&lt;0.</p></section>"
     )
     return s5, s6
 
 
-def run():
-    df = load_data()
-    s1, s2 = make_table1_table2(df)
-    s3     = make_table3(df)
-    s4     = make_table4(df)
-    s5, s6 = make_table5_table6(df)
-    with open("output_tables.html", "w", encoding="utf-8") as f:
-        f.write(html_page([s1, s2, s3, s4, s5, s6]))
-    print("[OK] output_tables.html")
+def signal_note(signal: str) -> str:
+    return (
+        f"<p class='note'><em>Signal rule:</em> {SIGNALS[signal][0]} (<code>{signal}</code>). "
+        "Tables 4–6 are computed with this rule in place of the moving-average signal; the "
+        "formulas in their notes describe the paper's rule.</p><br>"
+    )
+
+
+def sections(df: pd.DataFrame, bh: pd.DataFrame, grid: pd.DataFrame, signal: str = SIGNAL,
+             select: list = TABLES, instruments: dict = INSTRUMENTS):
+    if signal != SIGNAL:
+        yield signal_note(signal)
+    if {1, 2} & set(select):
+        with span("tables.make_table1_table2"):
+            s1, s2 = make_table1_table2(df, instruments)
+        yield from [s for t, s in ((1, s1), (2, s2)) if t in select]
+    if 3 in select:
+        with span("tables.make_table3"):
+            s3 = make_table3(bh)
+        yield s3
+    if 4 in select:
+        with span("tables.make_table4"):
+            s4 = make_table4(grid)
+        yield s4
+    if {5, 6} & set(select):
+        with span("tables.make_table5_table6"):
+            s5, s6 = make_table5_table6(grid)
+        yield from [s for t, s in ((5, s5), (6, s6)) if t in select]
+
+
+def run(signal: str = SIGNAL, select: list = TABLES, instruments: dict = INSTRUMENTS,
+        windows: list = WINDOWS, modes: list = MODES):
+    # select: table numbers to write; a narrowed mode drops the tables of
+    # the other mode, narrowed instruments and windows keep those rows and
+    # columns (the EW Portfolio row stays the full 13-instrument portfolio).
+    select = [t for t in select if TABLE_MODES.get(t, modes[0]) in modes]
+    with span("tables.load_data"):
+        df = load_data()
+    store, dataset = ResultsStore(), dataset_key()
+    with span("tables.produce"):
+        produce(df, dataset, store, windows=windows, signal=signal)
+    names = universe(instruments)
+    bh    = store.query(dataset, modes=BUY_HOLD, instruments=names).droplevel(["mode", "window"])
+    grid  = store.query(dataset, modes=MODES, windows=windows, instruments=names, signal=signal)
+    # Sections stream to the file as each table is rendered.
+    outfile = output_file(signal)
+    with open(outfile, "w", encoding="utf-8") as f:
+        write_page(f, sections(df, bh, grid, signal, select, instruments))
+    print(f"[OK] {outfile}")
 
 
 if __name__ == "__main__":
-    run()
+    import argparse
+    ap = argparse.ArgumentParser(description="Build the paper's tables.")
+    ap.add_argument("--signal", default=SIGNAL, choices=list(SIGNALS),
+                    help=f"signal rule for Tables 4–6 (default: {SIGNAL}; others write "
+                         "output_tables_<signal>.html)")
+    run(ap.parse_args().signal)
@@ -0,0 +1,233 @@
+import json
+import sys
+import numpy as np
+import pandas as pd
+from config import TRADING_DAYS, WINDOWS, INSTRUMENTS, BENCHMARK, BENCHMARK_LABEL
+from core import (
+    MODES, MIN_OBS, SIGNAL_EPS, load_data, backtest_grid, equity_curve,
+)
+from panel import instrument_panel
+
+STATE_FILE = "strategy_state.npz"
+
+STATE_ARRAYS = [
+    "last_mid", "last_bm", "buf", "wsum", "wnan", "pos",
+    "N", "mean", "M2", "turn", "equity",
+]
+
+
+def nan_mean(x: np.ndarray) -> float:
+    ok = ~np.isnan(x)
+    return x[ok].sum() / ok.sum() if ok.any() else np.nan
+
+
+class StrategyState:
+    # Everything the batch pipeline needs from the past to absorb one more
+    # session: last mids, a ring buffer of recent returns with running window
+    # sums, current positions, Welford moments and equity levels. Cell arrays
+    # are (modes, windows, series) with series = instruments + EW + benchmark.
+
+    def __init__(self, windows: list = WINDOWS, modes: list = MODES,
+                 instruments: dict = INSTRUMENTS):
+        self.windows = list(windows)
+        self.modes = list(modes)
+        self.instruments = dict(instruments)
+        self.names = list(self.instruments) + ["EW Portfolio", BENCHMARK_LABEL]
+        self.last_date = None
+        self.seen = 0
+        self.head = 0
+
+        K, W, M = len(self.names), len(self.windows), len(self.modes)
+        L = max(self.windows)
+        self.last_mid = np.full(len(self.instruments), np.nan)
+        self.last_bm  = np.full(1, np.nan)
+        self.buf  = np.full((L, K), np.nan)
+        self.wsum = np.zeros((W, K))
+        self.wnan = np.zeros((W, K), dtype=np.int64)
+        self.pos  = np.zeros((M, W, K))
+        self.N    = np.zeros((M, W, K), dtype=np.int64)
+        self.mean = np.zeros((M, W, K))
+        self.M2   = np.zeros((M, W, K))
+        self.turn = np.zeros((M, W, K))
+        self.equity = np.ones((M, W, K))
+
+    # ── ingestion ────────────────────────────────────────────────────
+
+    def session_returns(self, row) -> tuple:
+        bid = np.array([row[v[0]] for v in self.instruments.values()], dtype=np.float64)
+        ask = np.array([row[v[1]] for v in self.instruments.values()], dtype=np.float64)
+        bm  = np.array([row[BENCHMARK]], dtype=np.float64)
+        mid = (bid + ask) / 2.0
+        r = np.log(mid / self.last_mid)
+        c = (ask - bid) / (2.0 * mid)
+        r_bm = np.log(bm / self.last_bm)
+        self.last_mid, self.last_bm = mid, bm
+        return np.r_[r, nan_mean(r), r_bm], np.r_[c, nan_mean(c), 0.0]
+
+    def update(self, row) -> None:
+        date = pd.Timestamp(row["Date"])
+        if self.last_date is not None and date <= self.last_date:
+            raise ValueError(f"session {date:%Y-%m-%d} is not after {self.last_date:%Y-%m-%d}")
+        r, c = self.session_returns(row)
+        self.update_returns(r, c)
+        self.last_date = date
+
+    def update_returns(self, r: np.ndarray, c: np.ndarray) -> None:
+        L = self.buf.shape[0]
+
+        # Today's position uses returns up to yesterday: I_t = f(r_{t-n..t-1}).
+        n_arr = np.array(self.windows)[:, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            a = np.where((self.seen >= n_arr) & (self.wnan == 0), self.wsum / n_arr, np.nan)
+        a[np.abs(a) <= SIGNAL_EPS] = 0.0
+        I = np.stack([
+            (a > 0).astype(np.float64) if mode == "long_only"
+            else np.sign(np.nan_to_num(a, nan=0.0))
+            for mode in self.modes
+        ])
+
+        # R_t = I_{t-1}·r_t − |I_t − I_{t-1}|·c_t, skipped on the first session.
+        dI = np.abs(I - self.pos)
+        R  = self.pos * r - dI * c
+        ok = ~np.isnan(R) & (self.seen > 0)
+        Rz = np.where(ok, R, 0.0)
+        self.N += ok
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = np.where(ok, Rz - self.mean, 0.0)
+            self.mean += np.where(ok, delta / np.maximum(self.N, 1), 0.0)
+        self.M2 += delta * np.where(ok, Rz - self.mean, 0.0)
+        self.turn += np.where(ok, dI, 0.0)
+        self.equity *= 1.0 + Rz
+        self.pos = I
+
+        # Roll r_t into the window sums and the ring buffer.
+        for w, n in enumerate(self.windows):
+            if self.seen >= n:
+                out = self.buf[(self.head - n) % L]
+                self.wsum[w] -= np.nan_to_num(out, nan=0.0)
+                self.wnan[w] -= np.isnan(out)
+            self.wsum[w] += np.nan_to_num(r, nan=0.0)
+            self.wnan[w] += np.isnan(r)
+        self.buf[self.head] = r
+        self.head = (self.head + 1) % L
+        self.seen += 1
+        if self.head == 0:
+            self.resum()
+
+    def resum(self) -> None:
+        # Re-add the windows from the buffer once per wrap so add/remove
+        # rounding cannot drift across years of sessions.
+        L = self.buf.shape[0]
+        for w, n in enumerate(self.windows):
+            if self.seen >= n:
+                last = self.buf[(self.head - np.arange(1, n + 1)) % L]
+                self.wsum[w] = np.nan_to_num(last, nan=0.0).sum(axis=0)
+                self.wnan[w] = np.isnan(last).sum(axis=0)
+
+    # ── results ──────────────────────────────────────────────────────
+
+    def metrics(self) -> pd.DataFrame:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sd = np.sqrt(self.M2 / (self.N - 1))
+            Ra = (1.0 + self.mean) ** TRADING_DAYS - 1.0
+            sa = sd * np.sqrt(TRADING_DAYS)
+            RR = np.where(sa > 0, Ra / sa, np.nan)
+            turnover = self.turn / self.N
+        short = self.N < MIN_OBS
+        index = pd.MultiIndex.from_product(
+            [self.modes, self.windows, self.names], names=["mode", "window", "instrument"]
+        )
+        return pd.DataFrame({
+            "Ra": np.where(short, np.nan, Ra).ravel(),
+            "sa": np.where(short, np.nan, sa).ravel(),
+            "RR": np.where(short, np.nan, RR).ravel(),
+            "turnover": turnover.ravel(),
+            "N": self.N.ravel(),
+        }, index=index)
+
+    def equity_levels(self) -> pd.Series:
+        index = pd.MultiIndex.from_product(
+            [self.modes, self.windows, self.names], names=["mode", "window", "instrument"]
+        )
+        return pd.Series(self.equity.ravel(), index=index, name=self.last_date)
+
+    # ── persistence ──────────────────────────────────────────────────
+
+    def save(self, path: str = STATE_FILE) -> None:
+        meta = {
+            "windows": self.windows, "modes": self.modes,
+            "instruments": {k: list(v) for k, v in self.instruments.items()},
+            "last_date": None if self.last_date is None else self.last_date.isoformat(),
+            "seen": self.seen, "head": self.head,
+        }
+        arrays = {k: getattr(self, k) for k in STATE_ARRAYS}
+        with open(path, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path: str = STATE_FILE) -> "StrategyState":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            state = cls(meta["windows"], meta["modes"],
+                        {k: tuple(v) for k, v in meta["instruments"].items()})
+            for k in STATE_ARRAYS:
+                setattr(state, k, data[k].copy())
+        state.seen, state.head = meta["seen"], meta["head"]
+        state.last_date = None if meta["last_date"] is None else pd.Timestamp(meta["last_date"])
+        return state
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs) -> "StrategyState":
+        state = cls(**kwargs)
+        state.extend(df)
+        return state
+
+    def extend(self, df: pd.DataFrame) -> int:
+        if self.last_date is not None:
+            df = df[df["Date"] > self.last_date]
+        for _, row in df.iterrows():
+            self.update(row)
+        return len(df)
+
+
+def check_consistency(state: StrategyState, df: pd.DataFrame, tol: float = 1e-9) -> pd.DataFrame:
+    # Compare the incremental state against a full batch recomputation over
+    # the same sessions; returns the largest absolute gap per quantity.
+    df = df[df["Date"] <= state.last_date].reset_index(drop=True)
+    names, R, C = instrument_panel(df, state.instruments).matrix()
+    batch = backtest_grid(R, C, state.windows, state.modes, names)
+    live  = state.metrics()
+
+    eq = pd.Series({
+        (mode, n, name): equity_curve(pd.Series(R[:, k]), pd.Series(C[:, k]), n, mode, df["Date"]).iloc[-1]
+        for mode in state.modes for n in state.windows for k, name in enumerate(names)
+    })
+    gaps = {col: np.nanmax(np.abs(live[col].to_numpy() - batch[col].to_numpy()))
+            for col in ["Ra", "sa", "RR", "turnover", "N"]}
+    gaps["equity"] = np.nanmax(np.abs(state.equity_levels().to_numpy() - eq.to_numpy())
+                               / eq.abs().to_numpy())
+    out = pd.DataFrame({"max_abs_gap": gaps})
+    out["ok"] = out["max_abs_gap"] <= tol
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Extend the incremental strategy state with new sessions.")
+    ap.add_argument("state", nargs="?", default=STATE_FILE, help="state file to resume and save")
+    ap.add_argument("--check", action="store_true", help="compare with a full batch recomputation")
+    args = ap.parse_args()
+    path = args.state
+    df = load_data()
+    try:
+        state = StrategyState.load(path)
+    except FileNotFoundError:
+        state = StrategyState()
+    added = state.extend(df)
+    state.save(path)
+    print(f"[OK] {path}: +{added} sessions, last = {state.last_date:%Y-%m-%d}")
+    if args.check:
+        report = check_consistency(state, df)
+        print(report.to_string())
+        if not report["ok"].all():
+            sys.exit(1)
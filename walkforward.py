@@ -0,0 +1,150 @@
+import sys
+import numpy as np
+import pandas as pd
+from config import TRADING_DAYS
+from core import (
+    MIN_OBS, load_data, build_instrument_series, series_matrix, signal_scores,
+    positions, net_return_matrix, column_metrics, backtest_grid,
+)
+
+WF_WINDOWS = list(range(1, 21))     # candidate lookbacks
+TRAIN      = TRADING_DAYS           # trailing training sessions
+STEP       = 21                     # sessions between re-estimations (1 = daily)
+
+
+class RollingMoments:
+    # Count, sum and sum of squares of the last `length` rows of every cell,
+    # kept by adding the newest row and dropping the oldest. Values are
+    # shifted by the first observation of each cell to keep the variance well
+    # conditioned, and the sums are rebuilt from the ring buffer once per wrap
+    # so add/drop rounding cannot drift.
+
+    def __init__(self, shape: tuple, length: int):
+        self.length = length
+        self.buf = np.full((length, *shape), np.nan)
+        self.head = 0
+        self.seen = 0
+        self.shift = np.full(shape, np.nan)
+        self.S1 = np.zeros(shape)
+        self.S2 = np.zeros(shape)
+        self.N  = np.zeros(shape, dtype=np.int64)
+
+    def push(self, x: np.ndarray) -> None:
+        if self.seen >= self.length:
+            self.drop(self.buf[self.head])
+        ok = ~np.isnan(x)
+        self.shift = np.where(ok & (self.N == 0), x, self.shift)
+        z = np.where(ok, x - self.shift, 0.0)
+        self.S1 += z
+        self.S2 += z * z
+        self.N  += ok
+        self.buf[self.head] = x
+        self.head = (self.head + 1) % self.length
+        self.seen += 1
+        if self.head == 0:
+            self.resum()
+
+    def drop(self, x: np.ndarray) -> None:
+        ok = ~np.isnan(x)
+        z = np.where(ok, x - self.shift, 0.0)
+        self.S1 -= z
+        self.S2 -= z * z
+        self.N  -= ok
+
+    def resum(self) -> None:
+        ok = ~np.isnan(self.buf)
+        z = np.where(ok, self.buf - self.shift, 0.0)
+        self.S1 = z.sum(axis=0)
+        self.S2 = (z * z).sum(axis=0)
+        self.N  = ok.sum(axis=0)
+
+    def rr(self) -> np.ndarray:
+        N = self.N
+        with np.errstate(invalid="ignore", divide="ignore"):
+            m  = self.shift + self.S1 / N
+            sd = np.sqrt(np.maximum(self.S2 - self.S1 * self.S1 / N, 0.0) / (N - 1))
+            Ra = (1.0 + m) ** TRADING_DAYS - 1.0
+            sa = sd * np.sqrt(TRADING_DAYS)
+            RR = np.where(sa > 0, Ra / sa, np.nan)
+        return np.where(N < MIN_OBS, np.nan, RR)
+
+
+def walk_forward(R: np.ndarray, C: np.ndarray, windows: list = WF_WINDOWS,
+                 mode: str = "long_only", train: int = TRAIN, step: int = STEP,
+                 names: list = None, dates=None, signal: str = "sma") -> dict:
+    # Every `step` sessions from `train` on, pick per instrument the lookback
+    # with the best RR over the trailing `train` sessions, then hold that
+    # rule's positions until the next re-estimation. The choice on day t uses
+    # net returns up to t-1 only; switching rules pays the position change.
+    T, K = R.shape
+    W = len(windows)
+    names = list(range(K)) if names is None else list(names)
+    dates = pd.RangeIndex(T) if dates is None else pd.DatetimeIndex(dates)
+
+    scores = signal_scores(R, windows, signal)
+    I = np.stack([positions(scores[n], mode, signal) for n in windows], axis=1)   # T × W × K
+    X = np.stack([net_return_matrix(R, C, I[:, w]) for w in range(W)], axis=1)
+
+    stats  = RollingMoments((W, K), train)
+    choice = np.full(K, -1)
+    cols   = np.arange(K)
+    pos    = np.zeros((T, K))
+    picks  = {}
+    for t in range(T):
+        if t >= train and (t - train) % step == 0:
+            RR = stats.rr()
+            best = np.argmax(np.where(np.isnan(RR), -np.inf, RR), axis=0)
+            choice = np.where(np.isnan(RR).all(axis=0), -1, best)
+            picks[dates[t]] = np.where(choice >= 0, np.asarray(windows)[choice], np.nan)
+        pos[t] = np.where(choice >= 0, I[t, np.maximum(choice, 0), cols], 0.0)
+        stats.push(X[t])
+
+    # Out-of-sample net returns of the stitched positions, from the first
+    # re-estimation (whose entry cost is charged) onwards.
+    X_oos = net_return_matrix(R, C, pos)[train:]
+    Ra, sa, RR, N = column_metrics(X_oos)
+    dI = np.where(np.isnan(X_oos), 0.0, np.abs(np.diff(pos[train - 1:], axis=0)))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        turnover = dI.sum(axis=0) / N
+    short = N < MIN_OBS
+    choices = pd.DataFrame.from_dict(picks, orient="index", columns=names)
+
+    metrics = pd.DataFrame({
+        "Ra": np.where(short, np.nan, Ra), "sa": np.where(short, np.nan, sa),
+        "RR": np.where(short, np.nan, RR), "turnover": turnover, "N": N,
+        "modal_n": choices.mode().iloc[0] if len(choices) else np.nan,
+    }, index=pd.Index(names, name="instrument"))
+    equity = pd.DataFrame(np.cumprod(1.0 + np.nan_to_num(X_oos), axis=0),
+                          index=dates[train:], columns=names)
+    return {"metrics": metrics, "equity": equity, "choices": choices}
+
+
+def in_sample_best(R: np.ndarray, C: np.ndarray, windows: list = WF_WINDOWS,
+                   mode: str = "long_only", names: list = None, signal: str = "sma") -> pd.DataFrame:
+    # The full-sample best lookback per instrument: the look-ahead benchmark
+    # that walk-forward selection is compared against.
+    names = list(range(R.shape[1])) if names is None else list(names)
+    rr = backtest_grid(R, C, windows, [mode], names, signal).loc[mode, "RR"].unstack("window")
+    rr = rr.reindex(names)
+    return pd.DataFrame({"best_n": rr.idxmax(axis=1), "RR": rr.max(axis=1)})
+
+
+def walk_forward_table(series: dict, windows: list = WF_WINDOWS, mode: str = "long_only",
+                       train: int = TRAIN, steps: tuple = (STEP, 1), dates=None,
+                       signal: str = "sma") -> pd.DataFrame:
+    names, R, C = series_matrix(series)
+    out = in_sample_best(R, C, windows, mode, names, signal).rename(
+        columns={"best_n": "In-sample best n", "RR": "In-sample best RR"})
+    for step in steps:
+        wf = walk_forward(R, C, windows, mode, train, step, names, dates, signal)["metrics"]
+        label = "daily" if step == 1 else f"every {step}"
+        out[f"WF RR ({label})"] = wf["RR"]
+        out[f"WF modal n ({label})"] = wf["modal_n"]
+    return out
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "long_only"
+    df = load_data()
+    print(walk_forward_table(build_instrument_series(df), mode=mode, dates=df["Date"])
+          .round(3).to_string())